@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import UserProfile
-from apps.core.serializers import SMISerializer
+from apps.core.serializers import DynamicFieldsMixin, SMISerializer
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,7 +9,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'date_joined']
         read_only_fields = ['id', 'date_joined']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True, required=False)
@@ -70,7 +70,7 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
         fields = ['role', 'phone_number', 'smi', 'department', 'position']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class UserDashboardSerializer(serializers.ModelSerializer):
+class UserDashboardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Dashboard serializer for user profile"""
     user = UserSerializer(read_only=True)
     smi = SMISerializer(read_only=True)
@@ -80,7 +80,7 @@ class UserDashboardSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'role', 'smi', 'phone_number', 'department', 'position', 
                  'created_at', 'updated_at', 'last_login']
 
-class UserManagementSerializer(serializers.ModelSerializer):
+class UserManagementSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for admin user management"""
     user = UserSerializer(read_only=True)
     smi = SMISerializer(read_only=True)
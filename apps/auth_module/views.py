@@ -18,6 +18,7 @@ from .serializers import (
     UserDashboardSerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
 
 logger = logging.getLogger(__name__)
 
@@ -243,7 +244,7 @@ class AuthViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]  # AUTH_DISABLED
@@ -254,9 +255,10 @@ class UserViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
     def get_queryset(self):
+        queryset = super().get_queryset()
         if self.request.user.is_staff:
-            return self.queryset
-        return self.queryset.filter(id=self.request.user.id)
+            return queryset
+        return queryset.filter(id=self.request.user.id)
 
     @action(detail=True, methods=['post'])
     def activate(self, request, pk=None):
@@ -292,7 +294,7 @@ class UserViewSet(viewsets.ModelViewSet):
             'is_staff': user.is_staff
         })
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.AllowAny]  # AUTH_DISABLED
@@ -302,7 +304,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         if getattr(self, 'swagger_fake_view', False):
             return self.queryset.none()
         
-        return self.queryset.filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -326,7 +328,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        profiles = self.queryset.filter(role=role)
+        profiles = self.optimize_queryset(self.queryset.filter(role=role))
         serializer = self.get_serializer(profiles, many=True)
         return Response(serializer.data)
 
@@ -344,7 +346,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         
         try:
             smi = SMI.objects.get(id=smi_id)
-            profiles = self.queryset.filter(smi=smi)
+            profiles = self.optimize_queryset(self.queryset.filter(smi=smi))
             serializer = self.get_serializer(profiles, many=True)
             return Response(serializer.data)
         except SMI.DoesNotExist:
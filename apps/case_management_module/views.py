@@ -12,13 +12,22 @@ from .serializers import (
     CaseAttachmentSerializer, CaseTimelineSerializer, CaseSummarySerializer, CaseDashboardSerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
+from apps.core.dashboards import DashboardAggregate
 from apps.auth_module.models import UserProfile
 
-class CaseViewSet(viewsets.ModelViewSet):
+class CaseViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for case management"""
     queryset = Case.objects.all()
     serializer_class = CaseSerializer
     permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+    dashboard_buckets = DashboardAggregate(
+        total_cases=None,
+        open_cases=Q(status='OPEN'),
+        in_progress_cases=Q(status='IN_PROGRESS'),
+        resolved_cases=Q(status='RESOLVED'),
+        urgent_cases=Q(priority='URGENT'),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -65,24 +74,12 @@ class CaseViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get case management dashboard data"""
-        # Calculate statistics
-        total_cases = self.get_queryset().count()
-        open_cases = self.get_queryset().filter(status='OPEN').count()
-        in_progress_cases = self.get_queryset().filter(status='IN_PROGRESS').count()
-        resolved_cases = self.get_queryset().filter(status='RESOLVED').count()
-        urgent_cases = self.get_queryset().filter(priority='URGENT').count()
+        queryset = self.get_queryset()
+        dashboard_data = self.dashboard_buckets.evaluate(queryset)
         
         # Get recent cases
-        recent_cases = self.get_queryset().order_by('-opened_date')[:10]
-        
-        dashboard_data = {
-            'total_cases': total_cases,
-            'open_cases': open_cases,
-            'in_progress_cases': in_progress_cases,
-            'resolved_cases': resolved_cases,
-            'urgent_cases': urgent_cases,
-            'recent_cases': CaseSerializer(recent_cases, many=True).data
-        }
+        recent_cases = queryset.order_by('-opened_date')[:10]
+        dashboard_data['recent_cases'] = CaseSerializer(recent_cases, many=True).data
         
         return Response(dashboard_data)
     
@@ -141,7 +138,7 @@ class CaseViewSet(viewsets.ModelViewSet):
         
         return Response({'message': f'Case status updated to {new_status}'})
 
-class CaseNoteViewSet(viewsets.ModelViewSet):
+class CaseNoteViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for case notes management"""
     queryset = CaseNote.objects.all()
     serializer_class = CaseNoteSerializer
@@ -165,7 +162,7 @@ class CaseNoteViewSet(viewsets.ModelViewSet):
             # For testing without auth, create a default user or skip author
             serializer.save()
 
-class InvestigationViewSet(viewsets.ModelViewSet):
+class InvestigationViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for investigation management"""
     queryset = Investigation.objects.all()
     serializer_class = InvestigationSerializer
@@ -186,7 +183,7 @@ class InvestigationViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class AdHocInspectionViewSet(viewsets.ModelViewSet):
+class AdHocInspectionViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for ad-hoc inspection management"""
     queryset = AdHocInspection.objects.all()
     serializer_class = AdHocInspectionSerializer
@@ -207,7 +204,7 @@ class AdHocInspectionViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class CaseAttachmentViewSet(viewsets.ModelViewSet):
+class CaseAttachmentViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for case attachment management"""
     queryset = CaseAttachment.objects.all()
     serializer_class = CaseAttachmentSerializer
@@ -231,7 +228,7 @@ class CaseAttachmentViewSet(viewsets.ModelViewSet):
             # For testing without auth, skip uploaded_by
             serializer.save()
 
-class CaseTimelineViewSet(viewsets.ModelViewSet):
+class CaseTimelineViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for case timeline management"""
     queryset = CaseTimeline.objects.all()
     serializer_class = CaseTimelineSerializer
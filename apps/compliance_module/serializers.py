@@ -1,9 +1,9 @@
 from rest_framework import serializers
 from .models import ComplianceIndex, ComplianceAssessment, ComplianceRequirement, ComplianceViolation, ComplianceReport
-from apps.core.serializers import SMISerializer
+from apps.core.serializers import DynamicFieldsMixin, SMISerializer
 from apps.core.models import SMI
 
-class ComplianceIndexSerializer(serializers.ModelSerializer):
+class ComplianceIndexSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.PrimaryKeyRelatedField(
         queryset=SMI.objects.all(), source='smi', write_only=True
@@ -14,7 +14,7 @@ class ComplianceIndexSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'final_compliance_score', 'created_at', 'updated_at']
 
-class ComplianceAssessmentSerializer(serializers.ModelSerializer):
+class ComplianceAssessmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.PrimaryKeyRelatedField(
         queryset=SMI.objects.all(), source='smi', write_only=True
@@ -25,7 +25,7 @@ class ComplianceAssessmentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ComplianceRequirementSerializer(serializers.ModelSerializer):
+class ComplianceRequirementSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.PrimaryKeyRelatedField(
         queryset=SMI.objects.all(), source='smi', write_only=True
@@ -36,7 +36,7 @@ class ComplianceRequirementSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ComplianceViolationSerializer(serializers.ModelSerializer):
+class ComplianceViolationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.PrimaryKeyRelatedField(
         queryset=SMI.objects.all(), source='smi', write_only=True
@@ -48,7 +48,7 @@ class ComplianceViolationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ComplianceReportSerializer(serializers.ModelSerializer):
+class ComplianceReportSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.PrimaryKeyRelatedField(
         queryset=SMI.objects.all(), source='smi', write_only=True
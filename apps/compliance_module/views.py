@@ -13,9 +13,11 @@ from .serializers import (
     ComplianceSummarySerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
+from apps.core.dashboards import DashboardAggregate, Distinct
 from apps.auth_module.models import UserProfile
 
-class ComplianceIndexViewSet(viewsets.ModelViewSet):
+class ComplianceIndexViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for compliance index management"""
     queryset = ComplianceIndex.objects.all()
     serializer_class = ComplianceIndexSerializer
@@ -77,7 +79,7 @@ class ComplianceIndexViewSet(viewsets.ModelViewSet):
             'final_compliance_score': compliance_index.final_compliance_score
         })
 
-class ComplianceAssessmentViewSet(viewsets.ModelViewSet):
+class ComplianceAssessmentViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for compliance assessment management"""
     queryset = ComplianceAssessment.objects.all()
     serializer_class = ComplianceAssessmentSerializer
@@ -111,7 +113,7 @@ class ComplianceAssessmentViewSet(viewsets.ModelViewSet):
         # TESTING MODE: bypass role checks and update compliance assessment
         serializer.save()
 
-class ComplianceRequirementViewSet(viewsets.ModelViewSet):
+class ComplianceRequirementViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for compliance requirement management"""
     queryset = ComplianceRequirement.objects.all()
     serializer_class = ComplianceRequirementSerializer
@@ -143,7 +145,7 @@ class ComplianceRequirementViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class ComplianceViolationViewSet(viewsets.ModelViewSet):
+class ComplianceViolationViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for compliance violation management"""
     queryset = ComplianceViolation.objects.all()
     serializer_class = ComplianceViolationSerializer
@@ -174,11 +176,16 @@ class ComplianceViolationViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class ComplianceReportViewSet(viewsets.ModelViewSet):
+class ComplianceReportViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for compliance report management"""
     queryset = ComplianceReport.objects.all()
     serializer_class = ComplianceReportSerializer
     permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+    index_buckets = DashboardAggregate(
+        compliant_smis=Distinct('smi', filter=Q(final_compliance_score__gte=80)),
+        non_compliant_smis=Distinct('smi', filter=Q(final_compliance_score__lt=80)),
+        average_compliance_score=Avg('final_compliance_score'),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -206,14 +213,8 @@ class ComplianceReportViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get compliance dashboard data"""
-        # Calculate statistics
-        total_smis = SMI.objects.count()
-        compliant_smis = ComplianceIndex.objects.filter(
-            final_compliance_score__gte=80
-        ).values('smi').distinct().count()
-        non_compliant_smis = ComplianceIndex.objects.filter(
-            final_compliance_score__lt=80
-        ).values('smi').distinct().count()
+        # One aggregate query per table
+        index_stats = self.index_buckets.evaluate(ComplianceIndex.objects.all())
         pending_assessments = ComplianceAssessment.objects.filter(
             status='PENDING'
         ).count()
@@ -221,21 +222,16 @@ class ComplianceReportViewSet(viewsets.ModelViewSet):
             date_identified__gte=timezone.now().date() - timedelta(days=30)
         ).count()
         
-        # Get average compliance score
-        avg_compliance_score = ComplianceIndex.objects.aggregate(
-            Avg('final_compliance_score')
-        )['final_compliance_score__avg'] or 0
-        
         # Get recent reports
         recent_reports = self.get_queryset().order_by('-report_date')[:10]
         
         dashboard_data = {
-            'total_smis': total_smis,
-            'compliant_smis': compliant_smis,
-            'non_compliant_smis': non_compliant_smis,
+            'total_smis': SMI.objects.count(),
+            'compliant_smis': index_stats['compliant_smis'],
+            'non_compliant_smis': index_stats['non_compliant_smis'],
             'pending_assessments': pending_assessments,
             'recent_violations': recent_violations,
-            'average_compliance_score': round(avg_compliance_score, 2),
+            'average_compliance_score': round(index_stats['average_compliance_score'] or 0, 2),
             'recent_reports': ComplianceReportSerializer(recent_reports, many=True).data
         }
         
@@ -2,12 +2,35 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from django.utils import timezone
 from .models import (
     SMI, BoardMember, MeetingLog, ProductOffering, ClienteleProfile,
     FinancialStatement, ClientAssetMix, LicensingBreach, SupervisoryIntervention,
-    Notification, SystemAuditLog
+    Notification, SystemAuditLog, BatchRun, BatchChunk, TaskRun,
+    QueuedJob, ScheduleEntry, TaskLease
 )
-from .formula_models import CalculationFormula, CalculationBreakdown
+from .offsite_profile import schedule_refresh
+from .telemetry import duration_percentiles
+from .formula_models import (
+    CalculationFormula, CalculationBreakdown, CalculationBreakdownDailySummary, LatestCalculationBreakdown,
+)
+
+class OffsiteProfileAdminMixin:
+    """Refreshes the offsite profile snapshots of the SMIs whose rows an admin edits or deletes"""
+    def save_model(self, request, obj, form, change):
+        previous_smi_id = type(obj).objects.filter(pk=obj.pk).values_list('smi_id', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        schedule_refresh(previous_smi_id, obj.smi_id)
+
+    def delete_model(self, request, obj):
+        smi_id = obj.smi_id
+        super().delete_model(request, obj)
+        schedule_refresh(smi_id)
+
+    def delete_queryset(self, request, queryset):
+        smi_ids = set(queryset.values_list('smi_id', flat=True))
+        super().delete_queryset(request, queryset)
+        schedule_refresh(*smi_ids)
 
 @admin.register(SMI)
 class SMIAdmin(admin.ModelAdmin):
@@ -31,7 +54,7 @@ class SMIAdmin(admin.ModelAdmin):
     )
 
 @admin.register(BoardMember)
-class BoardMemberAdmin(admin.ModelAdmin):
+class BoardMemberAdmin(OffsiteProfileAdminMixin, admin.ModelAdmin):
     list_display = ['name', 'position', 'smi', 'appointment_date', 'is_active']
     list_filter = ['position', 'is_active', 'appointment_date', 'smi__status']
     search_fields = ['name', 'position', 'smi__company_name']
@@ -45,21 +68,21 @@ class MeetingLogAdmin(admin.ModelAdmin):
     list_per_page = 25
 
 @admin.register(ProductOffering)
-class ProductOfferingAdmin(admin.ModelAdmin):
+class ProductOfferingAdmin(OffsiteProfileAdminMixin, admin.ModelAdmin):
     list_display = ['product_name', 'smi', 'product_category', 'income_contribution', 'is_active']
     list_filter = ['product_category', 'is_active', 'smi__status']
     search_fields = ['product_name', 'smi__company_name']
     list_per_page = 25
 
 @admin.register(ClienteleProfile)
-class ClienteleProfileAdmin(admin.ModelAdmin):
+class ClienteleProfileAdmin(OffsiteProfileAdminMixin, admin.ModelAdmin):
     list_display = ['client_type', 'smi', 'client_count', 'income_contribution', 'period']
     list_filter = ['client_type', 'period', 'smi__status']
     search_fields = ['smi__company_name']
     list_per_page = 25
 
 @admin.register(FinancialStatement)
-class FinancialStatementAdmin(admin.ModelAdmin):
+class FinancialStatementAdmin(OffsiteProfileAdminMixin, admin.ModelAdmin):
     list_display = ['smi', 'period', 'statement_type', 'total_revenue', 'total_assets', 'created_at']
     list_filter = ['statement_type', 'period', 'smi__status']
     search_fields = ['smi__company_name']
@@ -67,7 +90,7 @@ class FinancialStatementAdmin(admin.ModelAdmin):
     list_per_page = 25
 
 @admin.register(ClientAssetMix)
-class ClientAssetMixAdmin(admin.ModelAdmin):
+class ClientAssetMixAdmin(OffsiteProfileAdminMixin, admin.ModelAdmin):
     list_display = ['smi', 'period', 'asset_class', 'allocation_percentage', 'sec_compliance_status']
     list_filter = ['asset_class', 'sec_compliance_status', 'period', 'smi__status']
     search_fields = ['smi__company_name']
@@ -133,7 +156,7 @@ class CalculationBreakdownAdmin(admin.ModelAdmin):
     list_display = ['calculation_type', 'reference_id', 'final_value', 'final_percentage', 'calculated_at']
     list_filter = ['calculation_type', 'calculated_at']
     search_fields = ['calculation_type', 'reference_id', 'calculated_by']
-    readonly_fields = ['id', 'calculated_at']
+    readonly_fields = ['id', 'calculated_at', 'content_hash']
     list_per_page = 25
     
     fieldsets = (
@@ -144,6 +167,103 @@ class CalculationBreakdownAdmin(admin.ModelAdmin):
             'fields': ('final_value', 'final_percentage', 'components')
         }),
         ('Metadata', {
-            'fields': ('calculated_at', 'calculated_by', 'id')
+            'fields': ('calculated_at', 'calculated_by', 'content_hash', 'id')
         }),
     )
+
+@admin.register(LatestCalculationBreakdown)
+class LatestCalculationBreakdownAdmin(admin.ModelAdmin):
+    list_display = ['calculation_type', 'reference_id', 'breakdown', 'checked_at']
+    list_filter = ['calculation_type']
+    search_fields = ['reference_id']
+    readonly_fields = ['calculation_type', 'reference_id', 'breakdown', 'content_hash', 'checked_at']
+    list_per_page = 25
+
+@admin.register(CalculationBreakdownDailySummary)
+class CalculationBreakdownDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ['calculation_type', 'reference_id', 'day', 'samples', 'min_value', 'max_value', 'average_value']
+    list_filter = ['calculation_type', 'day']
+    search_fields = ['reference_id']
+    readonly_fields = ['calculation_type', 'reference_id', 'day', 'samples', 'min_value', 'max_value',
+                       'total_value', 'first_calculated_at', 'last_calculated_at']
+    list_per_page = 25
+
+class BatchChunkInline(admin.TabularInline):
+    model = BatchChunk
+    fields = ['index', 'status', 'attempts', 'rows_processed', 'error', 'finished_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(BatchRun)
+class BatchRunAdmin(admin.ModelAdmin):
+    list_display = ['task_name', 'status', 'chunks_done', 'total_chunks', 'failures', 'rows_processed', 'started_at', 'finished_at']
+    list_filter = ['task_name', 'status', 'started_at']
+    readonly_fields = ['task_name', 'status', 'chunk_size', 'total_chunks', 'chunks_done', 'failures',
+                       'rows_processed', 'lease_owner', 'started_at', 'finished_at']
+    inlines = [BatchChunkInline]
+    actions = ['retry_failed']
+    list_per_page = 25
+
+    @admin.action(description='Retry failed chunks')
+    def retry_failed(self, request, queryset):
+        from .job_queue import dispatch
+        from .tasks import retry_failed_chunks
+        for run in queryset.filter(status='FAILED'):
+            dispatch(retry_failed_chunks, run.pk)
+
+@admin.register(TaskRun)
+class TaskRunAdmin(admin.ModelAdmin):
+    list_display = ['task_name', 'outcome', 'started_at', 'duration_ms', 'query_count', 'query_time_ms',
+                    'rows_read', 'rows_written', 'peak_rss_kb']
+    list_filter = ['task_name', 'outcome', 'started_at']
+    search_fields = ['task_name', 'task_id', 'error']
+    date_hierarchy = 'started_at'
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        # p50/p95 per task and day of the last week, shown above the list
+        extra_context = {**(extra_context or {}), 'duration_stats': duration_percentiles(days=7, bucket='day')}
+        return super().changelist_view(request, extra_context=extra_context)
+
+@admin.register(QueuedJob)
+class QueuedJobAdmin(admin.ModelAdmin):
+    list_display = ['task_name', 'queue', 'status', 'attempts', 'run_after', 'locked_by', 'finished_at']
+    list_filter = ['queue', 'status', 'task_name']
+    search_fields = ['task_name', 'error']
+    readonly_fields = ['task_name', 'args', 'kwargs', 'attempts', 'callback', 'pending_parts', 'locked_by',
+                       'locked_at', 'result', 'error', 'created_at', 'finished_at']
+    actions = ['requeue']
+    list_per_page = 50
+
+    @admin.action(description='Requeue selected jobs')
+    def requeue(self, request, queryset):
+        queryset.filter(status='FAILED').update(status='QUEUED', attempts=0, run_after=timezone.now())
+
+@admin.register(ScheduleEntry)
+class ScheduleEntryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'task_name', 'last_run_at', 'total_run_count']
+    readonly_fields = ['name', 'task_name', 'total_run_count']
+
+@admin.register(TaskLease)
+class TaskLeaseAdmin(admin.ModelAdmin):
+    list_display = ['task_name', 'owner', 'active', 'acquired_at', 'heartbeat_at', 'expires_at', 'released_at']
+    readonly_fields = ['task_name', 'owner', 'acquired_at', 'heartbeat_at', 'released_at']
+    actions = ['expire']
+
+    @admin.display(boolean=True)
+    def active(self, obj):
+        return obj.is_active
+
+    @admin.action(description='Expire selected leases (lets a blocked task start again)')
+    def expire(self, request, queryset):
+        queryset.update(expires_at=timezone.now())
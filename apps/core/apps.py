@@ -4,3 +4,30 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        from . import search
+        from .models import (
+            SMI, MeetingLog, LicensingBreach, SupervisoryIntervention, Notification, SystemAuditLog
+        )
+
+        search.register(SMI, ['company_name', 'license_number', 'email', 'phone'])
+        search.register(MeetingLog, ['smi__company_name', 'agenda', 'decisions'])
+        search.register(LicensingBreach, ['smi__company_name', 'assigned_to__username', 'description'])
+        search.register(SupervisoryIntervention, ['smi__company_name', 'reason', 'description'])
+        search.register(Notification, ['title', 'message'])
+        search.register(SystemAuditLog, ['action', 'model_name', 'object_repr', 'change_message', 'user__username'])
+
+        from . import change_tracking
+        from .models import CapitalPosition, FinancialStatement
+        from apps.case_management_module.models import Case
+        from apps.risk_assessment_module.models import RiskAssessment
+
+        change_tracking.track(FinancialStatement, ['RISK'])
+        change_tracking.track(CapitalPosition, ['RISK'])
+        change_tracking.track(RiskAssessment, ['COMPLIANCE'])
+        change_tracking.track(Case, ['COMPLIANCE'])
+
+        from . import formula_engine
+
+        formula_engine.track_changes()
@@ -0,0 +1,129 @@
+"""
+Chunked fan-out for the periodic SMI tasks.
+
+A run splits the SMI ids into chunks of settings.BATCH_CHUNK_SIZE, records a
+BatchRun with one BatchChunk per slice and dispatches the chunks as a Celery
+chord (see apps.core.tasks). Each chunk task processes its slice and records
+the outcome on its BatchChunk instead of raising, so one bad chunk neither
+blocks the others nor prevents the chord's finishing step from running.
+retry_failed_chunks() re-dispatches only the chunks that failed.
+
+Runs of incremental tasks carry the change-tracking watermark they cover
+(see apps.core.change_tracking); it is recorded only once every chunk of
+the run has succeeded.
+
+A run holds its task's single-flight lease (see apps.core.task_locks).
+Chunks work through their SMIs in sub-batches of settings.BATCH_LEASE_BATCH_SIZE
+and renew the lease before each one, so a long chunk keeps it alive. A chunk
+that finds the lease expired or taken over (it sat in the queue, or ran, past
+settings.TASK_LOCK_TTL) stops and is marked failed rather than overlapping
+the next run; retry_failed_chunks() re-runs it once the lease can be taken
+again. Finishing the run releases the lease.
+"""
+import logging
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import task_locks
+from .change_tracking import advance_watermark
+from .models import SMI, BatchChunk, BatchRun
+
+logger = logging.getLogger(__name__)
+
+
+def get_chunk_size(chunk_size=None):
+    return chunk_size or getattr(settings, 'BATCH_CHUNK_SIZE', 500)
+
+
+def get_lease_batch_size():
+    return getattr(settings, 'BATCH_LEASE_BATCH_SIZE', 100)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def plan_batch_run(task_name, smis, chunk_size=None, watermark=None, full_rebuild=False, lease_owner=''):
+    """Create a BatchRun and its chunks for the SMIs in ``smis``"""
+    chunk_size = get_chunk_size(chunk_size)
+    smi_ids = [str(pk) for pk in smis.order_by('pk').values_list('pk', flat=True)]
+    slices = [smi_ids[start:start + chunk_size] for start in range(0, len(smi_ids), chunk_size)]
+
+    run = BatchRun.objects.create(
+        task_name=task_name, chunk_size=chunk_size, total_chunks=len(slices),
+        watermark=watermark, full_rebuild=full_rebuild, lease_owner=lease_owner,
+    )
+    BatchChunk.objects.bulk_create([
+        BatchChunk(run=run, index=index, smi_ids=ids) for index, ids in enumerate(slices)
+    ])
+    return run
+
+
+def execute_chunk(chunk, job):
+    """
+    Run ``job`` (a callable taking an SMI queryset and returning the number
+    of rows it processed) on one chunk and record the outcome. The chunk is
+    fed to ``job`` in sub-batches, renewing the run's lease before each; once
+    the lease is lost the rest is not run and the chunk fails.
+    """
+    run = chunk.run
+    batch_size = get_lease_batch_size()
+    chunk.attempts += 1
+    try:
+        rows_processed = 0
+        for start in range(0, len(chunk.smi_ids), batch_size):
+            # Heartbeat before every sub-batch; without the lease another run may be under way
+            if run.lease_owner and not task_locks.renew(run.task_name, run.lease_owner):
+                raise LeaseLost(f"Run {run.pk} of {run.task_name} no longer holds its lease "
+                                f"({start} of {len(chunk.smi_ids)} SMIs processed)")
+            rows_processed += job(SMI.objects.filter(pk__in=chunk.smi_ids[start:start + batch_size])) or 0
+        chunk.rows_processed = rows_processed
+        chunk.status = 'DONE'
+        chunk.error = ''
+    except LeaseLost as e:
+        logger.warning(f"Chunk {chunk.index} of {run.task_name} run {run.pk} stopped: {str(e)}")
+        chunk.rows_processed = 0
+        chunk.status = 'FAILED'
+        chunk.error = str(e)
+    except Exception as e:
+        logger.exception(f"Chunk {chunk.index} of {chunk.run.task_name} run {chunk.run_id} failed")
+        chunk.rows_processed = 0
+        chunk.status = 'FAILED'
+        chunk.error = str(e)
+    chunk.finished_at = timezone.now()
+    chunk.save(update_fields=['attempts', 'rows_processed', 'status', 'error', 'finished_at'])
+    refresh_progress(chunk.run_id)
+    return chunk.status
+
+
+def refresh_progress(run_id, finished=False):
+    """Recompute a run's counters from its chunks"""
+    stats = BatchChunk.objects.filter(run_id=run_id).aggregate(
+        chunks_done=Count('pk', filter=Q(status='DONE')),
+        failures=Count('pk', filter=Q(status='FAILED')),
+        rows_processed=Sum('rows_processed'),
+    )
+    stats['rows_processed'] = stats['rows_processed'] or 0
+    if finished:
+        stats['status'] = 'FAILED' if stats['failures'] else 'COMPLETED'
+        stats['finished_at'] = timezone.now()
+    BatchRun.objects.filter(pk=run_id).update(**stats)
+    if finished:
+        run = BatchRun.objects.only('task_name', 'watermark', 'lease_owner').get(pk=run_id)
+        if stats['status'] == 'COMPLETED' and run.watermark is not None:
+            advance_watermark(run.task_name, run.watermark)
+        if run.lease_owner:
+            task_locks.release(run.task_name, run.lease_owner)
+    return stats
+
+
+def reset_failed_chunks(run):
+    """Mark a run's failed chunks pending again and return their ids"""
+    chunk_ids = list(run.chunks.filter(status='FAILED').values_list('pk', flat=True))
+    if chunk_ids:
+        BatchChunk.objects.filter(pk__in=chunk_ids).update(status='PENDING', error='')
+        BatchRun.objects.filter(pk=run.pk).update(status='RUNNING', finished_at=None)
+        refresh_progress(run.pk)
+    return chunk_ids
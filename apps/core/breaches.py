@@ -0,0 +1,76 @@
+"""
+Overdue-inspection breach detection.
+
+check_licensing_breaches records a MINOR LicensingBreach for every SMI that
+has an open inspection past its due date, at most one per SMI per day. One
+query finds the SMIs: those with an overdue inspection (EXISTS) and without
+today's open breach (NOT EXISTS, an anti-join), annotated with the user to
+notify. Then one bulk insert creates the breaches and one the notifications.
+
+Bulk inserts send no post_save, so the new rows are added to the search
+index explicitly.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+
+from apps.auth_module.models import UserProfile
+
+from . import search
+from .compliance_scoring import inspection_cases
+from .models import SMI, LicensingBreach, Notification
+
+BREACH_DESCRIPTION = 'Overdue inspection report'
+
+
+def smis_with_new_breaches(smis, today):
+    """(smi_id, company_name, user id to notify or None) for SMIs that need a breach today"""
+    overdue = inspection_cases().filter(smi=OuterRef('pk'), status='OPEN', due_date__lt=today)
+    recorded = LicensingBreach.objects.filter(
+        smi=OuterRef('pk'), breach_type='MINOR', breach_date=today,
+        description=BREACH_DESCRIPTION, status='OPEN',
+    )
+    contact = UserProfile.objects.filter(smi=OuterRef('pk')).order_by('created_at', 'pk')
+    return list(
+        smis.order_by()
+        .filter(Exists(overdue))
+        .filter(~Exists(recorded))
+        .annotate(notify_user_id=Subquery(contact.values('user_id')[:1]))
+        .values_list('pk', 'company_name', 'notify_user_id')
+    )
+
+
+def check_licensing_breaches_for(smis=None):
+    """
+    Record today's overdue-inspection breaches for ``smis`` (default: every
+    active SMI) and notify each SMI's first linked user. Returns the number of
+    breaches created.
+    """
+    if smis is None:
+        smis = SMI.objects.filter(status='ACTIVE')
+    today = timezone.now().date()
+    rows = smis_with_new_breaches(smis, today)
+    if not rows:
+        return 0
+
+    with transaction.atomic():
+        breaches = LicensingBreach.objects.bulk_create([
+            LicensingBreach(smi_id=smi_id, breach_type='MINOR', breach_date=today,
+                            description=BREACH_DESCRIPTION, status='OPEN')
+            for smi_id, _, _ in rows
+        ])
+        # Notification.user is required; SMIs without a linked user get the breach only
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type='BREACH_ALERT',
+                title='Overdue Inspection Report',
+                message=f'Inspection report for {company_name} is overdue',
+                priority='HIGH',
+            )
+            for _, company_name, user_id in rows if user_id is not None
+        ])
+        search.index_queryset(LicensingBreach.objects.filter(pk__in=[b.pk for b in breaches]))
+        if notifications:
+            search.index_queryset(Notification.objects.filter(pk__in=[n.pk for n in notifications]))
+    return len(breaches)
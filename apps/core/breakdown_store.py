@@ -0,0 +1,192 @@
+"""
+CalculationBreakdown history: write path, latest pointers and retention.
+
+record_breakdowns() stores the breakdowns of a scoring run. Each one gets a
+content hash (formula, final value and percentage, components); a breakdown
+whose hash matches the current one of its (calculation_type, reference_id)
+is not inserted again, only the pointer's checked_at moves. The history
+therefore holds one row per change instead of one per run.
+
+LatestCalculationBreakdown points at the current breakdown of each key, so
+latest_breakdown() is a unique-index lookup instead of a sort of the
+history.
+
+compact_breakdowns() rolls history older than settings.BREAKDOWN_RETENTION_DAYS
+into CalculationBreakdownDailySummary rows (samples, min, max and total of
+final_value per key and day) and deletes it. Breakdowns that are still the
+latest of their key are kept whatever their age. With deduplication a day
+without rows means the value did not change that day.
+"""
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .formula_models import CalculationBreakdown, CalculationBreakdownDailySummary, LatestCalculationBreakdown
+
+SUMMARY_FIELDS = ['samples', 'min_value', 'max_value', 'total_value', 'first_calculated_at', 'last_calculated_at']
+
+
+def _decimal_text(value):
+    return None if value is None else f'{Decimal(str(value)):.4f}'
+
+
+def content_hash(breakdown):
+    """Hash of what a breakdown says, leaving out when and by whom it was calculated"""
+    content = {
+        'formula': str(breakdown.formula_id) if breakdown.formula_id else None,
+        'final_value': _decimal_text(breakdown.final_value),
+        'final_percentage': _decimal_text(breakdown.final_percentage),
+        'components': breakdown.components,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def record_breakdowns(breakdowns, checked_at=None, batch_size=1000):
+    """
+    Save the unsaved ``breakdowns`` whose content changed and point their
+    keys at them. Returns the number of breakdowns inserted.
+    """
+    checked_at = checked_at or timezone.now()
+    inserted = 0
+    for start in range(0, len(breakdowns), batch_size):
+        batch = breakdowns[start:start + batch_size]
+        for breakdown in batch:
+            breakdown.content_hash = content_hash(breakdown)
+
+        current = {
+            (calculation_type, str(reference_id)): (pk, digest)
+            for pk, calculation_type, reference_id, digest in LatestCalculationBreakdown.objects.filter(
+                reference_id__in={breakdown.reference_id for breakdown in batch},
+                calculation_type__in={breakdown.calculation_type for breakdown in batch},
+            ).values_list('pk', 'calculation_type', 'reference_id', 'content_hash')
+        }
+        changed, unchanged = {}, []
+        for breakdown in batch:
+            key = (breakdown.calculation_type, str(breakdown.reference_id))
+            pointer_id, digest = current.get(key, (None, None))
+            if digest == breakdown.content_hash:
+                unchanged.append(pointer_id)
+            else:
+                changed[key] = breakdown
+
+        CalculationBreakdown.objects.bulk_create(list(changed.values()))
+        LatestCalculationBreakdown.objects.bulk_create(
+            [
+                LatestCalculationBreakdown(
+                    calculation_type=breakdown.calculation_type, reference_id=breakdown.reference_id,
+                    breakdown=breakdown, content_hash=breakdown.content_hash, checked_at=checked_at,
+                )
+                for breakdown in changed.values()
+            ],
+            update_conflicts=True,
+            unique_fields=['reference_id', 'calculation_type'],
+            update_fields=['breakdown', 'content_hash', 'checked_at'],
+        )
+        if unchanged:
+            LatestCalculationBreakdown.objects.filter(pk__in=unchanged).update(checked_at=checked_at)
+        inserted += len(changed)
+    return inserted
+
+
+def latest_breakdown(reference_id, calculation_type=None):
+    """
+    Current breakdown of ``reference_id`` (of ``calculation_type``, or the
+    most recent of any type), or None
+    """
+    pointers = LatestCalculationBreakdown.objects.filter(reference_id=reference_id)
+    history = CalculationBreakdown.objects.filter(reference_id=reference_id)
+    if calculation_type:
+        pointers = pointers.filter(calculation_type=calculation_type)
+        history = history.filter(calculation_type=calculation_type)
+    breakdown = (
+        CalculationBreakdown.objects.filter(pk__in=pointers.values('breakdown'))
+        .select_related('formula').order_by('-calculated_at', '-id').first()
+    )
+    if breakdown is None:
+        # Written outside record_breakdowns() (e.g. in the admin)
+        breakdown = history.select_related('formula').first()
+    return breakdown
+
+
+def retention_cutoff(retention_days=None, now=None):
+    """Start of the oldest day kept in full"""
+    if retention_days is None:
+        retention_days = getattr(settings, 'BREAKDOWN_RETENTION_DAYS', 90)
+    day = timezone.localdate(now or timezone.now()) - timedelta(days=retention_days)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _merge(summary, group):
+    summary.samples += group['samples']
+    summary.min_value = min(summary.min_value, group['min_value'])
+    summary.max_value = max(summary.max_value, group['max_value'])
+    summary.total_value += group['total_value']
+    summary.first_calculated_at = min(summary.first_calculated_at, group['first_calculated_at'])
+    summary.last_calculated_at = max(summary.last_calculated_at, group['last_calculated_at'])
+
+
+def _roll_up(rows):
+    """Add ``rows`` to the daily summaries of their keys"""
+    groups = list(
+        rows.annotate(day=TruncDate('calculated_at'))
+        .values('calculation_type', 'reference_id', 'day')
+        .annotate(
+            samples=Count('pk'),
+            min_value=Min('final_value'),
+            max_value=Max('final_value'),
+            total_value=Sum('final_value'),
+            first_calculated_at=Min('calculated_at'),
+            last_calculated_at=Max('calculated_at'),
+        )
+        .order_by()
+    )
+    existing = {
+        (summary.calculation_type, summary.reference_id, summary.day): summary
+        for summary in CalculationBreakdownDailySummary.objects.filter(
+            reference_id__in={group['reference_id'] for group in groups},
+            day__in={group['day'] for group in groups},
+        )
+    }
+    summaries = []
+    for group in groups:
+        summary = existing.get((group['calculation_type'], group['reference_id'], group['day']))
+        if summary is None:
+            summary = CalculationBreakdownDailySummary(**group)
+        else:
+            _merge(summary, group)
+        summaries.append(summary)
+    CalculationBreakdownDailySummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['reference_id', 'calculation_type', 'day'],
+        update_fields=SUMMARY_FIELDS,
+    )
+
+
+def compact_breakdowns(retention_days=None, batch_size=1000, now=None):
+    """
+    Roll breakdowns older than the retention period into daily summaries
+    and delete them. Returns the number of breakdowns compacted.
+    """
+    history = CalculationBreakdown.objects.filter(
+        calculated_at__lt=retention_cutoff(retention_days, now), latest__isnull=True
+    )
+    compacted = 0
+    while True:
+        # A breakdown never becomes the latest again, so the selected rows stay compactable
+        ids = list(history.order_by('calculated_at', 'id').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            rows = CalculationBreakdown.objects.filter(pk__in=ids)
+            _roll_up(rows)
+            rows.delete()
+        compacted += len(ids)
+    return compacted
@@ -0,0 +1,63 @@
+"""
+Diff-based bulk writes for child collections.
+
+sync_children() brings the rows of one table that belong to a parent in line
+with an incoming list. It matches rows on a natural key and then applies only
+the differences: one bulk_create, one bulk_update and one DELETE per table.
+Repeated keys are matched in order, so duplicate lines in a submission are
+kept as duplicates.
+"""
+from collections import defaultdict
+
+
+def _normalize(model, row):
+    """Coerce raw payload values to the Python types the fields store"""
+    return {name: model._meta.get_field(name).to_python(value) for name, value in row.items()}
+
+
+def sync_children(model, scope, rows, key_fields, batch_size=1000):
+    """
+    Make model.objects.filter(**scope) match rows.
+
+    scope:      filter identifying the parent's rows, also applied to new rows
+    rows:       list of {field: value} dicts for the incoming state
+    key_fields: fields identifying "the same" row between submissions
+
+    Returns a dict with created/updated/deleted/unchanged counts.
+    """
+    existing = defaultdict(list)
+    for obj in model.objects.filter(**scope).order_by('pk'):
+        existing[tuple(getattr(obj, f) for f in key_fields)].append(obj)
+
+    to_create, to_update, updated_fields = [], [], set()
+    unchanged = 0
+    for row in rows:
+        values = _normalize(model, row)
+        key = tuple(values.get(f) for f in key_fields)
+        if existing.get(key):
+            obj = existing[key].pop(0)
+            changed = [name for name, value in values.items() if getattr(obj, name) != value]
+            if changed:
+                for name in changed:
+                    setattr(obj, name, values[name])
+                updated_fields.update(changed)
+                to_update.append(obj)
+            else:
+                unchanged += 1
+        else:
+            to_create.append(model(**scope, **values))
+
+    stale = [obj.pk for objs in existing.values() for obj in objs]
+    if stale:
+        model.objects.filter(pk__in=stale).delete()
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(updated_fields), batch_size=batch_size)
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+
+    return {
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(stale),
+        'unchanged': unchanged,
+    }
@@ -0,0 +1,84 @@
+"""
+Change tracking for incremental rescoring.
+
+Saves and deletes of the models that feed a score mark the owning SMI dirty
+for that scope (one DirtySMI row per SMI and scope, its changed_at bumped on
+every change). Each periodic task keeps a ScoringWatermark: the next run only
+processes SMIs whose changed_at is past the watermark, and the watermark
+moves forward when that run completes. A task without a watermark, or one
+started with full=True, processes every active SMI.
+
+Bulk writes (bulk_create, QuerySet.update) send no signals; code that
+writes scoring inputs in bulk calls mark_dirty() itself.
+"""
+from datetime import timedelta
+
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import DirtySMI, ScoringWatermark
+
+# Changes stamped shortly before a run starts may still be in uncommitted
+# transactions, so the watermark trails the run's start by this much.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# model label -> scopes its rows feed
+_sources = {}
+
+
+def mark_dirty(smi_ids, scope, changed_at=None):
+    """Mark ``smi_ids`` as needing a rescore for ``scope``"""
+    changed_at = changed_at or timezone.now()
+    DirtySMI.objects.bulk_create(
+        [DirtySMI(smi_id=smi_id, scope=scope, changed_at=changed_at) for smi_id in set(smi_ids)],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['smi', 'scope'],
+        update_fields=['changed_at'],
+    )
+
+
+def track(model, scopes, smi_field='smi_id'):
+    """Mark the owning SMI dirty for ``scopes`` whenever a ``model`` row is saved or deleted"""
+    _sources[model] = (tuple(scopes), smi_field)
+    uid = f'change-tracking-{model._meta.label}'
+    post_save.connect(_changed, sender=model, dispatch_uid=uid)
+    post_delete.connect(_changed, sender=model, dispatch_uid=uid)
+
+
+def _changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes, smi_field = _sources[sender]
+    smi_id = getattr(instance, smi_field, None)
+    if smi_id is None:
+        return
+    for scope in scopes:
+        mark_dirty([smi_id], scope)
+
+
+def pending_smis(task_name, scope, smis, full=False):
+    """
+    Restrict ``smis`` to those changed since ``task_name`` last completed.
+    Returns (queryset, watermark to record once the run completes).
+    """
+    now = timezone.now()
+    next_watermark = now - WATERMARK_OVERLAP
+    if full:
+        return smis, next_watermark
+
+    watermark = ScoringWatermark.objects.filter(task_name=task_name).values_list('changed_through', flat=True).first()
+    if watermark is None:
+        return smis, next_watermark
+
+    dirty = DirtySMI.objects.filter(scope=scope, changed_at__gt=watermark).values('smi_id')
+    return smis.filter(pk__in=dirty), max(watermark, next_watermark)
+
+
+def advance_watermark(task_name, changed_through):
+    """Record that ``task_name`` has processed every change up to ``changed_through``"""
+    updated = ScoringWatermark.objects.filter(
+        task_name=task_name, changed_through__lt=changed_through
+    ).update(changed_through=changed_through)
+    if not updated:
+        ScoringWatermark.objects.get_or_create(task_name=task_name, defaults={'changed_through': changed_through})
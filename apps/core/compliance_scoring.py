@@ -0,0 +1,87 @@
+"""
+Batch compliance index update.
+
+update_compliance_indices scores a set of SMIs with a constant number of
+queries:
+
+    1. one query over SMI annotated with two correlated subqueries: the
+       risk level of the latest RiskAssessment and the status of the latest
+       inspection
+    2. the active COMPLIANCE_SCORE formula (see apps.core.formula_engine)
+       scores all of them in one vectorized call
+    3. the day's ComplianceIndex rows are written with a single upsert
+
+Inspections are Case rows of type AD_HOC_INSPECTION (there is no separate
+inspection report model), most recent opened_date first.
+"""
+import numpy as np
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from apps.case_management_module.models import Case
+from apps.compliance_module.models import ComplianceIndex
+from apps.risk_assessment_module.models import RiskAssessment
+
+from . import formula_engine
+from .models import SMI
+
+INSPECTION_CASE_TYPE = 'AD_HOC_INSPECTION'
+
+
+def inspection_cases():
+    return Case.objects.filter(case_type=INSPECTION_CASE_TYPE)
+
+
+def latest_inputs(smis):
+    """(smi_id, latest risk level, latest inspection status or None) for SMIs with a risk assessment"""
+    latest_risk = RiskAssessment.objects.filter(smi=OuterRef('pk')).order_by('-assessment_date', '-created_at')
+    latest_inspection = inspection_cases().filter(smi=OuterRef('pk')).order_by('-opened_date', '-created_at')
+    return list(
+        smis.order_by()
+        .annotate(
+            latest_risk_level=Subquery(latest_risk.values('risk_level')[:1]),
+            latest_inspection_status=Subquery(latest_inspection.values('status')[:1]),
+        )
+        .filter(latest_risk_level__isnull=False)
+        .values_list('pk', 'latest_risk_level', 'latest_inspection_status')
+    )
+
+
+def compliance_scores(inputs, compiled=None):
+    """Scores for the rows returned by latest_inputs(), from the active COMPLIANCE_SCORE formula"""
+    if compiled is None:
+        compiled = formula_engine.active_formula('COMPLIANCE_SCORE')[1]
+    return compiled.evaluate_cohort(
+        len(inputs),
+        risk_level=np.array([risk_level for _, risk_level, _ in inputs], dtype=object),
+        inspection_status=np.array([status for _, _, status in inputs], dtype=object),
+    )
+
+
+def update_compliance_indices_for(smis=None, batch_size=1000):
+    """
+    Update today's compliance index for ``smis`` (default: every active SMI).
+    Returns the number of indices written.
+    """
+    if smis is None:
+        smis = SMI.objects.filter(status='ACTIVE')
+    current_period = timezone.now().date()
+    inputs = latest_inputs(smis)
+    indices = []
+    for (smi_id, _, _), score in zip(inputs, compliance_scores(inputs).tolist()):
+        indices.append(ComplianceIndex(
+            smi_id=smi_id,
+            period=current_period,
+            analysis_period='QUARTERLY',
+            overall_compliance_score=score,
+            risk_calibration_score=score,
+            final_compliance_score=score,
+        ))
+    ComplianceIndex.objects.bulk_create(
+        indices,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['smi', 'period', 'analysis_period'],
+        update_fields=['overall_compliance_score', 'risk_calibration_score', 'final_compliance_score', 'updated_at'],
+    )
+    return len(indices)
@@ -0,0 +1,48 @@
+"""
+Declarative dashboard aggregation.
+
+A DashboardAggregate names the buckets a dashboard shows for one table and
+evaluates all of them in a single conditional-aggregation query:
+
+    case_buckets = DashboardAggregate(
+        total_cases=None,                       # COUNT(*)
+        open_cases=Q(status='OPEN'),            # COUNT(*) FILTER (WHERE ...)
+        smis_with_cases=Distinct('smi'),        # COUNT(DISTINCT smi)
+        average_score=Avg('score'),             # any other aggregate as-is
+    )
+    counts = case_buckets.evaluate(queryset)
+"""
+from django.db.models import Count, Q
+
+
+class Distinct:
+    """Count distinct values of a field, optionally restricted by a Q"""
+
+    def __init__(self, field, filter=None):
+        self.field = field
+        self.filter = filter
+
+    def resolve(self):
+        return Count(self.field, filter=self.filter, distinct=True)
+
+
+class DashboardAggregate:
+    def __init__(self, **buckets):
+        self.buckets = buckets
+
+    def expressions(self):
+        aggregates = {}
+        for name, bucket in self.buckets.items():
+            if bucket is None:
+                aggregates[name] = Count('pk')
+            elif isinstance(bucket, Q):
+                aggregates[name] = Count('pk', filter=bucket)
+            elif isinstance(bucket, Distinct):
+                aggregates[name] = bucket.resolve()
+            else:
+                aggregates[name] = bucket
+        return aggregates
+
+    def evaluate(self, queryset):
+        """Return {bucket name: value} for queryset with one query"""
+        return queryset.order_by().aggregate(**self.expressions())
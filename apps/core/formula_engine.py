@@ -0,0 +1,431 @@
+"""
+Formula engine for CalculationFormula.
+
+A formula's expression is parsed once, checked against a whitelist of AST
+nodes and compiled to a Python function over NumPy arrays:
+
+    numbers, the variables of its formula type
+    + - * / // % **, unary -, comparisons, and / or / not, x if cond else y
+    strings and the categorical variables (CATEGORICAL_VARIABLES), only as
+    operands of a comparison
+    weights['key'] and thresholds['key'], which are folded into constants
+    min max abs clip round sqrt log exp where coalesce
+
+Anything else (attributes, other names or calls, comprehensions, lambdas,
+...) is rejected with FormulaError, and the compiled function runs with no
+builtins. Numbers, True and False compile to floats, so no operator can
+repeat a string or grow an integer, and exponents are capped at
+MAX_EXPONENT. Conditionals and boolean operators are rewritten to their
+element-wise NumPy equivalents, so one call scores a whole cohort:
+
+    compiled = compile_formula(formula)
+    fsi = compiled(profit_score=array, margin_score=array, ...)
+
+active_formulas() returns the active CalculationFormula of each type with its
+compiled form, or the built-in default (DEFAULT_FORMULAS) when none is
+active. Both are cached per process (FormulaCache) and dropped everywhere
+when a formula is saved or deleted in any process, through the formula
+generation counter (see apps.core.generations). Saving or deleting a scoring
+formula that is active, or was active before the change, also marks every
+active SMI dirty for the scores it feeds (FORMULA_SCOPES), so the next
+incremental run rescores the whole cohort with it instead of only the SMIs
+whose data changed. Drafts and inactive copies never trigger a rescore.
+"""
+import ast
+import threading
+
+import numpy as np
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import generations
+from .change_tracking import mark_dirty
+from .formula_models import CalculationFormula
+from .models import SMI
+
+MAX_EXPRESSION_LENGTH = 2000
+MAX_NODES = 500
+MAX_EXPONENT = 100
+CACHE_SIZE = 256
+
+# Inputs each scored formula type receives
+FORMULA_VARIABLES = {
+    'FSI_SCORE': ('profit_margin', 'gross_margin', 'profit_score', 'margin_score', 'total_equity', 'total_assets'),
+    'CAR': ('total_equity', 'total_assets'),
+    'COMPOSITE_RISK': ('fsi', 'car'),
+    'COMPLIANCE_SCORE': ('risk_level', 'inspection_status'),
+}
+# Inputs holding labels rather than numbers; they can only be compared
+CATEGORICAL_VARIABLES = ('risk_level', 'inspection_status')
+
+# Change-tracking scope (see apps.core.change_tracking) of the scores each formula type feeds
+FORMULA_SCOPES = {
+    'FSI_SCORE': 'RISK',
+    'CAR': 'RISK',
+    'COMPOSITE_RISK': 'RISK',
+    'COMPLIANCE_SCORE': 'COMPLIANCE',
+}
+
+# Used while no formula of the type is active; they reproduce the original hard-coded scores
+DEFAULT_FORMULAS = {
+    'FSI_SCORE': {
+        'formula_expression': "clip(weights['profit_margin'] * profit_score + weights['gross_margin'] * margin_score, 0, 100)",
+        'weights': {'profit_margin': 0.6, 'gross_margin': 0.4},
+        'thresholds': {'LOW': 70, 'MEDIUM': 50},
+    },
+    'CAR': {
+        'formula_expression': "clip(total_equity / total_assets * 100, 0, 100)",
+        'weights': {},
+        'thresholds': {'LOW': 15, 'MEDIUM': 10},
+    },
+    'COMPOSITE_RISK': {
+        'formula_expression': "(fsi + (100 - car)) / 2",
+        'weights': {},
+        'thresholds': {},
+    },
+    'COMPLIANCE_SCORE': {
+        'formula_expression': (
+            "clip(weights['base']"
+            " + (weights['low_risk'] if risk_level == 'LOW' else weights['high_risk'] if risk_level == 'HIGH' else 0)"
+            " + (weights['inspection_resolved'] if inspection_status == 'RESOLVED'"
+            " else weights['inspection_open'] if inspection_status == 'OPEN' else 0), 0, 100)"
+        ),
+        'weights': {'base': 75, 'low_risk': 15, 'high_risk': -20, 'inspection_resolved': 10, 'inspection_open': -15},
+        'thresholds': {},
+    },
+}
+
+
+class FormulaError(ValueError):
+    pass
+
+
+def _reduce(ufunc):
+    def apply(*values):
+        if len(values) < 2:
+            raise FormulaError('needs at least two arguments')
+        result = values[0]
+        for value in values[1:]:
+            result = ufunc(result, value)
+        return result
+    return apply
+
+
+FUNCTIONS = {
+    'min': _reduce(np.minimum),
+    'max': _reduce(np.maximum),
+    'abs': np.abs,
+    'clip': np.clip,
+    'round': np.round,
+    'sqrt': np.sqrt,
+    'log': np.log,
+    'exp': np.exp,
+    'where': np.where,
+    'coalesce': lambda value, default: np.where(np.isnan(value), default, value),
+}
+
+HELPERS = {
+    '_where': np.where,
+    '_and': _reduce(np.logical_and),
+    '_or': _reduce(np.logical_or),
+    '_not': np.logical_not,
+    '_pow': lambda base, exponent: np.power(base, np.clip(exponent, -MAX_EXPONENT, MAX_EXPONENT)),
+    **{f'_{name}': function for name, function in FUNCTIONS.items()},
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call,
+    ast.Name, ast.Load, ast.Constant, ast.Subscript,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+PARAMETER_TABLES = ('weights', 'thresholds')
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Folds weights/thresholds into constants and makes the tree element-wise"""
+
+    def __init__(self, tables, allowed_variables):
+        self.tables = tables
+        self.allowed_variables = allowed_variables
+        self.variables = []
+
+    def visit_Name(self, node):
+        name = node.id
+        if name in PARAMETER_TABLES:
+            raise FormulaError(f"'{name}' can only be used as {name}['key']")
+        if name.startswith('_') or (self.allowed_variables is not None and name not in self.allowed_variables):
+            raise FormulaError(f"Unknown variable '{name}'")
+        if name in CATEGORICAL_VARIABLES:
+            raise FormulaError(f"'{name}' can only be compared, e.g. {name} == 'VALUE'")
+        return self._use(node)
+
+    def _use(self, node):
+        if node.id not in self.variables:
+            self.variables.append(node.id)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, (bool, int, float)):
+            # Floats overflow to inf instead of growing without bound
+            return ast.copy_location(ast.Constant(float(node.value)), node)
+        if isinstance(node.value, str):
+            raise FormulaError('Strings can only be compared, e.g. risk_level == \'LOW\'')
+        raise FormulaError(f'Unsupported constant of type {type(node.value).__name__}')
+
+    def _comparand(self, node):
+        """Strings and categorical variables are allowed as they are, other operands are visited"""
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node
+        if (isinstance(node, ast.Name) and node.id in CATEGORICAL_VARIABLES
+                and (self.allowed_variables is None or node.id in self.allowed_variables)):
+            return self._use(node)
+        return self.visit(node)
+
+    def visit_Subscript(self, node):
+        table = node.value.id if isinstance(node.value, ast.Name) else None
+        key = node.slice.value if isinstance(node.slice, ast.Constant) else None
+        if table not in PARAMETER_TABLES or not isinstance(key, str):
+            raise FormulaError("Only weights['key'] and thresholds['key'] can be subscripted")
+        if key not in self.tables[table]:
+            raise FormulaError(f"{table} has no key '{key}'")
+        value = self.tables[table][key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise FormulaError(f"{table}['{key}'] must be a number")
+        return ast.copy_location(ast.Constant(float(value)), node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise FormulaError(f"Unknown function '{ast.unparse(node.func)}'")
+        if node.keywords:
+            raise FormulaError('Keyword arguments are not supported')
+        args = [self.visit(arg) for arg in node.args]
+        return ast.copy_location(ast.Call(ast.Name(f'_{node.func.id}', ast.Load()), args, []), node)
+
+    def visit_IfExp(self, node):
+        args = [self.visit(node.test), self.visit(node.body), self.visit(node.orelse)]
+        return ast.copy_location(ast.Call(ast.Name('_where', ast.Load()), args, []), node)
+
+    def visit_BoolOp(self, node):
+        helper = '_and' if isinstance(node.op, ast.And) else '_or'
+        args = [self.visit(value) for value in node.values]
+        return ast.copy_location(ast.Call(ast.Name(helper, ast.Load()), args, []), node)
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, ast.Not):
+            return ast.copy_location(ast.Call(ast.Name('_not', ast.Load()), [operand], []), node)
+        node.operand = operand
+        return node
+
+    def visit_BinOp(self, node):
+        left, right = self.visit(node.left), self.visit(node.right)
+        if isinstance(node.op, ast.Pow):
+            if isinstance(right, ast.Constant) and abs(right.value) > MAX_EXPONENT:
+                raise FormulaError(f'Exponents are limited to {MAX_EXPONENT}')
+            return ast.copy_location(ast.Call(ast.Name('_pow', ast.Load()), [left, right], []), node)
+        node.left, node.right = left, right
+        return node
+
+    def visit_Compare(self, node):
+        operands = [self._comparand(node.left)] + [self._comparand(comparator) for comparator in node.comparators]
+        # a < b < c compares element-wise as (a < b) & (b < c)
+        pairs = [
+            ast.Compare(operands[i], [op], [operands[i + 1]]) for i, op in enumerate(node.ops)
+        ]
+        if len(pairs) == 1:
+            return ast.copy_location(pairs[0], node)
+        return ast.copy_location(ast.Call(ast.Name('_and', ast.Load()), pairs, []), node)
+
+
+class CompiledFormula:
+    """A validated formula compiled to an element-wise function of its variables"""
+
+    def __init__(self, expression, weights, thresholds, variables, function):
+        self.expression = expression
+        self.weights = weights
+        self.thresholds = thresholds
+        self.variables = variables
+        self.function = function
+
+    def __call__(self, **inputs):
+        try:
+            args = [np.asarray(inputs[name]) for name in self.variables]
+        except KeyError as e:
+            raise FormulaError(f'Missing variable {e.args[0]}')
+        with np.errstate(all='ignore'):
+            try:
+                return self.function(*args)
+            except FormulaError:
+                raise
+            except Exception as e:
+                # The exception's message may quote the values involved
+                raise FormulaError(f'Evaluation failed ({type(e).__name__})')
+
+    def evaluate_cohort(self, size, **inputs):
+        """
+        Float array of ``size`` results (a row count or an array shape), also
+        when the formula ignores its inputs
+        """
+        try:
+            return np.broadcast_to(np.asarray(self(**inputs), dtype=float), size).copy()
+        except (TypeError, ValueError) as e:
+            if isinstance(e, FormulaError):
+                raise
+            raise FormulaError('Formula does not give one number per row')
+
+
+def compile_expression(expression, weights=None, thresholds=None, allowed_variables=None):
+    """Validate and compile ``expression``; raises FormulaError"""
+    if not expression or not expression.strip():
+        raise FormulaError('Expression is empty')
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise FormulaError(f'Expression is longer than {MAX_EXPRESSION_LENGTH} characters')
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f'Invalid syntax: {e.msg}')
+
+    nodes = list(ast.walk(tree))
+    if len(nodes) > MAX_NODES:
+        raise FormulaError(f'Expression has more than {MAX_NODES} elements')
+    for node in nodes:
+        if not isinstance(node, ALLOWED_NODES):
+            raise FormulaError(f'{type(node).__name__} is not allowed in formulas')
+
+    weights, thresholds = weights or {}, thresholds or {}
+    rewriter = _Rewriter({'weights': weights, 'thresholds': thresholds}, allowed_variables)
+    body = rewriter.visit(tree.body)
+    arguments = ast.arguments(
+        posonlyargs=[], args=[ast.arg(name) for name in rewriter.variables],
+        kwonlyargs=[], kw_defaults=[], defaults=[],
+    )
+    function_tree = ast.fix_missing_locations(ast.Expression(ast.Lambda(arguments, body)))
+    function = eval(compile(function_tree, '<formula>', 'eval'), {'__builtins__': {}, **HELPERS})
+    return CompiledFormula(expression, weights, thresholds, tuple(rewriter.variables), function)
+
+
+GENERATION = 'formulas'
+
+
+class FormulaCache:
+    """
+    Compiled and active formulas of one process. Compiled formulas are kept
+    per (id, version, updated_at), so an edit that keeps the version (e.g.
+    in the admin) is compiled again. The active formulas of each type are
+    kept for as long as the formula generation (see apps.core.generations)
+    has not moved: any save or delete of a CalculationFormula, in any
+    process, bumps it, and the next use here starts over.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.compiled = {}
+        self.active = {}
+
+    def compile(self, formula):
+        key = (formula.pk, formula.version, formula.updated_at)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = compile_expression(
+                formula.formula_expression, formula.weights, formula.thresholds,
+                FORMULA_VARIABLES.get(formula.formula_type),
+            )
+            with self.lock:
+                if len(self.compiled) >= CACHE_SIZE:
+                    self.compiled.clear()
+                self.compiled[key] = compiled
+        return compiled
+
+    def refresh(self):
+        """Drop the cached formulas if the generation moved; one query"""
+        stamp = generations.current(GENERATION)
+        if stamp != self.stamp:
+            with self.lock:
+                self.compiled, self.active = {}, {}
+                self.stamp = stamp
+
+    def active_formulas(self, formula_types):
+        self.refresh()
+        missing = [formula_type for formula_type in formula_types if formula_type not in self.active]
+        if missing:
+            active = {formula_type: None for formula_type in missing}
+            formulas = CalculationFormula.objects.filter(formula_type__in=missing, is_active=True)
+            for formula in formulas.order_by('formula_type', '-version'):
+                active[formula.formula_type] = active[formula.formula_type] or formula
+            loaded = {
+                formula_type: (formula, self.compile(formula)) if formula is not None
+                else (None, default_formula(formula_type))
+                for formula_type, formula in active.items()
+            }
+            with self.lock:
+                self.active.update(loaded)
+        return {formula_type: self.active[formula_type] for formula_type in formula_types}
+
+
+_process_cache = FormulaCache()
+_defaults = {}
+
+
+def compile_formula(formula):
+    """Compiled form of a CalculationFormula, cached"""
+    return _process_cache.compile(formula)
+
+
+def default_formula(formula_type):
+    compiled = _defaults.get(formula_type)
+    if compiled is None:
+        spec = DEFAULT_FORMULAS[formula_type]
+        compiled = compile_expression(
+            spec['formula_expression'], spec['weights'], spec['thresholds'], FORMULA_VARIABLES[formula_type]
+        )
+        _defaults[formula_type] = compiled
+    return compiled
+
+
+def active_formulas(formula_types):
+    """
+    {formula_type: (active CalculationFormula or None, its compiled form or
+    the default's)} for ``formula_types``. One query while nothing changed,
+    two after a formula was saved or deleted anywhere.
+    """
+    return _process_cache.active_formulas(formula_types)
+
+
+def remember_active(sender, instance, raw=False, **kwargs):
+    """Record whether the row being saved is active in the database before the save"""
+    instance._was_active = bool(
+        not raw and not instance._state.adding and not instance.is_active
+        and sender.objects.filter(pk=instance.pk, is_active=True).exists()
+    )
+
+
+def formulas_changed(sender, instance=None, **kwargs):
+    generations.bump(GENERATION)
+    scope = FORMULA_SCOPES.get(getattr(instance, 'formula_type', None))
+    if scope and (instance.is_active or getattr(instance, '_was_active', False)):
+        mark_dirty(SMI.objects.filter(status='ACTIVE').values_list('pk', flat=True), scope)
+
+
+def track_changes():
+    """
+    Bump the formula generation on every save and delete of a
+    CalculationFormula, and mark the cohort dirty for the scores the formula
+    feeds when it is or was active
+    """
+    pre_save.connect(remember_active, sender=CalculationFormula, dispatch_uid='formula-generation-pre-save')
+    post_save.connect(formulas_changed, sender=CalculationFormula, dispatch_uid='formula-generation-save')
+    post_delete.connect(formulas_changed, sender=CalculationFormula, dispatch_uid='formula-generation-delete')
+
+
+def active_formula(formula_type):
+    return active_formulas([formula_type])[formula_type]
+
+
+def threshold(compiled, formula_type, level):
+    """thresholds[level] of a compiled formula, falling back to the default formula's"""
+    value = compiled.thresholds.get(level)
+    if value is None:
+        value = DEFAULT_FORMULAS[formula_type]['thresholds'][level]
+    return float(value)
@@ -25,7 +25,7 @@ class CalculationFormula(models.Model):
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    formula_type = models.CharField(max_length=50, choices=FORMULA_TYPES, unique=True)
+    formula_type = models.CharField(max_length=50, choices=FORMULA_TYPES)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     
@@ -114,6 +114,9 @@ class CalculationBreakdown(models.Model):
     calculated_at = models.DateTimeField(default=timezone.now)
     calculated_by = models.CharField(max_length=100, default='system')
     
+    # Hash of formula, values and components (see apps.core.breakdown_store)
+    content_hash = models.CharField(max_length=64, blank=True)
+    
     def __str__(self):
         return f"{self.calculation_type} - {self.final_value} ({self.calculated_at.strftime('%Y-%m-%d')})"
     
@@ -123,5 +126,55 @@ class CalculationBreakdown(models.Model):
         ordering = ['-calculated_at']
         indexes = [
             models.Index(fields=['calculation_type', 'reference_id']),
-            models.Index(fields=['-calculated_at']),
+            models.Index(fields=['-calculated_at', '-id']),
         ]
+
+
+class LatestCalculationBreakdown(models.Model):
+    """
+    The current breakdown of each (calculation_type, reference_id), kept up
+    to date by apps.core.breakdown_store. checked_at is the last time a run
+    produced the same content.
+    """
+    calculation_type = models.CharField(max_length=50)
+    reference_id = models.UUIDField()
+    breakdown = models.OneToOneField(CalculationBreakdown, on_delete=models.CASCADE, related_name='latest')
+    content_hash = models.CharField(max_length=64)
+    checked_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.calculation_type} - {self.reference_id}"
+    
+    class Meta:
+        verbose_name = "Latest Calculation Breakdown"
+        verbose_name_plural = "Latest Calculation Breakdowns"
+        unique_together = ['reference_id', 'calculation_type']
+
+
+class CalculationBreakdownDailySummary(models.Model):
+    """
+    Breakdown history older than the retention period, rolled up per
+    (calculation_type, reference_id) and day by compact_breakdowns()
+    """
+    calculation_type = models.CharField(max_length=50)
+    reference_id = models.UUIDField()
+    day = models.DateField()
+    samples = models.IntegerField(default=0)
+    min_value = models.DecimalField(max_digits=10, decimal_places=4)
+    max_value = models.DecimalField(max_digits=10, decimal_places=4)
+    total_value = models.DecimalField(max_digits=18, decimal_places=4)
+    first_calculated_at = models.DateTimeField()
+    last_calculated_at = models.DateTimeField()
+    
+    @property
+    def average_value(self):
+        return self.total_value / self.samples if self.samples else None
+    
+    def __str__(self):
+        return f"{self.calculation_type} - {self.reference_id} ({self.day})"
+    
+    class Meta:
+        verbose_name = "Calculation Breakdown Daily Summary"
+        verbose_name_plural = "Calculation Breakdown Daily Summaries"
+        ordering = ['-day']
+        unique_together = ['reference_id', 'calculation_type', 'day']
@@ -0,0 +1,112 @@
+"""
+Cohort preview of a formula.
+
+evaluate_formula() runs a compiled formula, saved or draft, over a set of
+SMIs and summarises the result without writing anything, so analysts can
+see what an edited formula would produce before they activate it. The
+inputs are loaded once into arrays and the formula is evaluated in one call:
+
+    FSI_SCORE, CAR,   the latest statement of each SMI (one query), scored
+    COMPOSITE_RISK    with risk_scoring.score_cohort() with the previewed
+                      formula in place of the active one of its type
+    COMPLIANCE_SCORE  the latest risk level and inspection status of each
+                      SMI (one query), as for the compliance indices
+
+Numeric thresholds are lower bounds of their level: a value falls into the
+highest-bound level it reaches, and into HIGH below all of them (the FSI and
+CAR formulas fall back to the default LOW and MEDIUM bounds, as in scoring).
+"""
+import numpy as np
+
+from . import compliance_scoring, formula_engine, risk_scoring
+
+PREVIEW_TYPES = tuple(formula_engine.FORMULA_VARIABLES)
+BELOW_THRESHOLDS = 'HIGH'
+
+# score_cohort() result holding each risk formula's values
+RISK_RESULTS = {
+    'FSI_SCORE': 'fsi',
+    'CAR': 'car',
+    'COMPOSITE_RISK': 'overall',
+}
+
+
+def level_bounds(compiled, formula_type):
+    """[(bound, level)] of the numeric thresholds, highest bound first"""
+    thresholds = {**formula_engine.DEFAULT_FORMULAS[formula_type]['thresholds'], **compiled.thresholds}
+    bounds = [
+        (float(value), level) for level, value in thresholds.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+    return sorted(bounds, reverse=True)
+
+
+def classify(values, bounds):
+    """Level of each value, or None everywhere when there are no bounds"""
+    if not bounds:
+        return np.full(values.shape, None, dtype=object)
+    levels = np.full(values.shape, BELOW_THRESHOLDS, dtype=object)
+    with np.errstate(invalid='ignore'):
+        # Lowest bound first, so higher bounds overwrite
+        for bound, level in reversed(bounds):
+            levels[values >= bound] = level
+    levels[~np.isfinite(values)] = None
+    return levels
+
+
+def cohort_values(formula_type, compiled, smis):
+    """(smi ids, float array of the formula's values) over ``smis``"""
+    if formula_type == 'COMPLIANCE_SCORE':
+        inputs = compliance_scoring.latest_inputs(smis)
+        return [row[0] for row in inputs], compliance_scoring.compliance_scores(inputs, compiled)
+
+    rows = risk_scoring.latest_statements(smis)
+    formulas = risk_scoring.scoring_formulas()
+    formulas[formula_type] = (None, compiled)
+    scores = risk_scoring.score_cohort(rows, formulas)
+    return scores['smi_id'], scores[RISK_RESULTS[formula_type]]
+
+
+def distribution(values):
+    """count, invalid (NaN or infinite) and min/median/p90/max of the finite values"""
+    finite = values[np.isfinite(values)]
+    summary = {'count': int(values.size), 'invalid': int(values.size - finite.size)}
+    if finite.size:
+        quantiles = np.percentile(finite, [0, 50, 90, 100])
+    else:
+        quantiles = [None] * 4
+    for name, value in zip(('min', 'median', 'p90', 'max'), quantiles):
+        summary[name] = None if value is None else round(float(value), 4)
+    return summary
+
+
+def evaluate_formula(formula_type, compiled, smis):
+    """
+    Distribution, per-level counts and per-SMI values of ``compiled`` over
+    ``smis``. Reads only.
+    """
+    smi_ids, values = cohort_values(formula_type, compiled, smis)
+    bounds = level_bounds(compiled, formula_type)
+    levels = classify(values, bounds)
+
+    level_counts = {}
+    if bounds:
+        level_counts = {level: 0 for _, level in bounds}
+        level_counts.setdefault(BELOW_THRESHOLDS, 0)
+        for level, count in zip(*np.unique(levels[levels != None].astype(str), return_counts=True)):  # noqa: E711
+            level_counts[str(level)] = int(count)
+
+    return {
+        'formula_type': formula_type,
+        'thresholds': {level: bound for bound, level in bounds},
+        'distribution': distribution(values),
+        'level_counts': level_counts,
+        'values': [
+            {
+                'smi_id': str(smi_id),
+                'value': round(float(value), 4) if np.isfinite(value) else None,
+                'level': level,
+            }
+            for smi_id, value, level in zip(smi_ids, values.tolist(), levels.tolist())
+        ],
+    }
@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from .formula_engine import FORMULA_VARIABLES, FormulaError, compile_expression, compile_formula
+from .models import SMI
+from .what_if import MAX_SCENARIOS, SHOCKABLE_INPUTS
 from .formula_models import CalculationFormula, CalculationBreakdown
 
 
@@ -13,6 +16,23 @@ class CalculationFormulaSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at', 'version']
     
+    def validate(self, attrs):
+        # The expression must compile against the formula's own weights and thresholds
+        def current(field):
+            if field in attrs:
+                return attrs[field]
+            return getattr(self.instance, field, None)
+
+        formula_type = current('formula_type')
+        try:
+            compile_expression(
+                current('formula_expression'), current('weights'), current('thresholds'),
+                FORMULA_VARIABLES.get(formula_type),
+            )
+        except FormulaError as e:
+            raise serializers.ValidationError({'formula_expression': str(e)})
+        return attrs
+    
     def create(self, validated_data):
         # Set the user who created the formula
         request = self.context.get('request')
@@ -32,6 +52,94 @@ class CalculationFormulaSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+class CohortSerializer(serializers.Serializer):
+    """SMI filter of the cohort actions; by default every active SMI"""
+    smi_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    status = serializers.ChoiceField(choices=[choice for choice, _ in SMI._meta.get_field('status').choices], required=False)
+    business_type = serializers.CharField(required=False)
+
+    def get_smis(self):
+        smis = SMI.objects.filter(status=self.validated_data.get('status', 'ACTIVE'))
+        if 'smi_ids' in self.validated_data:
+            smis = smis.filter(pk__in=self.validated_data['smi_ids'])
+        if 'business_type' in self.validated_data:
+            smis = smis.filter(business_type=self.validated_data['business_type'])
+        return smis
+
+    def get_cohort(self):
+        """The filter as plain data, e.g. for cache keys"""
+        return {
+            'smi_ids': sorted(str(pk) for pk in self.validated_data.get('smi_ids', [])) or None,
+            'status': self.validated_data.get('status', 'ACTIVE'),
+            'business_type': self.validated_data.get('business_type'),
+        }
+
+
+class FormulaEvaluationSerializer(CohortSerializer):
+    """
+    Input of the evaluate action: a saved formula, a draft, or a saved
+    formula with draft edits, plus the SMIs to evaluate it over.
+    """
+    formula = serializers.PrimaryKeyRelatedField(queryset=CalculationFormula.objects.all(), required=False)
+    formula_type = serializers.ChoiceField(choices=list(FORMULA_VARIABLES), required=False)
+    formula_expression = serializers.CharField(required=False)
+    weights = serializers.DictField(required=False)
+    thresholds = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        formula = attrs.get('formula')
+
+        def current(field, default=None):
+            if field in attrs:
+                return attrs[field]
+            return getattr(formula, field, default)
+
+        formula_type = current('formula_type')
+        if formula_type not in FORMULA_VARIABLES:
+            raise serializers.ValidationError(
+                {'formula_type': f'Choose one of: {", ".join(FORMULA_VARIABLES)}'}
+            )
+        if formula is not None and formula.formula_type != formula_type:
+            raise serializers.ValidationError({'formula_type': 'Does not match the saved formula'})
+        drafted = any(field in attrs for field in ('formula_expression', 'weights', 'thresholds'))
+        try:
+            if formula is not None and not drafted:
+                attrs['compiled'] = compile_formula(formula)
+            else:
+                attrs['compiled'] = compile_expression(
+                    current('formula_expression'), current('weights', {}), current('thresholds', {}),
+                    FORMULA_VARIABLES[formula_type],
+                )
+        except FormulaError as e:
+            raise serializers.ValidationError({'formula_expression': str(e)})
+        attrs['formula_type'] = formula_type
+        return attrs
+
+
+class WhatIfSerializer(CohortSerializer):
+    """
+    Input of the what_if action: relative shocks per scoring input, e.g.
+    {"grid": {"profit_margin": [-0.2, -0.1], "total_equity": [-0.3]}}
+    """
+    grid = serializers.DictField(
+        child=serializers.ListField(child=serializers.FloatField(min_value=-1), allow_empty=False),
+        allow_empty=False,
+    )
+
+    def validate_grid(self, grid):
+        unknown = set(grid) - set(SHOCKABLE_INPUTS)
+        if unknown:
+            raise serializers.ValidationError(
+                f'Unknown inputs {", ".join(sorted(unknown))}; choose from {", ".join(SHOCKABLE_INPUTS)}'
+            )
+        scenarios = 1
+        for shocks in grid.values():
+            scenarios *= len(shocks)
+        if scenarios > MAX_SCENARIOS:
+            raise serializers.ValidationError(f'The grid has {scenarios} scenarios; the limit is {MAX_SCENARIOS}')
+        return grid
+
+
 class CalculationBreakdownSerializer(serializers.ModelSerializer):
     """Serializer for calculation breakdowns"""
     formula_name = serializers.CharField(source='formula.name', read_only=True)
@@ -1,12 +1,21 @@
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 import logging
 
+from .breakdown_store import latest_breakdown
+from .formula_engine import FormulaError
 from .formula_models import CalculationFormula, CalculationBreakdown
+from .formula_preview import evaluate_formula
+from .what_if import run_what_if
+from .mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
+from .pagination import KeysetPagination
 from .formula_serializers import (
     CalculationFormulaSerializer,
+    FormulaEvaluationSerializer,
+    WhatIfSerializer,
     CalculationBreakdownSerializer,
     CalculationBreakdownDetailSerializer
 )
@@ -14,7 +23,7 @@ from .formula_serializers import (
 logger = logging.getLogger(__name__)
 
 
-class CalculationFormulaViewSet(viewsets.ModelViewSet):
+class CalculationFormulaViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing calculation formulae.
     Only admins can create, update, or delete formulae.
@@ -29,7 +38,7 @@ class CalculationFormulaViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         # Allow read-only access for authenticated users
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'evaluate', 'what_if']:
             return [permissions.IsAuthenticated()]
         # Only admins can modify formulae
         return [permissions.IsAdminUser()]
@@ -65,19 +74,55 @@ class CalculationFormulaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['post'])
+    def evaluate(self, request):
+        """
+        Evaluate a saved or draft formula over the cohort without saving
+        anything: distribution, counts per threshold level and per-SMI values
+        """
+        serializer = FormulaEvaluationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = evaluate_formula(
+                serializer.validated_data['formula_type'],
+                serializer.validated_data['compiled'],
+                serializer.get_smis(),
+            )
+        except FormulaError as e:
+            return Response({'formula_expression': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=False, methods=['post'])
+    def what_if(self, request):
+        """
+        Impact of a grid of input shocks on the active risk formulas' scores
+        and risk levels, per scenario (and per SMI for small grids)
+        """
+        serializer = WhatIfSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = run_what_if(serializer.validated_data['grid'], serializer.get_smis(), serializer.get_cohort())
+        except FormulaError as e:
+            return Response({'error': f'Active formula failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
     @action(detail=True, methods=['post'])
     def activate(self, request, pk=None):
         """Activate a formula (deactivates others of the same type)"""
         formula = self.get_object()
         
-        # Deactivate all other formulae of the same type
-        CalculationFormula.objects.filter(
-            formula_type=formula.formula_type
-        ).exclude(id=formula.id).update(is_active=False)
-        
-        # Activate this formula
-        formula.is_active = True
-        formula.save()
+        # One transaction, so other processes see the switch, the formula
+        # generation bump and the cohort's rescore markers (sent by save())
+        # together
+        with transaction.atomic():
+            # Deactivate all other formulae of the same type
+            CalculationFormula.objects.filter(
+                formula_type=formula.formula_type
+            ).exclude(id=formula.id).update(is_active=False)
+            
+            # Activate this formula
+            formula.is_active = True
+            formula.save()
         
         logger.info(f"Formula {formula.name} activated by {request.user.username}")
         
@@ -115,7 +160,7 @@ class CalculationFormulaViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_201_CREATED)
 
 
-class CalculationBreakdownViewSet(viewsets.ReadOnlyModelViewSet):
+class CalculationBreakdownViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing calculation breakdowns.
     Read-only for all authenticated users.
@@ -127,6 +172,8 @@ class CalculationBreakdownViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['calculation_type', 'reference_id']
     ordering_fields = ['calculated_at', 'final_value']
     ordering = ['-calculated_at']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-calculated_at', '-id')
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -145,13 +192,8 @@ class CalculationBreakdownViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        queryset = self.queryset.filter(reference_id=reference_id)
-        
-        if calculation_type:
-            queryset = queryset.filter(calculation_type=calculation_type)
-        
         # Get the most recent breakdown
-        breakdown = queryset.first()
+        breakdown = latest_breakdown(reference_id, calculation_type)
         
         if not breakdown:
             return Response(
@@ -173,7 +215,7 @@ class CalculationBreakdownViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        queryset = self.queryset.filter(calculation_type=calculation_type)
+        queryset = self.optimize_queryset(self.queryset.filter(calculation_type=calculation_type))
         page = self.paginate_queryset(queryset)
         
         if page is not None:
@@ -0,0 +1,42 @@
+"""
+Cross-process cache invalidation.
+
+Each gunicorn and Celery process keeps its own caches (the Django cache is
+per process unless a shared backend is configured), so a change made in one
+process is announced through a CacheGeneration row instead:
+
+    bump(name)      called by the writer, in the writer's transaction, so the
+                    new generation becomes visible together with the change
+    current(name)   read by every process before it uses its cache, a
+                    unique-index lookup of one row; a cache built under
+                    another stamp is stale
+
+See apps.core.formula_engine for the compiled-formula cache.
+"""
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CacheGeneration
+
+
+def current(name):
+    """Stamp of the current generation of ``name``; '' before the first bump"""
+    return next(iter(CacheGeneration.objects.filter(name=name).values_list('stamp', flat=True)), '')
+
+
+def bump(name):
+    """Invalidate the ``name`` caches of every process"""
+    stamp = uuid.uuid4().hex
+    if CacheGeneration.objects.filter(name=name).update(
+        generation=F('generation') + 1, stamp=stamp, changed_at=timezone.now()
+    ):
+        return
+    try:
+        with transaction.atomic():
+            CacheGeneration.objects.create(name=name, generation=1, stamp=stamp)
+    except IntegrityError:
+        # Created by a concurrent bump
+        bump(name)
@@ -0,0 +1,321 @@
+"""
+Database-backed task queue.
+
+A lightweight stand-in for the Redis broker on single-node installs and in
+CI, selected with settings.TASK_QUEUE_BACKEND = 'database':
+
+    enqueue()        adds a QueuedJob for a task (or any importable callable)
+    claim()          takes due jobs for one worker: SELECT ... FOR UPDATE SKIP
+                     LOCKED where the database supports it; on SQLite, which
+                     has no row locks, a conditional UPDATE per candidate row,
+                     which only one worker can win
+    run_job()        runs the task in the worker process and records the
+                     outcome; exceptions are retried with backoff up to the
+                     job's max_attempts. While the task runs a heartbeat
+                     thread refreshes the job's locked_at, so requeue_stale()
+                     only takes back jobs of workers that died. The outcome
+                     is written only while the job is still RUNNING under
+                     this worker: a worker whose job was taken back does not
+                     overwrite it, nor release a chord part a second time
+    enqueue_chord()  header jobs plus a WAITING body job that is queued when
+                     the last header job finishes, like a Celery chord
+    schedule_due()   enqueues the entries of the Celery beat schedule
+                     (settings.CELERY_BEAT_SCHEDULE) that are due
+
+Application code calls dispatch(), which enqueues with the database backend
+and falls back to .delay() otherwise. The queue_worker and queue_scheduler
+management commands run the workers and the scheduler; benchmark_job_queue
+measures throughput.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import telemetry
+from .models import QueuedJob, ScheduleEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'default'
+CANDIDATES_PER_JOB = 8  # rows a worker tries per job it wants when rows cannot be locked
+RETRY_BASE = timedelta(seconds=30)
+REAP_INTERVAL = 60  # seconds between checks for jobs of dead workers
+
+
+def using_database_queue():
+    return getattr(settings, 'TASK_QUEUE_BACKEND', 'celery') == 'database'
+
+
+def default_max_attempts():
+    return getattr(settings, 'TASK_QUEUE_MAX_ATTEMPTS', 3)
+
+
+def job_timeout():
+    return timedelta(seconds=getattr(settings, 'TASK_QUEUE_JOB_TIMEOUT', 3600))
+
+
+def heartbeat_interval():
+    return getattr(settings, 'TASK_QUEUE_HEARTBEAT', 60)
+
+
+def retry_delay(attempts):
+    """Delay before retry number ``attempts`` + 1: 30s, 1m, 2m, ..."""
+    return RETRY_BASE * (2 ** max(attempts - 1, 0))
+
+
+def enqueue(task_name, args=(), kwargs=None, queue=DEFAULT_QUEUE, run_after=None, max_attempts=None):
+    return QueuedJob.objects.create(
+        task_name=task_name, args=list(args), kwargs=kwargs or {}, queue=queue,
+        run_after=run_after or timezone.now(), max_attempts=max_attempts or default_max_attempts(),
+    )
+
+
+def enqueue_chord(header, body, queue=DEFAULT_QUEUE):
+    """
+    Queue ``header``, a list of (task_name, args), and run ``body``, a
+    (task_name, args) pair, once every header job has finished (whether it
+    succeeded or not). Returns the body job.
+    """
+    max_attempts = default_max_attempts()
+    with transaction.atomic():
+        callback = QueuedJob.objects.create(
+            task_name=body[0], args=list(body[1]), queue=queue,
+            status='WAITING' if header else 'QUEUED', pending_parts=len(header), max_attempts=max_attempts,
+        )
+        QueuedJob.objects.bulk_create([
+            QueuedJob(task_name=task_name, args=list(args), queue=queue, callback=callback, max_attempts=max_attempts)
+            for task_name, args in header
+        ])
+    return callback
+
+
+def dispatch(task, *args, **kwargs):
+    """Send a Celery task to the configured backend"""
+    if using_database_queue():
+        return enqueue(task.name, args, kwargs)
+    return task.delay(*args, **kwargs)
+
+
+def claim(worker_id, queue=DEFAULT_QUEUE, limit=1):
+    """Mark up to ``limit`` due jobs as RUNNING for ``worker_id`` and return them"""
+    now = timezone.now()
+    due = QueuedJob.objects.filter(queue=queue, status='QUEUED', run_after__lte=now).order_by('run_after', 'id')
+    claimed = {'status': 'RUNNING', 'locked_by': worker_id, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            QueuedJob.objects.filter(pk__in=ids).update(**claimed)
+    else:
+        ids = []
+        for pk in due.values_list('pk', flat=True)[:limit * CANDIDATES_PER_JOB]:
+            # Still QUEUED only if no other worker took it since the SELECT
+            if due.filter(pk=pk).update(**claimed):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(QueuedJob.objects.filter(pk__in=ids).order_by('run_after', 'id'))
+
+
+def _jsonable(value):
+    try:
+        return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def _release_part(callback_id):
+    QueuedJob.objects.filter(pk=callback_id).update(pending_parts=F('pending_parts') - 1)
+    QueuedJob.objects.filter(pk=callback_id, status='WAITING', pending_parts=0).update(
+        status='QUEUED', run_after=timezone.now()
+    )
+
+
+def _held(job):
+    """The job, as long as it is still RUNNING under the worker that claimed it"""
+    return QueuedJob.objects.filter(pk=job.pk, status='RUNNING', locked_by=job.locked_by)
+
+
+def _update_held(job, status, **fields):
+    if not _held(job).update(status=status, **fields):
+        logger.warning(f"Job {job.pk} ({job.task_name}) was taken back from {job.locked_by}; outcome discarded")
+        return False
+    job.status = status
+    return True
+
+
+def _finish(job, status, result=None, error=''):
+    with transaction.atomic():
+        if _update_held(job, status, result=result, error=error, finished_at=timezone.now()) and job.callback_id:
+            _release_part(job.callback_id)
+
+
+def heartbeat(job):
+    """Refresh the lock of a running job; False once it is no longer ours"""
+    return bool(_held(job).update(locked_at=timezone.now()))
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, job):
+        super().__init__(name=f'job-{job.pk}-heartbeat', daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(heartbeat_interval()):
+                try:
+                    if not heartbeat(self.job):
+                        return
+                except OperationalError as e:
+                    logger.warning(f"Heartbeat of job {self.job.pk} failed: {str(e)}")
+        finally:
+            # The thread's own connection
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome; returns the new status"""
+    beat = _Heartbeat(job)
+    beat.start()
+    try:
+        func = import_string(job.task_name)
+        # Called directly (Task.apply() would need the Celery result backend)
+        with telemetry.task_id(f'job-{job.pk}'):
+            result = func(*job.args, **job.kwargs)
+    except Exception as e:
+        beat.stop()
+        logger.exception(f"Job {job.pk} ({job.task_name}) failed on attempt {job.attempts}")
+        if job.attempts < job.max_attempts:
+            _update_held(job, 'QUEUED', error=str(e), run_after=timezone.now() + retry_delay(job.attempts))
+        else:
+            _finish(job, 'FAILED', error=str(e))
+        return job.status
+
+    beat.stop()
+    _finish(job, 'DONE', result=_jsonable(result))
+    return job.status
+
+
+def requeue_stale(queue=DEFAULT_QUEUE):
+    """Put back jobs left RUNNING by a worker that died; returns how many"""
+    now = timezone.now()
+    stale = QueuedJob.objects.filter(queue=queue, status='RUNNING', locked_at__lt=now - job_timeout())
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(status='QUEUED', run_after=now)
+    for job in stale:
+        _finish(job, 'FAILED', error='Worker lost')
+    return requeued
+
+
+def has_pending(queue=DEFAULT_QUEUE):
+    return QueuedJob.objects.filter(queue=queue, status__in=['QUEUED', 'WAITING']).exists()
+
+
+def work(queue=DEFAULT_QUEUE, burst=False, poll_interval=1.0, batch_size=1, stop=None):
+    """
+    Process jobs until ``stop`` (a threading or multiprocessing Event) is set,
+    or, with ``burst``, until the queue is empty. Returns the number of jobs run.
+    """
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    processed = 0
+    last_reap = 0
+    while stop is None or not stop.is_set():
+        try:
+            if time.monotonic() - last_reap > REAP_INTERVAL:
+                requeue_stale(queue)
+                last_reap = time.monotonic()
+            jobs = claim(worker_id, queue, batch_size)
+        except OperationalError as e:
+            # SQLite allows one writer at a time; back off when it stays busy
+            logger.warning(f"Worker {worker_id} could not claim jobs: {str(e)}")
+            time.sleep(poll_interval)
+            continue
+
+        if not jobs:
+            if burst and not has_pending(queue):
+                break
+            time.sleep(poll_interval)
+            continue
+        for job in jobs:
+            run_job(job)
+            processed += 1
+    return processed
+
+
+def _worker_process(stop, options):
+    # Ctrl-C reaches the whole process group; the parent stops the workers via ``stop``
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(stop=stop, **options)
+
+
+def run_workers(processes, **options):
+    """Run ``processes`` forked worker processes until they exit or SIGINT/SIGTERM"""
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    # Children must open their own database connections
+    connections.close_all()
+    workers = [context.Process(target=_worker_process, args=(stop, options)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=1)
+    except KeyboardInterrupt:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+def schedule_due(queue=DEFAULT_QUEUE):
+    """
+    Enqueue the beat schedule entries that are due. Returns (names enqueued,
+    seconds until the next entry may be due).
+    """
+    from celery import current_app
+    from celery.schedules import maybe_schedule
+
+    entries = getattr(settings, 'CELERY_BEAT_SCHEDULE', {})
+    now = timezone.now()
+    enqueued = []
+    next_check = None
+    for name, entry in entries.items():
+        state, _ = ScheduleEntry.objects.get_or_create(
+            name=name, defaults={'task_name': entry['task'], 'last_run_at': now}
+        )
+        is_due, remaining = maybe_schedule(entry['schedule'], app=current_app).is_due(state.last_run_at)
+        next_check = remaining if next_check is None else min(next_check, remaining)
+        if not is_due:
+            continue
+        # Several schedulers may be running: only the one that moves last_run_at enqueues
+        moved = ScheduleEntry.objects.filter(pk=state.pk, last_run_at=state.last_run_at).update(
+            task_name=entry['task'], last_run_at=now, total_run_count=F('total_run_count') + 1
+        )
+        if moved:
+            enqueue(
+                entry['task'], entry.get('args', ()), entry.get('kwargs'),
+                queue=entry.get('options', {}).get('queue', queue),
+            )
+            enqueued.append(name)
+    return enqueued, next_check
@@ -0,0 +1,173 @@
+"""
+Batched notification mailer.
+
+send_pending() works through unsent notifications a batch at a time:
+
+    1. claim a batch with a conditional UPDATE that stamps the rows with a
+       claim token, as job_queue.claim() does: a row is only taken while it
+       is still unclaimed, so two workers never pick the same notification,
+       on SQLite as well. The claim commits before anything is sent.
+    2. send the batch over one connection from the configured EMAIL_BACKEND,
+       outside any transaction
+    3. record the outcome of the whole batch, and clear the claim, with one
+       bulk_update
+
+A claim older than CLAIM_TIMEOUT is treated as abandoned (its worker died)
+and the notification can be claimed again.
+
+Each recipient domain gets at most NOTIFICATION_DOMAIN_RATE_LIMITS[domain]
+(or NOTIFICATION_DEFAULT_DOMAIN_RATE) messages per minute. The counters
+live in the Django cache, so they are shared between workers when the
+cache is. Messages over the limit are postponed to the next window. A
+message that fails is retried with exponential backoff and abandoned after
+NOTIFICATION_MAX_EMAIL_ATTEMPTS tries.
+
+The backend is looked up through get_connection(), so the locmem and
+console backends (or a local SMTP stub) work unchanged.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+RATE_WINDOW = 60  # seconds
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+PENDING_WINDOW = timedelta(days=1)
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+UPDATE_FIELDS = ['email_sent', 'email_sent_at', 'email_attempts', 'email_next_attempt_at', 'email_last_error',
+                 'email_claimed_by', 'email_claimed_at']
+
+
+def max_attempts():
+    return getattr(settings, 'NOTIFICATION_MAX_EMAIL_ATTEMPTS', 5)
+
+
+def domain_rate_limit(domain):
+    limits = getattr(settings, 'NOTIFICATION_DOMAIN_RATE_LIMITS', {})
+    return limits.get(domain, getattr(settings, 'NOTIFICATION_DEFAULT_DOMAIN_RATE', 60))
+
+
+def backoff_delay(attempts):
+    """Delay before retry number ``attempts`` + 1: 1, 2, 4, ... minutes up to BACKOFF_MAX"""
+    return min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+
+
+def _claimable(now):
+    """Unsent, due and unclaimed; only the notification's own columns, so it can guard an UPDATE"""
+    return (
+        (Q(email_next_attempt_at__isnull=True) | Q(email_next_attempt_at__lte=now))
+        & (Q(email_claimed_at__isnull=True) | Q(email_claimed_at__lte=now - CLAIM_TIMEOUT))
+        & Q(email_sent=False, email_attempts__lt=max_attempts(), created_at__gte=now - PENDING_WINDOW)
+    )
+
+
+def pending_notifications(now):
+    return Notification.objects.filter(_claimable(now)).exclude(user__email='')
+
+
+def claim(now, batch_size=BATCH_SIZE):
+    """Claim up to ``batch_size`` pending notifications for this worker and return them"""
+    candidates = list(pending_notifications(now).order_by('created_at', 'id').values_list('pk', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    # Still claimable only if no other worker took the row since the SELECT
+    Notification.objects.filter(_claimable(now), pk__in=candidates).update(
+        email_claimed_by=token, email_claimed_at=now
+    )
+    return list(Notification.objects.filter(email_claimed_by=token).select_related('user').order_by('created_at', 'id'))
+
+
+def _take_rate_slot(domain, now):
+    """Reserve one send for ``domain`` in the current window; False when the window is full"""
+    window = int(now.timestamp()) // RATE_WINDOW
+    key = f'mailer-rate:{domain}:{window}'
+    cache.add(key, 0, timeout=RATE_WINDOW * 2)
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=RATE_WINDOW * 2)
+        used = 1
+    return used <= domain_rate_limit(domain)
+
+
+def _next_window(now):
+    window = int(now.timestamp()) // RATE_WINDOW
+    return now + timedelta(seconds=(window + 1) * RATE_WINDOW - now.timestamp())
+
+
+def _build_message(notification, connection):
+    return EmailMessage(
+        subject=notification.title,
+        body=notification.message,
+        from_email=settings.EMAIL_HOST_USER,
+        to=[notification.user.email],
+        connection=connection,
+    )
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """
+    Claim and send one batch. Returns (claimed, sent); claimed is 0 when
+    nothing is left to do.
+    """
+    now = timezone.now()
+    sent = 0
+    batch = claim(now, batch_size)
+    if not batch:
+        return 0, 0
+
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for notification in batch:
+            notification.email_claimed_by = ''
+            notification.email_claimed_at = None
+            domain = notification.user.email.rpartition('@')[2].lower()
+            if not _take_rate_slot(domain, now):
+                notification.email_next_attempt_at = _next_window(now)
+                continue
+            try:
+                connection.send_messages([_build_message(notification, connection)])
+            except Exception as e:
+                notification.email_attempts += 1
+                notification.email_last_error = str(e)
+                notification.email_next_attempt_at = now + backoff_delay(notification.email_attempts)
+                logger.warning(f"Failed to send notification {notification.id} "
+                               f"(attempt {notification.email_attempts}): {str(e)}")
+                continue
+            notification.email_sent = True
+            notification.email_sent_at = timezone.now()
+            notification.email_attempts += 1
+            notification.email_last_error = ''
+            notification.email_next_attempt_at = None
+            sent += 1
+    finally:
+        connection.close()
+
+    Notification.objects.bulk_update(batch, UPDATE_FIELDS)
+    return len(batch), sent
+
+
+def send_pending(batch_size=BATCH_SIZE, max_batches=100):
+    """Send batches until nothing is claimable; returns the number of emails sent"""
+    total = 0
+    for _ in range(max_batches):
+        claimed, sent = send_batch(batch_size)
+        total += sent
+        if not claimed:
+            break
+    return total
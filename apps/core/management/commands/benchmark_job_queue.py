@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.core import job_queue
+from apps.core.models import QueuedJob
+
+BENCHMARK_QUEUE = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Measure jobs/sec of the database-backed task queue with several worker counts. '
+            'Runs against the configured database (SQLite needs a file database) and deletes its jobs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000, help='Jobs per measurement (default: 2000)')
+        parser.add_argument('--workers', nargs='+', type=int, default=[1, 4, 8],
+                            help='Worker process counts (default: 1 4 8)')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds each job sleeps, to simulate I/O-bound work (default: 0)')
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed at a time per worker')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('Worker processes cannot share an in-memory SQLite database')
+
+        self.stdout.write(f"{'workers':>8} {'jobs':>7} {'seconds':>9} {'jobs/sec':>9} {'failed':>7}")
+        for workers in options['workers']:
+            QueuedJob.objects.filter(queue=BENCHMARK_QUEUE).delete()
+            QueuedJob.objects.bulk_create([
+                QueuedJob(task_name='time.sleep', args=[options['sleep']], queue=BENCHMARK_QUEUE)
+                for _ in range(options['jobs'])
+            ], batch_size=1000)
+
+            start = time.perf_counter()
+            job_queue.run_workers(workers, queue=BENCHMARK_QUEUE, burst=True, poll_interval=0.05,
+                                  batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - start
+
+            done = QueuedJob.objects.filter(queue=BENCHMARK_QUEUE, status='DONE').count()
+            failed = QueuedJob.objects.filter(queue=BENCHMARK_QUEUE).exclude(status='DONE').count()
+            self.stdout.write(f"{workers:>8} {done:>7} {elapsed:>9.2f} {done / elapsed:>9.1f} {failed:>7}")
+        QueuedJob.objects.filter(queue=BENCHMARK_QUEUE).delete()
@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.models import SMI
+from apps.core.serializers import OffsiteProfilingSerializer
+
+
+def build_payload(smi, rows, revision=0):
+    """
+    Offsite profile payload with `rows` child rows spread over the balance
+    sheet tables. Rows whose index is a multiple of 10 change value with
+    each revision.
+    """
+    def value(i):
+        return f'{1000 + i + (revision if i % 10 == 0 else 0)}.00'
+
+    per_table = max(rows // 4, 1)
+    return {
+        'companyId': str(smi.pk),
+        'reportingPeriod': {'start': '2024-01-01', 'end': '2024-12-31'},
+        'boardMembers': [],
+        'committees': [],
+        'products': [],
+        'clients': [],
+        'financialStatement': {'totalRevenue': '0.00', 'operatingCosts': '0.00', 'incomeItems': []},
+        'balanceSheet': {
+            'totalAssets': '0.00', 'totalLiabilities': '0.00', 'shareholdersFunds': '0.00',
+            'assets': [
+                {'assetType': f'Asset {i}', 'category': 'Other', 'value': value(i), 'isCurrent': True}
+                for i in range(per_table)
+            ],
+            'liabilities': [
+                {'liabilityType': f'Liability {i}', 'category': 'Other', 'value': value(i), 'isCurrent': True}
+                for i in range(per_table)
+            ],
+            'debtors': [
+                {'name': f'Debtor {i}', 'amount': value(i), 'ageDays': 30}
+                for i in range(per_table)
+            ],
+            'creditors': [
+                {'name': f'Creditor {i}', 'amount': value(i), 'dueDate': '2025-01-31'}
+                for i in range(rows - 3 * per_table)
+            ],
+        },
+        'clientAssets': [],
+        'capitalPosition': {
+            'calculationDate': '2024-12-31', 'netCapital': '0.00', 'requiredCapital': '0.00',
+            'adjustedLiquidCapital': '0.00', 'isCompliant': True, 'capitalAdequacyRatio': 0,
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark offsite profile submissions at several child-row counts (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 1000, 10000],
+                            help='Child row counts to submit (default: 10 1000 10000)')
+
+    def submit(self, payload):
+        serializer = OffsiteProfilingSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            serializer.save()
+            elapsed = time.perf_counter() - start
+        return elapsed, len(ctx.captured_queries)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>8}  {'scenario':<22} {'seconds':>9} {'queries':>8}")
+        for rows in options['sizes']:
+            with transaction.atomic():
+                smi = SMI.objects.create(company_name=f'Benchmark {rows}', license_number=f'BENCH-{rows}')
+                scenarios = [
+                    ('initial submission', build_payload(smi, rows)),
+                    ('unchanged resubmit', build_payload(smi, rows)),
+                    ('10% rows changed', build_payload(smi, rows, revision=1)),
+                    ('half the rows removed', build_payload(smi, rows // 2, revision=1)),
+                ]
+                for label, payload in scenarios:
+                    elapsed, queries = self.submit(payload)
+                    self.stdout.write(f"{rows:>8}  {label:<22} {elapsed:>9.3f} {queries:>8}")
+                transaction.set_rollback(True)
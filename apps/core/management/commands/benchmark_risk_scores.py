@@ -0,0 +1,49 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.models import SMI, FinancialStatement
+from apps.core.risk_scoring import score_smis
+
+
+def create_cohort(size, batch_size=2000):
+    """`size` active SMIs with two financial statements each"""
+    smis = SMI.objects.bulk_create(
+        [SMI(company_name=f'Benchmark {i}', license_number=f'RISK-BENCH-{i}') for i in range(size)],
+        batch_size=batch_size,
+    )
+    statements = []
+    for i, smi in enumerate(smis):
+        for year in (2023, 2024):
+            statements.append(FinancialStatement(
+                smi=smi, period=date(year, 12, 31),
+                total_assets=1_000_000 + i, total_equity=50_000 + (i % 200) * 1_000,
+                profit_margin=(i % 40) / 100, gross_margin=(i % 90) / 100,
+            ))
+    FinancialStatement.objects.bulk_create(statements, batch_size=batch_size)
+    return SMI.objects.filter(license_number__startswith='RISK-BENCH-')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the batch risk scoring pipeline at several cohort sizes (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 10000, 100000],
+                            help='Number of SMIs to score (default: 100 10000 100000)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'smis':>8}  {'run':<8} {'seconds':>9} {'queries':>8}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                smis = create_cohort(size)
+                # The second run hits the upsert's update path
+                for label in ('insert', 'update'):
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        score_smis(smis)
+                        elapsed = time.perf_counter() - start
+                    self.stdout.write(f"{size:>8}  {label:<8} {elapsed:>9.3f} {len(ctx.captured_queries):>8}")
+                transaction.set_rollback(True)
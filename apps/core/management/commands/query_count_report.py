@@ -0,0 +1,87 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+def iter_list_endpoints(patterns=None, prefix=''):
+    """Yield (route, viewset class) for every routed viewset exposing a list action"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_list_endpoints(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            callback = pattern.callback
+            actions = getattr(callback, 'actions', None) or {}
+            if actions.get('get') == 'list' and '<format>' not in str(pattern.pattern):
+                yield prefix + str(pattern.pattern).lstrip('^').rstrip('$'), callback.cls
+
+
+def count_list_queries(viewset_class, sizes, user=None):
+    """
+    Serialize the first N rows of a viewset's list queryset for each N in sizes
+    and return {N: number of queries}. Sizes larger than the table are skipped.
+    """
+    django_request = APIRequestFactory().get('/')
+    django_request.user = user or AnonymousUser()
+    view = viewset_class()
+    view.action = 'list'
+    view.args = ()
+    view.kwargs = {}
+    view.format_kwarg = None
+    view.request = Request(django_request)
+    view.request.user = django_request.user
+
+    queryset = view.filter_queryset(view.get_queryset())
+    available = queryset.count()
+    counts = {}
+    for size in sizes:
+        if size > available:
+            continue
+        with CaptureQueriesContext(connection) as ctx:
+            page = list(queryset[:size])
+            view.get_serializer(page, many=True).data
+        counts[size] = len(ctx.captured_queries)
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Report the number of queries each list endpoint needs to render a page of N rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1, 20, 100],
+                            help='Page sizes to measure (default: 1 20 100)')
+        parser.add_argument('--user', help='Username to run the list queries as')
+
+    def handle(self, *args, **options):
+        sizes = sorted(set(options['sizes']))
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+
+        seen = set()
+        for route, viewset_class in iter_list_endpoints():
+            if viewset_class in seen:
+                continue
+            seen.add(viewset_class)
+            try:
+                counts = count_list_queries(viewset_class, sizes, user=user)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{route:<55} error: {e}"))
+                continue
+
+            if not counts:
+                self.stdout.write(f"{route:<55} no rows")
+                continue
+            columns = '  '.join(f"{size}:{count}" for size, count in counts.items())
+            if len(set(counts.values())) == 1:
+                self.stdout.write(self.style.SUCCESS(f"{route:<55} {columns}  constant"))
+            else:
+                self.stdout.write(self.style.WARNING(f"{route:<55} {columns}  grows with page size"))
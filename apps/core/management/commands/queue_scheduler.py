@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core import job_queue
+
+
+class Command(BaseCommand):
+    help = 'Enqueue the Celery beat schedule (settings.CELERY_BEAT_SCHEDULE) into the database-backed task queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default=job_queue.DEFAULT_QUEUE)
+        parser.add_argument('--max-interval', type=float, default=60.0,
+                            help='Longest sleep between schedule checks, in seconds')
+        parser.add_argument('--once', action='store_true', help='Check the schedule once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            enqueued, next_check = job_queue.schedule_due(queue=options['queue'])
+            for name in enqueued:
+                self.stdout.write(f'Enqueued {name}')
+            if options['once']:
+                return
+            try:
+                time.sleep(min(next_check or options['max_interval'], options['max_interval']))
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import job_queue
+
+
+class Command(BaseCommand):
+    help = 'Run workers for the database-backed task queue (settings.TASK_QUEUE_BACKEND = "database")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes to fork (default: 1, which runs in this process)')
+        parser.add_argument('--queue', default=job_queue.DEFAULT_QUEUE)
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed at a time per worker')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        work_options = {
+            'queue': options['queue'],
+            'burst': options['burst'],
+            'poll_interval': options['poll_interval'],
+            'batch_size': options['batch_size'],
+        }
+        self.stdout.write(f"Processing queue '{options['queue']}' with {options['processes']} worker(s)")
+        if options['processes'] > 1:
+            job_queue.run_workers(options['processes'], **work_options)
+            return
+        try:
+            processed = job_queue.work(**work_options)
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Ran {processed} jobs'))
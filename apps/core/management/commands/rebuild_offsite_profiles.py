@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import SMI
+from apps.core.offsite_profile import rebuild_offsite_profile_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized offsite profile snapshot for every SMI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--smi', action='append', dest='smi_ids',
+                            help='Only rebuild the given SMI id (may be repeated)')
+
+    def handle(self, *args, **options):
+        smis = SMI.objects.order_by('pk')
+        if options['smi_ids']:
+            smis = smis.filter(pk__in=options['smi_ids'])
+            if not smis.exists():
+                raise CommandError('No matching SMIs found')
+
+        rebuilt = 0
+        for smi in smis.iterator(chunk_size=200):
+            rebuild_offsite_profile_snapshot(smi)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} offsite profile snapshots'))
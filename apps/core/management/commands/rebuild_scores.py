@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.tasks import INCREMENTAL_SCOPES, start_batch_run
+
+
+class Command(BaseCommand):
+    help = 'Dispatch a full rescore of every active SMI, ignoring the change-tracking watermark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', action='append', dest='tasks', choices=sorted(INCREMENTAL_SCOPES),
+                            help='Only rebuild the given task (may be repeated; default: all)')
+        parser.add_argument('--chunk-size', type=int, help='SMIs per chunk (default: settings.BATCH_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        for task_name in options['tasks'] or sorted(INCREMENTAL_SCOPES):
+            run_id = start_batch_run(task_name, chunk_size=options['chunk_size'], full=True)
+            if run_id is None:
+                self.stdout.write(self.style.WARNING(f'{task_name}: a run is still in progress, try again later'))
+                continue
+            self.stdout.write(self.style.SUCCESS(f'{task_name}: dispatched full rebuild (batch run {run_id})'))
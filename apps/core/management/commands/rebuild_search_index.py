@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.core import search
+from apps.core.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search documents for every registered model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=search.INDEX_BATCH_SIZE,
+                            help='Objects indexed per batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for model in search.registered_models():
+            label = search.model_label(model)
+            SearchDocument.objects.filter(model_label=label).delete()
+            count = search.index_in_batches(model.objects.all(), chunk_size)
+            self.stdout.write(f'{label}: {count} documents')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
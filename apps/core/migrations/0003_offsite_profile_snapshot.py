@@ -0,0 +1,72 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:26
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_asset_capitalposition_committee_creditor_debtor_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OffsiteProfileSnapshot',
+            fields=[
+                ('smi', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='offsite_profile_snapshot', serialize=False, to='core.smi')),
+                ('document', models.JSONField()),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CalculationFormula',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('formula_type', models.CharField(choices=[('FSI_SCORE', 'Financial Stability Index Score'), ('CAR', 'Capital Adequacy Ratio'), ('CREDIT_RISK', 'Credit Risk'), ('MARKET_RISK', 'Market Risk'), ('LIQUIDITY_RISK', 'Liquidity Risk'), ('OPERATIONAL_RISK', 'Operational Risk'), ('LEGAL_RISK', 'Legal Risk'), ('COMPLIANCE_RISK', 'Compliance Risk'), ('STRATEGIC_RISK', 'Strategic Risk'), ('REPUTATION_RISK', 'Reputation Risk'), ('COMPOSITE_RISK', 'Composite Risk Rating'), ('COMPLIANCE_SCORE', 'Compliance Score')], max_length=50, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('formula_expression', models.TextField(help_text='Python expression for the formula. Available variables depend on formula type.')),
+                ('variables', models.JSONField(default=dict, help_text='Dictionary of variable names and their descriptions')),
+                ('weights', models.JSONField(default=dict, help_text='Dictionary of weights for different components')),
+                ('thresholds', models.JSONField(default=dict, help_text='Dictionary of threshold values for risk levels')),
+                ('is_active', models.BooleanField(default=True)),
+                ('version', models.IntegerField(default=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('change_notes', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_formulas', to=settings.AUTH_USER_MODEL)),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updated_formulas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Calculation Formula',
+                'verbose_name_plural': 'Calculation Formulae',
+                'ordering': ['formula_type', '-version'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CalculationBreakdown',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('calculation_type', models.CharField(max_length=50)),
+                ('reference_id', models.UUIDField(help_text='ID of the related entity (SMI, RiskAssessment, etc.)')),
+                ('final_value', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('final_percentage', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('components', models.JSONField(default=list, help_text='List of components with their values and impact percentages')),
+                ('calculated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('calculated_by', models.CharField(default='system', max_length=100)),
+                ('formula', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.calculationformula')),
+            ],
+            options={
+                'verbose_name': 'Calculation Breakdown',
+                'verbose_name_plural': 'Calculation Breakdowns',
+                'ordering': ['-calculated_at'],
+                'indexes': [models.Index(fields=['calculation_type', 'reference_id'], name='core_calcul_calcula_5ae169_idx'), models.Index(fields=['-calculated_at'], name='core_calcul_calcula_35b697_idx')],
+            },
+        ),
+    ]
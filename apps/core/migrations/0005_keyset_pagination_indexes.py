@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='calculationbreakdown',
+            name='core_calcul_calcula_35b697_idx',
+        ),
+        migrations.AddIndex(
+            model_name='calculationbreakdown',
+            index=models.Index(fields=['-calculated_at', '-id'], name='core_calcul_calcula_b78c74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-created_at', '-id'], name='core_notifi_created_5c2dd0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='core_notifi_user_id_ea1d2f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='systemauditlog',
+            index=models.Index(fields=['-timestamp', '-id'], name='core_system_timesta_8002e0_idx'),
+        ),
+    ]
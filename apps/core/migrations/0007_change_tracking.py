@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_batch_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoringWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=100, unique=True)),
+                ('changed_through', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='batchrun',
+            name='full_rebuild',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='batchrun',
+            name='watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DirtySMI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('RISK', 'Risk scores'), ('COMPLIANCE', 'Compliance indices')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('smi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dirty_markers', to='core.smi')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'changed_at'], name='core_dirtys_scope_6cbdb5_idx')],
+                'unique_together': {('smi', 'scope')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 00:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_notification_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskReportArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_date', models.DateField()),
+                ('data_version', models.CharField(max_length=64)),
+                ('file', models.FileField(upload_to='risk_reports/')),
+                ('smi_count', models.PositiveIntegerField(default=0)),
+                ('summary', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-report_date', '-created_at'],
+                'unique_together': {('report_date', 'data_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def point_at_latest_breakdowns(apps, schema_editor):
+    """
+    Point every (calculation_type, reference_id) at its newest breakdown. The
+    hash is left empty, so the next scoring run records each key once more.
+    """
+    CalculationBreakdown = apps.get_model('core', 'CalculationBreakdown')
+    LatestCalculationBreakdown = apps.get_model('core', 'LatestCalculationBreakdown')
+    history = CalculationBreakdown.objects.order_by('calculation_type', 'reference_id', '-calculated_at', '-id')
+    pointers, previous = [], None
+    for pk, calculation_type, reference_id, calculated_at in history.values_list(
+        'pk', 'calculation_type', 'reference_id', 'calculated_at'
+    ).iterator(chunk_size=2000):
+        if (calculation_type, reference_id) == previous:
+            continue
+        previous = (calculation_type, reference_id)
+        pointers.append(LatestCalculationBreakdown(
+            calculation_type=calculation_type, reference_id=reference_id, breakdown_id=pk,
+            content_hash='', checked_at=calculated_at,
+        ))
+        if len(pointers) >= 1000:
+            LatestCalculationBreakdown.objects.bulk_create(pointers)
+            pointers = []
+    LatestCalculationBreakdown.objects.bulk_create(pointers)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_task_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculationbreakdown',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='CalculationBreakdownDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calculation_type', models.CharField(max_length=50)),
+                ('reference_id', models.UUIDField()),
+                ('day', models.DateField()),
+                ('samples', models.IntegerField(default=0)),
+                ('min_value', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('max_value', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('total_value', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('first_calculated_at', models.DateTimeField()),
+                ('last_calculated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Calculation Breakdown Daily Summary',
+                'verbose_name_plural': 'Calculation Breakdown Daily Summaries',
+                'ordering': ['-day'],
+                'unique_together': {('reference_id', 'calculation_type', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LatestCalculationBreakdown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calculation_type', models.CharField(max_length=50)),
+                ('reference_id', models.UUIDField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('checked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('breakdown', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest', to='core.calculationbreakdown')),
+            ],
+            options={
+                'verbose_name': 'Latest Calculation Breakdown',
+                'verbose_name_plural': 'Latest Calculation Breakdowns',
+                'unique_together': {('reference_id', 'calculation_type')},
+            },
+        ),
+        migrations.RunPython(point_at_latest_breakdowns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-17 01:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_breakdown_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('generation', models.BigIntegerField(default=0)),
+                ('stamp', models.CharField(max_length=32)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='calculationformula',
+            name='formula_type',
+            field=models.CharField(choices=[('FSI_SCORE', 'Financial Stability Index Score'), ('CAR', 'Capital Adequacy Ratio'), ('CREDIT_RISK', 'Credit Risk'), ('MARKET_RISK', 'Market Risk'), ('LIQUIDITY_RISK', 'Liquidity Risk'), ('OPERATIONAL_RISK', 'Operational Risk'), ('LEGAL_RISK', 'Legal Risk'), ('COMPLIANCE_RISK', 'Compliance Risk'), ('STRATEGIC_RISK', 'Strategic Risk'), ('REPUTATION_RISK', 'Reputation Risk'), ('COMPOSITE_RISK', 'Composite Risk Rating'), ('COMPLIANCE_SCORE', 'Compliance Score')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_formula_generations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='email_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='email_claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
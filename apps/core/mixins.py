@@ -1,4 +1,19 @@
+import csv
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.db.models.constants import LOOKUP_SEP
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import permissions, serializers
+from rest_framework.utils.encoders import JSONEncoder
+
 from .models import SystemAuditLog
+from .offsite_profile import schedule_refresh
+from .renderers import CSVRenderer, NDJSONRenderer, csv_cell
 
 class AuditLogMixin:
     """
@@ -39,3 +54,264 @@ class AuditLogMixin:
         # Log before destroying to capture regular representation
         self._log_action("DELETE", instance, "Deleted record")
         instance.delete()
+
+
+class OffsiteProfileMixin:
+    """
+    Refreshes the offsite profile snapshot of the SMI a row belongs to after
+    the row is created, updated or deleted through the viewset (see
+    apps.core.offsite_profile). One rebuild per SMI and request.
+    """
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        schedule_refresh(serializer.instance.smi_id)
+
+    def perform_update(self, serializer):
+        previous_smi_id = serializer.instance.smi_id
+        super().perform_update(serializer)
+        schedule_refresh(previous_smi_id, serializer.instance.smi_id)
+
+    def perform_destroy(self, instance):
+        smi_id = instance.smi_id
+        super().perform_destroy(instance)
+        schedule_refresh(smi_id)
+
+
+# (serializer class, expanded fields) -> (select_related lookups, prefetch_related lookups)
+_eager_loading_cache = {}
+
+
+def _walk_serializer(serializer, model, prefix, to_many, select, prefetch):
+    """Collect the relation lookups a (bound) serializer dereferences per row."""
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        current_model = model
+        path = []
+        field_to_many = to_many
+        for attr in field.source_attrs:
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation or model_field.related_model is None:
+                break
+            path.append(attr)
+            field_to_many = field_to_many or model_field.one_to_many or model_field.many_to_many
+            current_model = model_field.related_model
+        if not path:
+            continue
+
+        # A plain FK rendered as its primary key is read from the local column.
+        if (isinstance(field, serializers.PrimaryKeyRelatedField)
+                and len(path) == 1 and not field_to_many):
+            continue
+
+        lookup = LOOKUP_SEP.join(prefix + path)
+        if field_to_many:
+            prefetch.append(lookup)
+        else:
+            select.append(lookup)
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.ModelSerializer):
+            _walk_serializer(nested, current_model, prefix + path, field_to_many, select, prefetch)
+
+
+def _expanded_fields(serializer_class, context):
+    if context is None or not hasattr(serializer_class, 'expanded_fields'):
+        return frozenset()
+    return frozenset(serializer_class.expanded_fields(context))
+
+
+def get_eager_loading_lookups(serializer_class, expand=frozenset()):
+    """
+    Return the (select_related, prefetch_related) lookups needed to render
+    ``serializer_class`` without a query per row. ``expand`` names the
+    expandable relations rendered as nested objects. Results are cached.
+    """
+    key = (serializer_class, frozenset(expand))
+    if key not in _eager_loading_cache:
+        select, prefetch = [], []
+        model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+        if model is not None:
+            serializer = serializer_class(context={'expand': sorted(expand)})
+            _walk_serializer(serializer, model, [], False, select, prefetch)
+        _eager_loading_cache[key] = (
+            tuple(dict.fromkeys(select)),
+            tuple(dict.fromkeys(prefetch)),
+        )
+    return _eager_loading_cache[key]
+
+
+def eager_load(queryset, serializer_class, context=None):
+    """Apply the serializer's eager-loading lookups to ``queryset``."""
+    model = getattr(getattr(serializer_class, 'Meta', None), 'model', None)
+    if model is None or not issubclass(queryset.model, model):
+        return queryset
+    select, prefetch = get_eager_loading_lookups(serializer_class, _expanded_fields(serializer_class, context))
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def defer_unrequested(queryset, serializer_class, context):
+    """Leave the serializer's deferrable_fields out of the SELECT unless ?fields= names them."""
+    deferrable = getattr(serializer_class, 'deferrable_fields', ())
+    if not deferrable:
+        return queryset
+    request = context.get('request')
+    if request is not None and request.method not in permissions.SAFE_METHODS:
+        return queryset
+    requested = serializer_class.requested_fields(context)
+    if requested is None:
+        return queryset
+    deferred = [name for name in deferrable if name not in requested]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+class EagerLoadingMixin:
+    """
+    Mixin that shapes get_queryset() for the viewset's serializer: applies
+    the select_related/prefetch_related lookups it implies (nested
+    SMISerializer with ?expand=, StringRelatedField users, dotted sources)
+    and defers large columns that ?fields= leaves out.
+    """
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+    def optimize_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        context = {'request': getattr(self, 'request', None)}
+        queryset = eager_load(queryset, serializer_class, context)
+        return defer_unrequested(queryset, serializer_class, context)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+    def write(self, value):
+        return value
+
+
+def _stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([csv_cell(row.get(column)) for column in columns])
+
+
+def _stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=JSONEncoder) + '\n'
+
+
+class StreamingExportMixin:
+    """
+    Adds ?format=csv and ?format=ndjson to list(). The filtered queryset is
+    streamed with QuerySet.iterator(), bypassing pagination, and the columns
+    are the readable fields of the viewset's serializer.
+    """
+    export_chunk_size = 2000
+    export_renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get_renderers(self):
+        return super().get_renderers() + [renderer() for renderer in self.export_renderer_classes]
+
+    def list(self, request, *args, **kwargs):
+        renderer = getattr(request, 'accepted_renderer', None)
+        if not isinstance(renderer, tuple(self.export_renderer_classes)):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        columns = [name for name, field in serializer.fields.items() if not field.write_only]
+        rows = (
+            serializer.to_representation(instance)
+            for instance in queryset.iterator(chunk_size=self.export_chunk_size)
+        )
+        if renderer.format == 'csv':
+            stream = _stream_csv(columns, rows)
+        else:
+            stream = _stream_ndjson(rows)
+
+        response = StreamingHttpResponse(stream, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        filename = f'{queryset.model._meta.model_name}.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for list() and retrieve() on models with an
+    updated_at column. The validator is Max(updated_at) plus the row count of
+    the filtered queryset for lists, and the row's own updated_at for detail.
+    When the client's If-None-Match / If-Modified-Since matches, a 304 is
+    returned before anything is serialized.
+
+    Lists only get the ETag: a one-second Last-Modified of the newest row
+    does not move when that row is deleted or when two writes land in the
+    same second, so If-Modified-Since would answer 304 for a changed list.
+
+    Only the rows themselves are covered. Viewsets whose detail view embeds
+    other tables should set conditional_retrieve = False.
+    """
+    last_modified_field = 'updated_at'
+    conditional_retrieve = True
+
+    def has_last_modified(self, queryset):
+        try:
+            queryset.model._meta.get_field(self.last_modified_field)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not self.has_last_modified(queryset):
+            return super().list(request, *args, **kwargs)
+
+        stats = queryset.order_by().aggregate(
+            last_modified=Max(self.last_modified_field), count=Count('pk')
+        )
+        return self.conditional_response(
+            request, (stats['count'], stats['last_modified']), None,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not self.conditional_retrieve or not self.has_last_modified(queryset):
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            last_modified = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values_list(self.last_modified_field, flat=True).first()
+        except (ValueError, DjangoValidationError):
+            last_modified = None
+        if last_modified is None:
+            # Missing row (or no timestamp yet): let retrieve() answer normally
+            return super().retrieve(request, *args, **kwargs)
+
+        return self.conditional_response(
+            request, (last_modified,), last_modified,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    def conditional_response(self, request, validator, last_modified, render):
+        renderer = getattr(request, 'accepted_renderer', None)
+        key = repr((request.get_full_path(), getattr(renderer, 'format', None), validator))
+        etag = '"%s"' % hashlib.md5(key.encode('utf-8'), usedforsecurity=False).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -476,6 +476,13 @@ class Notification(models.Model):
     # Delivery
     email_sent = models.BooleanField(default=False)
     email_sent_at = models.DateTimeField(null=True, blank=True)
+    # Retry state for the mailer (see apps.core.mailer)
+    email_attempts = models.PositiveIntegerField(default=0)
+    email_next_attempt_at = models.DateTimeField(null=True, blank=True)
+    email_last_error = models.TextField(blank=True)
+    # Worker currently sending the email and since when (see apps.core.mailer)
+    email_claimed_by = models.CharField(max_length=32, blank=True)
+    email_claimed_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -484,6 +491,13 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination (see apps.core.pagination)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
+            # Pending-email scan (see apps.core.mailer)
+            models.Index(fields=['email_sent', 'created_at']),
+        ]
 
 class SystemAuditLog(models.Model):
     """Audit trail for all system activities"""
@@ -502,6 +516,10 @@ class SystemAuditLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Keyset pagination (see apps.core.pagination)
+            models.Index(fields=['-timestamp', '-id']),
+        ]
 
 class Committee(models.Model):
     """Board Committees"""
@@ -577,4 +595,281 @@ class CapitalPosition(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
-        return f"Capital Position - {self.smi.company_name} - {self.calculation_date}"
\ No newline at end of file
+        return f"Capital Position - {self.smi.company_name} - {self.calculation_date}"
+
+class OffsiteProfileSnapshot(models.Model):
+    """Materialized offsite-profile document served by OffsiteProfilingViewSet.retrieve"""
+    smi = models.OneToOneField(SMI, on_delete=models.CASCADE, primary_key=True, related_name='offsite_profile_snapshot')
+    document = models.JSONField()
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Offsite profile - {self.smi_id} (v{self.version})"
+
+    @property
+    def etag(self):
+        return f'"{self.smi_id}-{self.version}"'
+
+
+class SearchDocument(models.Model):
+    """
+    Full-text search document for one indexed object (see apps.core.search).
+    The database-specific index (FTS5 table or tsvector column) is built on
+    top of this table by migration 0004.
+    """
+    model_label = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    content = models.TextField()
+
+    class Meta:
+        unique_together = ['model_label', 'object_id']
+
+    def __str__(self):
+        return f"{self.model_label}:{self.object_id}"
+
+
+class BatchRun(models.Model):
+    """
+    Progress record for one fan-out of a periodic SMI task (see
+    apps.core.batch_runs). The counters are refreshed as chunks finish.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Completed with failed chunks'),
+    ]
+
+    task_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    chunk_size = models.PositiveIntegerField()
+    total_chunks = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    full_rebuild = models.BooleanField(default=False)
+    # Holder of the task's single-flight lease while the run is in progress (see apps.core.task_locks)
+    lease_owner = models.CharField(max_length=64, blank=True)
+    # Changes up to this point are covered once the run completes (see apps.core.change_tracking)
+    watermark = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.task_name} #{self.pk} - {self.status} ({self.chunks_done}/{self.total_chunks})"
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['task_name', '-started_at']),
+        ]
+
+
+class BatchChunk(models.Model):
+    """One slice of SMI ids processed by a single worker task"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    run = models.ForeignKey(BatchRun, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    smi_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.run.task_name} #{self.run_id} chunk {self.index} - {self.status}"
+
+    class Meta:
+        ordering = ['run', 'index']
+        unique_together = ['run', 'index']
+
+
+class DirtySMI(models.Model):
+    """
+    An SMI whose scoring inputs changed, per scope (see
+    apps.core.change_tracking). One row per (smi, scope); changed_at moves
+    forward on every change.
+    """
+    SCOPE_CHOICES = [
+        ('RISK', 'Risk scores'),
+        ('COMPLIANCE', 'Compliance indices'),
+    ]
+
+    smi = models.ForeignKey(SMI, on_delete=models.CASCADE, related_name='dirty_markers')
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.scope} - {self.smi_id} @ {self.changed_at}"
+
+    class Meta:
+        unique_together = ['smi', 'scope']
+        indexes = [
+            models.Index(fields=['scope', 'changed_at']),
+        ]
+
+
+class ScoringWatermark(models.Model):
+    """Point up to which a periodic task has processed DirtySMI changes"""
+    task_name = models.CharField(max_length=100, unique=True)
+    changed_through = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.task_name} through {self.changed_through}"
+
+
+class RiskReportArtifact(models.Model):
+    """
+    Generated industry risk report (XLSX, see apps.core.risk_report). One
+    file per report date and data version, so requests for a report whose
+    inputs have not changed are served from storage.
+    """
+    report_date = models.DateField()
+    data_version = models.CharField(max_length=64)
+    file = models.FileField(upload_to='risk_reports/')
+    smi_count = models.PositiveIntegerField(default=0)
+    summary = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Risk report {self.report_date} ({self.data_version[:8]})"
+
+    class Meta:
+        ordering = ['-report_date', '-created_at']
+        unique_together = ['report_date', 'data_version']
+
+
+class TaskRun(models.Model):
+    """
+    Telemetry for one execution of a Celery task (see apps.core.telemetry).
+    Tasks catch their own exceptions and return False, so a FAILED outcome
+    is recorded for those as well as for tasks that raise.
+    """
+    OUTCOME_CHOICES = [
+        ('SUCCESS', 'Success'),
+        ('FAILED', 'Failed'),
+        ('SKIPPED', 'Skipped, previous run still in progress'),
+    ]
+
+    task_name = models.CharField(max_length=100)
+    task_id = models.CharField(max_length=255, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(default=0)
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    query_count = models.PositiveIntegerField(default=0)
+    query_time_ms = models.FloatField(default=0)
+    # High-water mark of the worker process at the end of the run
+    peak_rss_kb = models.PositiveIntegerField(default=0)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    # Exception or logged error of a failed run, lease holder of a skipped one
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.task_name} @ {self.started_at} - {self.outcome} ({self.duration_ms:.0f} ms)"
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['task_name', '-started_at']),
+        ]
+
+
+class QueuedJob(models.Model):
+    """
+    A task call waiting in the database-backed queue (see
+    apps.core.job_queue). A WAITING job is the body of a chord: it becomes
+    QUEUED once its pending_parts have all finished.
+    """
+    STATUS_CHOICES = [
+        ('WAITING', 'Waiting for other jobs'),
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    callback = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='parts')
+    pending_parts = models.PositiveIntegerField(default=0)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.task_name} #{self.pk} - {self.status}"
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_after']),
+        ]
+
+
+class ScheduleEntry(models.Model):
+    """Last time the queue scheduler enqueued a beat schedule entry"""
+    name = models.CharField(max_length=100, unique=True)
+    task_name = models.CharField(max_length=255)
+    last_run_at = models.DateTimeField()
+    total_run_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.task_name}) last run {self.last_run_at}"
+
+    class Meta:
+        verbose_name_plural = 'Schedule entries'
+
+
+class TaskLease(models.Model):
+    """
+    Single-flight lease of a periodic task (see apps.core.task_locks). The
+    holder renews expires_at with every heartbeat; an expired lease can be
+    taken over. Released leases keep their row for the admin view.
+    """
+    task_name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=64)
+    acquired_at = models.DateTimeField()
+    heartbeat_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.task_name} held by {self.owner} until {self.expires_at}"
+
+    @property
+    def is_active(self):
+        return self.released_at is None and self.expires_at > timezone.now()
+
+
+class CacheGeneration(models.Model):
+    """
+    Generation of a process-local cache (see apps.core.generations). Writers
+    bump it; every process compares the stamp with the one its cache was
+    built from and starts over when it changed. The stamp is random, so a
+    bump that is rolled back and followed by another never repeats a stamp.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    generation = models.BigIntegerField(default=0)
+    stamp = models.CharField(max_length=32)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} (generation {self.generation})"
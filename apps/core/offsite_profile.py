@@ -0,0 +1,223 @@
+"""
+Offsite profile documents.
+
+The offsite profiling form reads a single document per SMI. Building it touches
+a dozen tables, so it is materialized into OffsiteProfileSnapshot whenever a
+profile is submitted and read back with one query.
+
+Edits made through the board-member, product, clientele, statement and
+client-asset endpoints and their admins rebuild the SMI's snapshot once the
+request commits (OffsiteProfileMixin and OffsiteProfileAdminMixin call
+schedule_refresh()). The rebuild bumps the version, so the ETag changes with
+the document, and it is skipped when the snapshot was already rebuilt after
+the change or does not exist yet (it is then built on its first read). No
+model signals are involved, so deletes keep Django's fast path; other code
+that writes these tables (scripts, the shell) must call schedule_refresh()
+or rebuild_offsite_profile_snapshot() itself, or run rebuild_offsite_profiles.
+"""
+import json
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import (
+    BoardMember, Committee, ProductOffering, ClienteleProfile, FinancialStatement,
+    ClientAssetMix, CapitalPosition, SMI, OffsiteProfileSnapshot
+)
+
+
+def build_offsite_profile(smi):
+    """Assemble the offsite profile document for an SMI from the live tables"""
+    bm_data = [
+        {
+            'name': bm['name'],
+            'position': bm['position'],
+            'appointmentDate': bm['appointment_date']
+        } for bm in BoardMember.objects.filter(smi=smi).values('name', 'position', 'appointment_date')
+    ]
+
+    comm_data = [
+        {
+            'name': c.name,
+            'purpose': c.purpose,
+            'chairperson': c.chairperson,
+            'members': c.members,
+            'meetingsHeld': c.meetings_held,
+            'meetingFrequency': c.meeting_frequency
+        } for c in Committee.objects.filter(smi=smi)
+    ]
+
+    prod_data = [
+        {
+            'productName': p.product_name,
+            'productType': p.product_category,
+            'concentrationPercentage': p.income_contribution
+        } for p in ProductOffering.objects.filter(smi=smi)
+    ]
+
+    client_data = [
+        {
+            'clientType': c.client_type,
+            'concentrationPercentage': c.income_contribution
+        } for c in ClienteleProfile.objects.filter(smi=smi)
+    ]
+
+    # Most recent income statement and balance sheet
+    income_stmt = FinancialStatement.objects.filter(
+        smi=smi, statement_type='COMPREHENSIVE_INCOME'
+    ).prefetch_related('income_items').order_by('-period').first()
+
+    fs_data = {
+        'periodStart': '',  # Model only stores the period end
+        'periodEnd': income_stmt.period if income_stmt else '',
+        'totalRevenue': income_stmt.total_revenue if income_stmt else 0,
+        'operatingCosts': income_stmt.total_expenses if income_stmt else 0,
+        'profitBeforeTax': income_stmt.profit_before_tax if income_stmt else 0,
+        'grossMargin': income_stmt.gross_margin if income_stmt else 0,
+        'profitMargin': income_stmt.profit_margin if income_stmt else 0,
+        'incomeItems': []
+    }
+    if income_stmt:
+        fs_data['incomeItems'] = [
+            {
+                'category': i.category,
+                'description': i.description,
+                'amount': i.amount,
+                'isCore': i.is_core
+            } for i in income_stmt.income_items.all()
+        ]
+
+    pos_stmt = FinancialStatement.objects.filter(
+        smi=smi, statement_type='FINANCIAL_POSITION'
+    ).prefetch_related(
+        'assets', 'liabilities', 'debtors', 'creditors', 'related_parties'
+    ).order_by('-period').first()
+
+    bs_data = {
+        'periodEnd': pos_stmt.period if pos_stmt else '',
+        'totalAssets': pos_stmt.total_assets if pos_stmt else 0,
+        'totalLiabilities': pos_stmt.total_liabilities if pos_stmt else 0,
+        'shareholdersFunds': pos_stmt.total_equity if pos_stmt else 0,
+        'currentAssets': 0,
+        'currentLiabilities': 0,
+        'assets': [],
+        'liabilities': [],
+        'debtors': [],
+        'creditors': [],
+        'relatedParties': []
+    }
+    if pos_stmt:
+        assets = pos_stmt.assets.all()
+        bs_data['assets'] = [
+            {
+                'assetType': a.asset_type,
+                'category': a.category,
+                'value': a.value,
+                'isCurrent': a.is_current,
+                'acquisitionDate': a.acquisition_date
+            } for a in assets
+        ]
+        bs_data['currentAssets'] = sum(a.value for a in assets if a.is_current)
+
+        liabilities = pos_stmt.liabilities.all()
+        bs_data['liabilities'] = [
+            {
+                'liabilityType': l.liability_type,
+                'category': l.category,
+                'value': l.value,
+                'isCurrent': l.is_current,
+                'dueDate': l.due_date
+            } for l in liabilities
+        ]
+        bs_data['currentLiabilities'] = sum(l.value for l in liabilities if l.is_current)
+
+        bs_data['debtors'] = [
+            {
+                'name': d.name,
+                'amount': d.amount,
+                'ageDays': d.age_days
+            } for d in pos_stmt.debtors.all()
+        ]
+        bs_data['creditors'] = [
+            {
+                'name': c.name,
+                'amount': c.amount,
+                'dueDate': c.due_date
+            } for c in pos_stmt.creditors.all()
+        ]
+        bs_data['relatedParties'] = [
+            {
+                'name': r.name,
+                'relationship': r.relationship,
+                'balance': r.balance,
+                'type': r.transaction_type
+            } for r in pos_stmt.related_parties.all()
+        ]
+
+    ca_data = [
+        {
+            'assetType': ca.asset_class,
+            'concentrationPercentage': ca.allocation_percentage,
+            'value': ca.market_value
+        } for ca in ClientAssetMix.objects.filter(smi=smi).order_by('-period')
+    ]
+
+    cap_pos = CapitalPosition.objects.filter(smi=smi).order_by('-calculation_date').first()
+    cp_data = {
+        'calculationDate': cap_pos.calculation_date if cap_pos else '',
+        'netCapital': cap_pos.net_capital if cap_pos else 0,
+        'requiredCapital': cap_pos.required_capital if cap_pos else 0,
+        'adjustedLiquidCapital': cap_pos.adjusted_liquid_capital if cap_pos else 0,
+        'isCompliant': cap_pos.is_compliant if cap_pos else False,
+        'capitalAdequacyRatio': cap_pos.capital_adequacy_ratio if cap_pos else 0
+    }
+
+    document = {
+        'companyId': str(smi.pk),
+        'reportingPeriod': {
+            'start': fs_data['periodStart'] or '',
+            'end': fs_data['periodEnd'] or bs_data['periodEnd'] or ''
+        },
+        'boardMembers': bm_data,
+        'committees': comm_data,
+        'products': prod_data,
+        'clients': client_data,
+        'financialStatement': fs_data,
+        'balanceSheet': bs_data,
+        'clientAssets': ca_data,
+        'capitalPosition': cp_data,
+        'supportingDocuments': []  # File handling is complex, skip for now
+    }
+    # Store exactly what the API would have rendered (dates and decimals included)
+    return json.loads(json.dumps(document, cls=JSONEncoder))
+
+
+def rebuild_offsite_profile_snapshot(smi):
+    """Rebuild the stored profile for an SMI and bump its version"""
+    document = build_offsite_profile(smi)
+    with transaction.atomic():
+        updated = OffsiteProfileSnapshot.objects.filter(smi=smi).update(
+            document=document, version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            OffsiteProfileSnapshot.objects.create(smi=smi, document=document)
+    return OffsiteProfileSnapshot.objects.get(smi=smi)
+
+
+def refresh_stale_snapshot(smi_id, changed_at):
+    """Rebuild the snapshot of ``smi_id`` unless it was rebuilt after ``changed_at`` or does not exist"""
+    if not OffsiteProfileSnapshot.objects.filter(smi_id=smi_id, updated_at__lte=changed_at).exists():
+        return None
+    smi = SMI.objects.filter(pk=smi_id).first()
+    if smi is None:
+        return None
+    return rebuild_offsite_profile_snapshot(smi)
+
+
+def schedule_refresh(*smi_ids):
+    """Refresh the snapshots of ``smi_ids`` once the current transaction commits"""
+    changed_at = timezone.now()
+    for smi_id in {smi_id for smi_id in smi_ids if smi_id is not None}:
+        transaction.on_commit(lambda smi_id=smi_id: refresh_stale_snapshot(smi_id, changed_at))
@@ -0,0 +1,173 @@
+"""
+Keyset (cursor) pagination for append-only tables.
+
+PageNumberPagination runs COUNT(*) and OFFSET n, both of which get slower as
+the table grows. KeysetPagination instead remembers the (timestamp, id) of
+the last row served and asks for rows strictly after it, so every page is an
+index range scan of page_size rows. Composite indexes matching each viewset's
+keyset ordering are declared on the models.
+
+A viewset opts in with:
+
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
+
+The last field must be unique. ?ordering= is ignored while keyset
+pagination is active.
+
+Search results (a queryset annotated with search_rank by
+FullTextSearchFilter) are paginated by page number instead, with
+SearchPagination, so they keep the order the filters gave them: relevance,
+or ?ordering=. A keyset on the rank would gain nothing, since ranking has to
+score every match before the first page can be cut anyway.
+"""
+import json
+from base64 import b64decode, b64encode
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def positive_int(value, strict=False, cutoff=None):
+    """
+    ``value`` as an int >= 0 (> 0 with ``strict``), capped at ``cutoff``;
+    ValueError otherwise
+    """
+    number = int(value)
+    if number < 0 or (strict and number == 0):
+        raise ValueError
+    if cutoff:
+        return min(number, cutoff)
+    return number
+
+
+class SearchPagination(PageNumberPagination):
+    """Page-number pagination of ranked search results"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-created_at', '-id')
+    search_pagination_class = SearchPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.search_paginator = None
+        if 'search_rank' in queryset.query.annotations:
+            self.search_paginator = self.search_pagination_class()
+            return self.search_paginator.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(f[1:] if f.startswith('-') else f'-{f}' for f in ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Going forward there is a previous page whenever we started from a
+        # cursor; going backwards there is always a next page.
+        self.has_next = has_more if not reverse else True
+        self.has_previous = position is not None if not reverse else has_more
+        self.page = rows
+        return rows
+
+    def seek_filter(self, ordering, position):
+        """Rows strictly after position in ordering: (a < x) OR (a = x AND b < y) ..."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': position[index]})
+            for earlier in range(index):
+                clause &= Q(**{ordering[earlier].lstrip('-'): position[earlier]})
+            condition |= clause
+        return condition
+
+    def get_page_size(self, request):
+        try:
+            return positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = data['p']
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+            return position, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, field) for field in self.fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values]
+        encoded = b64encode(json.dumps({'p': values, 'r': int(reverse)}).encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.search_paginator is not None:
+            return self.search_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
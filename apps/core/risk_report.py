@@ -0,0 +1,163 @@
+"""
+Industry risk report.
+
+The report covers each active SMI's latest RiskAssessment (picked with a
+correlated subquery, so an SMI that was once high risk but is now low risk
+counts as low risk). It is written as an XLSX workbook with XlsxWriter in
+constant_memory mode, which streams rows to disk instead of holding the
+sheet in memory:
+
+    Summary      totals and distribution per risk level
+    Assessments  one row per SMI
+    High Risk    the HIGH and CRITICAL rows
+
+The file goes to the default storage and is recorded as a
+RiskReportArtifact keyed by report date and data version. The data version
+is a hash of the row counts and latest updated_at of the SMI and
+RiskAssessment tables, so a report is only rebuilt when its inputs changed.
+
+A requested build is single-flight: the requester takes the task_locks
+lease named by build_lease() before it dispatches generate_risk_report, and
+the task releases it when done. Requests arriving while the build is queued
+or running find the lease held and do not dispatch another one; the lease
+expires after settings.TASK_LOCK_TTL if the worker dies.
+"""
+import hashlib
+import tempfile
+
+import xlsxwriter
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from apps.risk_assessment_module.models import RiskAssessment
+
+from .models import SMI, RiskReportArtifact
+
+HIGH_RISK_LEVELS = ('HIGH', 'CRITICAL')
+BUILD_LEASE = 'generate_risk_report:{}:{}'
+
+COLUMNS = [
+    ('Company', 'smi__company_name', 40),
+    ('License Number', 'smi__license_number', 18),
+    ('Assessment Date', 'assessment_date', 16),
+    ('Risk Level', 'risk_level', 14),
+    ('Overall Risk Score', 'overall_risk_score', 18),
+    ('FSI Score', 'fsi_score', 12),
+    ('CAR', 'car', 10),
+    ('Status', 'status', 16),
+]
+
+
+def data_version():
+    """Hash identifying the current state of the report's inputs"""
+    smis = SMI.objects.filter(status='ACTIVE').aggregate(count=Count('pk'), last=Max('updated_at'))
+    assessments = RiskAssessment.objects.aggregate(count=Count('pk'), last=Max('updated_at'))
+    key = repr((smis['count'], smis['last'], assessments['count'], assessments['last']))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def latest_assessments():
+    """Latest assessment of every active SMI, as value tuples in COLUMNS order"""
+    latest = (
+        RiskAssessment.objects.filter(smi=OuterRef('smi'))
+        .order_by('-assessment_date', '-created_at', '-pk')
+        .values('pk')[:1]
+    )
+    return (
+        RiskAssessment.objects.filter(smi__status='ACTIVE', pk=Subquery(latest))
+        .order_by('smi__company_name', 'smi_id')
+        .values_list(*[field for _, field, _ in COLUMNS])
+    )
+
+
+def _write_header(sheet, bold):
+    for col, (title, _, width) in enumerate(COLUMNS):
+        sheet.set_column(col, col, width)
+        sheet.write(0, col, title, bold)
+
+
+def write_workbook(path, report_date):
+    """Write the report to ``path``; returns the summary dict"""
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    bold = workbook.add_format({'bold': True})
+    summary_sheet = workbook.add_worksheet('Summary')
+    assessments_sheet = workbook.add_worksheet('Assessments')
+    high_risk_sheet = workbook.add_worksheet('High Risk')
+    _write_header(assessments_sheet, bold)
+    _write_header(high_risk_sheet, bold)
+
+    level_index = [field for _, field, _ in COLUMNS].index('risk_level')
+    counts = {level: 0 for level, _ in RiskAssessment.RISK_LEVELS}
+    row = high_risk_row = 0
+    for values in latest_assessments().iterator(chunk_size=2000):
+        row += 1
+        assessments_sheet.write_row(row, 0, values)
+        level = values[level_index]
+        counts[level] = counts.get(level, 0) + 1
+        if level in HIGH_RISK_LEVELS:
+            high_risk_row += 1
+            high_risk_sheet.write_row(high_risk_row, 0, values)
+
+    total_smis = SMI.objects.filter(status='ACTIVE').count()
+    summary = {
+        'report_date': report_date.isoformat(),
+        'total_smis': total_smis,
+        'assessed_smis': row,
+        'not_assessed_smis': total_smis - row,
+        'risk_levels': counts,
+    }
+
+    # The summary sheet's rows are only written now that the counts are known
+    summary_sheet.set_column(0, 0, 28)
+    summary_sheet.set_column(1, 2, 14)
+    summary_sheet.write(0, 0, f'PRBS Risk Report - {report_date.isoformat()}', bold)
+    summary_sheet.write_row(2, 0, ['Total Active SMIs', total_smis])
+    summary_sheet.write_row(3, 0, ['Assessed SMIs', row])
+    summary_sheet.write_row(5, 0, ['Risk Level', 'SMIs', 'Share'], bold)
+    percent = workbook.add_format({'num_format': '0.0%'})
+    for offset, (level, label) in enumerate(RiskAssessment.RISK_LEVELS):
+        summary_sheet.write(6 + offset, 0, label)
+        summary_sheet.write(6 + offset, 1, counts[level])
+        summary_sheet.write(6 + offset, 2, counts[level] / row if row else 0, percent)
+    workbook.close()
+    return summary
+
+
+def build_lease(report_date, version):
+    """task_locks name of the build of the report for ``report_date`` at data ``version``"""
+    return BUILD_LEASE.format(report_date.isoformat(), version[:16])
+
+
+def current_artifact(report_date=None, version=None):
+    """The stored report for ``report_date`` (default today) at ``version`` (default current), if any"""
+    report_date = report_date or timezone.now().date()
+    version = version or data_version()
+    return RiskReportArtifact.objects.filter(report_date=report_date, data_version=version).first()
+
+
+def get_or_build_report(report_date=None):
+    """Return the report for ``report_date`` (default today), building it if the inputs changed"""
+    report_date = report_date or timezone.now().date()
+    version = data_version()
+    artifact = RiskReportArtifact.objects.filter(report_date=report_date, data_version=version).first()
+    if artifact is not None:
+        return artifact
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx') as output:
+        summary = write_workbook(output.name, report_date)
+        artifact = RiskReportArtifact(
+            report_date=report_date, data_version=version,
+            smi_count=summary['assessed_smis'], summary=summary,
+        )
+        output.seek(0)
+        artifact.file.save(f'risk-report-{report_date.isoformat()}-{version[:8]}.xlsx', File(output), save=False)
+    try:
+        with transaction.atomic():
+            artifact.save()
+    except IntegrityError:
+        # Built concurrently by another worker: keep theirs
+        artifact.file.delete(save=False)
+        artifact = RiskReportArtifact.objects.get(report_date=report_date, data_version=version)
+    return artifact
@@ -0,0 +1,341 @@
+"""
+Full-text search.
+
+Models are registered with the text fields to index (related fields use the
+usual '__' lookups). Each registered object is flattened into a
+SearchDocument row, which signals keep up to date. When a related object's
+indexed field changes (a User's username, an SMI's company_name), the
+documents embedding it are rebuilt in batches once the transaction commits;
+saves that leave those fields alone reindex nothing. The database index sits on
+top of that table: an FTS5 table on SQLite and a tsvector column on
+PostgreSQL, both created by migration 0004. Any other database falls back to
+LIKE queries on the document.
+
+FullTextSearchFilter is a drop-in replacement for SearchFilter. For
+registered models it answers ?search= from the index and annotates a
+search_rank (lower = more relevant). RankedOrderingFilter then orders by that
+rank unless the client asked for an explicit ?ordering=. For unregistered
+models it behaves exactly like SearchFilter.
+"""
+import re
+from string import Formatter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, CharField, F, FloatField, Func, IntegerField, UUIDField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Concat, Replace, Substr
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import SearchDocument
+
+
+# model class -> tuple of field paths
+_registry = {}
+# related model -> {(registered model, relation): names of the related model's indexed fields}
+_dependents = {}
+
+INDEX_BATCH_SIZE = 2000
+
+
+def register(model, fields):
+    """Index model on fields and keep its documents current via signals"""
+    _registry[model] = tuple(fields)
+    uid = f'search-index-{model._meta.label}'
+    post_save.connect(_reindex_instance, sender=model, dispatch_uid=uid)
+    post_delete.connect(_remove_instance, sender=model, dispatch_uid=uid)
+
+    # Documents that embed a related object's text are refreshed when it changes
+    for path in fields:
+        if '__' not in path:
+            continue
+        relation, related_field = path.split('__', 1)
+        related_model = model._meta.get_field(relation).related_model
+        dependents = _dependents.setdefault(related_model, {})
+        dependents.setdefault((model, relation), set()).add(related_field.split('__', 1)[0])
+        pre_save.connect(
+            _remember_indexed, sender=related_model,
+            dispatch_uid=f'search-dependents-pre-{related_model._meta.label}',
+        )
+        post_save.connect(
+            _reindex_dependents, sender=related_model,
+            dispatch_uid=f'search-dependents-{related_model._meta.label}',
+        )
+
+
+def is_registered(model):
+    return model in _registry
+
+
+def registered_models():
+    return list(_registry)
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def index_queryset(queryset):
+    """(Re)build the search documents for every object in queryset"""
+    model = queryset.model
+    fields = _registry[model]
+    documents = {}
+    for row in queryset.order_by().values_list('pk', *fields):
+        parts = documents.setdefault(str(row[0]), [])
+        parts.extend(str(value) for value in row[1:] if value not in (None, ''))
+
+    label = model_label(model)
+    existing = {
+        document.object_id: document
+        for document in SearchDocument.objects.filter(model_label=label, object_id__in=list(documents))
+    }
+
+    to_create, to_update = [], []
+    for object_id, parts in documents.items():
+        content = ' '.join(parts)
+        document = existing.get(object_id)
+        if document is None:
+            to_create.append(SearchDocument(model_label=label, object_id=object_id, content=content))
+        elif document.content != content:
+            document.content = content
+            to_update.append(document)
+    SearchDocument.objects.bulk_update(to_update, ['content'], batch_size=500)
+    SearchDocument.objects.bulk_create(to_create, batch_size=500)
+    return len(documents)
+
+
+def index_in_batches(queryset, batch_size=None):
+    """index_queryset() over queryset, batch_size (default INDEX_BATCH_SIZE) objects at a time"""
+    batch_size = batch_size or INDEX_BATCH_SIZE
+    model = queryset.model
+    queryset = queryset.order_by('pk')
+    total, last_pk = 0, None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        index_queryset(model.objects.filter(pk__in=pks))
+        total += len(pks)
+        last_pk = pks[-1]
+
+
+def _reindex_instance(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_queryset(sender.objects.filter(pk=instance.pk))
+
+
+def _remove_instance(sender, instance, **kwargs):
+    SearchDocument.objects.filter(model_label=model_label(sender), object_id=str(instance.pk)).delete()
+
+
+def _remember_indexed(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the stored values of the fields other models' documents embed"""
+    instance._search_indexed = None
+    if raw or instance._state.adding:
+        return
+    fields = set().union(*_dependents[sender].values())
+    # e.g. a login only touches User.last_login, which nothing indexes
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if fields:
+        instance._search_indexed = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def _reindex_dependents(sender, instance, raw=False, created=False, **kwargs):
+    previous = getattr(instance, '_search_indexed', None)
+    if raw or created or not previous:
+        return
+    changed = {name for name, value in previous.items() if instance.serializable_value(name) != value}
+    for (model, relation), related_fields in _dependents[sender].items():
+        if related_fields & changed:
+            transaction.on_commit(
+                lambda model=model, relation=relation, pk=instance.pk:
+                    index_in_batches(model.objects.filter(**{relation: pk}))
+            )
+
+
+def _tokens(term):
+    return re.findall(r'\w+', term)
+
+
+def _object_key(model):
+    """SearchDocument.object_id converted to ``model``'s primary key column"""
+    pk = model._meta.pk
+    if isinstance(pk, UUIDField) and not connection.features.has_native_uuid_field:
+        # Stored as 32 hex digits; documents hold str(uuid)
+        return Replace('object_id', Value('-'), Value(''))
+    if isinstance(pk, IntegerField):
+        return Cast('object_id', BigIntegerField())
+    return Cast('object_id', pk.__class__())
+
+
+def _object_id(model):
+    """A ``model`` row's SearchDocument.object_id"""
+    pk = F('pk')
+    if isinstance(model._meta.pk, UUIDField) and not connection.features.has_native_uuid_field:
+        return Concat(
+            Substr(pk, 1, 8), Value('-'), Substr(pk, 9, 4), Value('-'), Substr(pk, 13, 4), Value('-'),
+            Substr(pk, 17, 4), Value('-'), Substr(pk, 21, 12), output_field=CharField(),
+        )
+    return Cast(pk, CharField())
+
+
+class ObjectRank(Func):
+    """
+    Relevance of each row of a registered model (lower is more relevant),
+    computed by ``sql``: a scalar subquery with {query}, {label} and
+    {object_id} placeholders for the backend's query, the model label and
+    the row's document id
+    """
+    output_field = FloatField()
+
+    def __init__(self, sql, query, model):
+        self.sql = sql
+        super().__init__(Value(query), Value(model_label(model)), _object_id(model))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        compiled = dict(zip(
+            ('query', 'label', 'object_id'),
+            (compiler.compile(expression) for expression in self.get_source_expressions()),
+        ))
+        placeholders = [name for _, name, _, _ in Formatter().parse(self.sql) if name]
+        sql = self.sql.format(**{name: part[0] for name, part in compiled.items()})
+        return f'({sql})', [param for name in placeholders for param in compiled[name][1]]
+
+
+class SearchBackend:
+    """
+    Selects and ranks the matches of a search in SQL: documents() is the
+    SearchDocument queryset of every match, rank() an expression over the
+    searched model's rows
+    """
+
+    def documents(self, model, terms):
+        raise NotImplementedError
+
+    def rank(self, model, terms):
+        raise NotImplementedError
+
+    def ranked(self, queryset, terms):
+        """Every match in ``queryset``, annotated with search_rank and most relevant first"""
+        model = queryset.model
+        matches = self.documents(model, terms).values(key=_object_key(model))
+        return (
+            queryset.filter(pk__in=matches)
+            .annotate(search_rank=self.rank(model, terms))
+            .order_by('search_rank', 'pk')
+        )
+
+
+class LikeSearchBackend(SearchBackend):
+    """Portable fallback: substring match on the flattened document, oldest document first"""
+    RANK = "SELECT id FROM core_searchdocument WHERE model_label = {label} AND object_id = {object_id}"
+
+    def documents(self, model, terms):
+        queryset = SearchDocument.objects.filter(model_label=model_label(model))
+        for term in terms:
+            queryset = queryset.filter(content__icontains=term)
+        return queryset
+
+    def rank(self, model, terms):
+        return ObjectRank(self.RANK, '', model)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 MATCH with prefix queries, ranked by bm25"""
+    MATCHES = "SELECT rowid FROM core_searchdocument_fts WHERE core_searchdocument_fts MATCH %s"
+    # A rowid lookup under MATCH walks the term's whole doclist, so the ranks
+    # of all matches are computed in one pass instead: LIMIT -1 keeps SQLite
+    # from flattening the subquery, so it is materialized once per statement
+    # and probed through an automatic index
+    RANK = (
+        "SELECT m.match_rank FROM (SELECT rowid AS document_id, rank AS match_rank FROM core_searchdocument_fts "
+        "WHERE core_searchdocument_fts MATCH {query} LIMIT -1) m "
+        "JOIN core_searchdocument d ON d.id = m.document_id "
+        "WHERE d.model_label = {label} AND d.object_id = {object_id}"
+    )
+
+    def match_query(self, terms):
+        return ' AND '.join('"%s"*' % token.replace('"', '""') for term in terms for token in _tokens(term))
+
+    def documents(self, model, terms):
+        query = self.match_query(terms)
+        if not query:
+            return SearchDocument.objects.none()
+        return SearchDocument.objects.filter(model_label=model_label(model), id__in=RawSQL(self.MATCHES, [query]))
+
+    def rank(self, model, terms):
+        return ObjectRank(self.RANK, self.match_query(terms), model)
+
+
+class PostgresFullTextBackend(SearchBackend):
+    """tsvector match with prefix queries, ranked by ts_rank"""
+    MATCHES = (
+        "SELECT id FROM core_searchdocument "
+        "WHERE model_label = %s AND search_vector @@ to_tsquery('simple', %s)"
+    )
+    RANK = (
+        "SELECT -ts_rank(search_vector, to_tsquery('simple', {query})) FROM core_searchdocument "
+        "WHERE model_label = {label} AND object_id = {object_id}"
+    )
+
+    def match_query(self, terms):
+        return ' & '.join(f'{token}:*' for term in terms for token in _tokens(term))
+
+    def documents(self, model, terms):
+        query = self.match_query(terms)
+        if not query:
+            return SearchDocument.objects.none()
+        return SearchDocument.objects.filter(id__in=RawSQL(self.MATCHES, [model_label(model), query]))
+
+    def rank(self, model, terms):
+        return ObjectRank(self.RANK, self.match_query(terms), model)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Backend named by settings.SEARCH_BACKEND, or the best one for the database"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresFullTextBackend()
+        elif connection.vendor == 'sqlite' and 'core_searchdocument_fts' in connection.introspection.table_names():
+            _backend = SQLiteFTS5Backend()
+        else:
+            _backend = LikeSearchBackend()
+    return _backend
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter answered from the full-text index for registered models.
+    Every match is returned: the objects are selected with a subquery of the
+    matching documents and search_rank is the backend's rank (bm25 or
+    ts_rank) computed in the same statement, so the SQL does not grow with
+    the number of matches.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not is_registered(queryset.model):
+            return super().filter_queryset(request, queryset, view)
+
+        return get_search_backend().ranked(queryset, terms)
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that keeps search relevance order unless ?ordering= is given"""
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and 'search_rank' in queryset.query.annotations:
+            return ['search_rank', 'pk']
+        return super().get_ordering(request, queryset, view)
@@ -1,20 +1,81 @@
 from rest_framework import serializers
+from rest_framework.utils.urls import replace_query_param
 from django.utils import timezone
 import re
 from .models import (
     SMI, BoardMember, MeetingLog, ProductOffering, ClienteleProfile,
     FinancialStatement, ClientAssetMix, LicensingBreach, SupervisoryIntervention,
     Notification, SystemAuditLog, Committee, IncomeItem, Asset, Liability, 
-    Debtor, Creditor, RelatedParty, CapitalPosition
+    Debtor, Creditor, RelatedParty, CapitalPosition, RiskReportArtifact, TaskRun
 )
+from .bulk_sync import sync_children
+from .offsite_profile import rebuild_offsite_profile_snapshot
+
+def _query_param_set(context, name):
+    """Comma separated names from context[name] or ?name=, None if absent"""
+    value = context.get(name)
+    if value is None:
+        request = context.get('request')
+        if request is None or name not in request.query_params:
+            return None
+        value = request.query_params.get(name)
+    if isinstance(value, str):
+        value = value.split(',')
+    return {part.strip() for part in value if part.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets and expandable relations.
+
+    Relations listed in expandable_fields render as their primary key unless
+    the client asks for the nested object with ?expand=smi. ?fields=id,name
+    limits the output of the top-level serializer to the named fields. Both
+    can also be given in the serializer context as 'expand' / 'fields'.
+
+    deferrable_fields names large columns the viewset may leave out of the
+    SELECT when ?fields= does not ask for them.
+    """
+    expandable_fields = ('smi',)
+    deferrable_fields = ()
+
+    @classmethod
+    def expanded_fields(cls, context):
+        return (_query_param_set(context, 'expand') or set()) & set(cls.expandable_fields)
+
+    @classmethod
+    def requested_fields(cls, context):
+        return _query_param_set(context, 'fields')
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expanded = self.expanded_fields(self.context)
+        for name in self.expandable_fields:
+            field = fields.get(name)
+            if field is not None and name not in expanded:
+                kwargs = {'source': field.source} if field.source else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **kwargs)
+
+        requested = self.requested_fields(self.context) if self.is_top_level() else None
+        if requested is not None:
+            fields = {
+                name: field for name, field in fields.items()
+                if name in requested or field.write_only
+            }
+        return fields
+
 
-class SMISerializer(serializers.ModelSerializer):
+class SMISerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SMI
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class BoardMemberSerializer(serializers.ModelSerializer):
+class BoardMemberSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -23,16 +84,17 @@ class BoardMemberSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class MeetingLogSerializer(serializers.ModelSerializer):
+class MeetingLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
+    deferrable_fields = ('agenda', 'decisions')
     
     class Meta:
         model = MeetingLog
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ProductOfferingSerializer(serializers.ModelSerializer):
+class ProductOfferingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -41,7 +103,7 @@ class ProductOfferingSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ClienteleProfileSerializer(serializers.ModelSerializer):
+class ClienteleProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -50,7 +112,7 @@ class ClienteleProfileSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class FinancialStatementSerializer(serializers.ModelSerializer):
+class FinancialStatementSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -59,7 +121,7 @@ class FinancialStatementSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ClientAssetMixSerializer(serializers.ModelSerializer):
+class ClientAssetMixSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -68,7 +130,7 @@ class ClientAssetMixSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class LicensingBreachSerializer(serializers.ModelSerializer):
+class LicensingBreachSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     assigned_to = serializers.StringRelatedField(read_only=True)
@@ -78,7 +140,7 @@ class LicensingBreachSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class SupervisoryInterventionSerializer(serializers.ModelSerializer):
+class SupervisoryInterventionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -87,7 +149,7 @@ class SupervisoryInterventionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     
     class Meta:
@@ -95,7 +157,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class SystemAuditLogSerializer(serializers.ModelSerializer):
+class SystemAuditLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     ip_address = serializers.CharField(max_length=45)
     
@@ -104,6 +166,19 @@ class SystemAuditLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at']
 
+class RiskReportArtifactSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RiskReportArtifact
+        fields = ['id', 'report_date', 'data_version', 'file', 'smi_count', 'summary', 'created_at']
+        read_only_fields = fields
+
+class TaskRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TaskRun
+        fields = ['id', 'task_name', 'task_id', 'started_at', 'finished_at', 'duration_ms', 'rows_read',
+                  'rows_written', 'query_count', 'query_time_ms', 'peak_rss_kb', 'outcome', 'error']
+        read_only_fields = fields
+
 class SMIDashboardSerializer(serializers.Serializer):
     """Dashboard serializer for SMI management"""
     total_smis = serializers.IntegerField()
@@ -114,22 +189,96 @@ class SMIDashboardSerializer(serializers.Serializer):
     high_risk_smis = serializers.IntegerField()
     compliance_alerts = serializers.IntegerField()
 
+class BoardMemberNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BoardMember
+        exclude = ['smi']
+
+class MeetingLogNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MeetingLog
+        exclude = ['smi']
+
+class ProductOfferingNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductOffering
+        exclude = ['smi']
+
+class ClienteleProfileNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ClienteleProfile
+        exclude = ['smi']
+
+class FinancialStatementNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FinancialStatement
+        exclude = ['smi']
+
+class ClientAssetMixNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ClientAssetMix
+        exclude = ['smi']
+
+class LicensingBreachNestedSerializer(serializers.ModelSerializer):
+    assigned_to = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = LicensingBreach
+        exclude = ['smi']
+
+class SupervisoryInterventionNestedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SupervisoryIntervention
+        exclude = ['smi']
+
 class SMIDetailSerializer(serializers.ModelSerializer):
-    """Detailed serializer for SMI with related data"""
-    board_members = BoardMemberSerializer(many=True, read_only=True)
-    meeting_logs = MeetingLogSerializer(many=True, read_only=True)
-    product_offerings = ProductOfferingSerializer(many=True, read_only=True)
-    clientele_profiles = ClienteleProfileSerializer(many=True, read_only=True)
-    financial_statements = FinancialStatementSerializer(many=True, read_only=True)
-    client_asset_mixes = ClientAssetMixSerializer(many=True, read_only=True)
-    licensing_breaches = LicensingBreachSerializer(many=True, read_only=True)
-    supervisory_interventions = SupervisoryInterventionSerializer(many=True, read_only=True)
-    
+    """
+    Detailed serializer for SMI with related data.
+
+    Children are rendered without their parent SMI. Collections listed in the
+    'collection_limits' context ({name: (limit, offset)}) are expected to be
+    prefetched with one extra row; that row is dropped and reported as a
+    next-page link under 'next_links'.
+    """
+    board_members = BoardMemberNestedSerializer(many=True, read_only=True)
+    meeting_logs = MeetingLogNestedSerializer(many=True, read_only=True)
+    product_offerings = ProductOfferingNestedSerializer(many=True, read_only=True)
+    clientele_profiles = ClienteleProfileNestedSerializer(many=True, read_only=True)
+    financial_statements = FinancialStatementNestedSerializer(many=True, read_only=True)
+    client_asset_mixes = ClientAssetMixNestedSerializer(many=True, read_only=True)
+    licensing_breaches = LicensingBreachNestedSerializer(many=True, read_only=True)
+    supervisory_interventions = SupervisoryInterventionNestedSerializer(many=True, read_only=True)
+
+    collections = (
+        'board_members', 'meeting_logs', 'product_offerings', 'clientele_profiles',
+        'financial_statements', 'client_asset_mixes', 'licensing_breaches',
+        'supervisory_interventions',
+    )
+
     class Meta:
         model = SMI
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        limits = self.context.get('collection_limits') or {}
+        if not limits:
+            return data
+
+        request = self.context.get('request')
+        next_links = {}
+        for name, (limit, offset) in limits.items():
+            if len(data[name]) > limit:
+                data[name] = data[name][:limit]
+                url = request.build_absolute_uri() if request else ''
+                url = replace_query_param(url, f'limit_{name}', limit)
+                next_links[name] = replace_query_param(url, f'offset_{name}', offset + limit)
+            else:
+                next_links[name] = None
+        data['next_links'] = next_links
+        return data
+
 class CommitteeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Committee
@@ -213,53 +362,52 @@ class OffsiteProfilingSerializer(serializers.Serializer):
         except SMI.DoesNotExist:
             raise serializers.ValidationError("SMI not found")
 
-        # 1. Board Members - Full replacement
-        BoardMember.objects.filter(smi=smi).delete()
-        for bm_data in validated_data.get('boardMembers', []):
-            BoardMember.objects.create(
-                smi=smi,
-                name=bm_data.get('name'),
-                position=bm_data.get('position'),
-                appointment_date=bm_data.get('appointmentDate'),
-            )
-
-        # 2. Committees - Full replacement
-        Committee.objects.filter(smi=smi).delete()
-        for comm_data in validated_data.get('committees', []):
-            Committee.objects.create(
-                smi=smi,
-                name=comm_data.get('name'),
-                purpose=comm_data.get('purpose'),
-                chairperson=comm_data.get('chairperson'),
-                members=comm_data.get('members', []),
-                meetings_held=comm_data.get('meetingsHeld'),
-                meeting_frequency=comm_data.get('meetingFrequency')
-            )
-
-        # 3. Products - Full replacement
-        ProductOffering.objects.filter(smi=smi).delete()
-        for prod_data in validated_data.get('products', []):
-            ProductOffering.objects.create(
-                smi=smi,
-                product_name=prod_data.get('productName'),
-                product_category=prod_data.get('productType'),
-                income_contribution=prod_data.get('concentrationPercentage')
-            )
-
-        # 4. Clients - Full replacement
-        ClienteleProfile.objects.filter(smi=smi).delete()
+        # Child collections are diffed against the stored rows and written in
+        # bulk (see bulk_sync.sync_children); only changed rows are touched.
+
+        # 1. Board Members
+        sync_children(BoardMember, {'smi': smi}, [
+            {
+                'name': bm_data.get('name'),
+                'position': bm_data.get('position'),
+                'appointment_date': bm_data.get('appointmentDate'),
+            } for bm_data in validated_data.get('boardMembers', [])
+        ], key_fields=('name', 'position'))
+
+        # 2. Committees
+        sync_children(Committee, {'smi': smi}, [
+            {
+                'name': comm_data.get('name'),
+                'purpose': comm_data.get('purpose'),
+                'chairperson': comm_data.get('chairperson'),
+                'members': comm_data.get('members', []),
+                'meetings_held': comm_data.get('meetingsHeld'),
+                'meeting_frequency': comm_data.get('meetingFrequency')
+            } for comm_data in validated_data.get('committees', [])
+        ], key_fields=('name',))
+
+        # 3. Products
+        sync_children(ProductOffering, {'smi': smi}, [
+            {
+                'product_name': prod_data.get('productName'),
+                'product_category': prod_data.get('productType'),
+                'income_contribution': prod_data.get('concentrationPercentage')
+            } for prod_data in validated_data.get('products', [])
+        ], key_fields=('product_name',))
+
+        # 4. Clients
+        clients = []
         for client_data in validated_data.get('clients', []):
             client_type = client_data.get('clientType').upper()
             if client_type not in ['RETAIL', 'WHOLESALE', 'INSTITUTIONAL', 'CORPORATE']:
                 client_type = 'RETAIL'
-
-            ClienteleProfile.objects.create(
-                smi=smi,
-                client_type=client_type,
-                client_count=0,
-                income_contribution=client_data.get('concentrationPercentage'),
-                period=period_end
-            )
+            clients.append({
+                'client_type': client_type,
+                'client_count': 0,
+                'income_contribution': client_data.get('concentrationPercentage'),
+                'period': period_end
+            })
+        sync_children(ClienteleProfile, {'smi': smi}, clients, key_fields=('client_type', 'period'))
 
         # 5. Financial Statement (Income Statement) - Update or Create
         fs_data = validated_data.get('financialStatement')
@@ -275,16 +423,14 @@ class OffsiteProfilingSerializer(serializers.Serializer):
                 'profit_margin': fs_data.get('profitMargin')
             }
         )
-        # Clear existing items for this statement
-        IncomeItem.objects.filter(financial_statement=fs).delete()
-        for item in fs_data.get('incomeItems', []):
-            IncomeItem.objects.create(
-                financial_statement=fs,
-                category=item.get('category'),
-                description=item.get('description'),
-                amount=item.get('amount'),
-                is_core=item.get('isCore')
-            )
+        sync_children(IncomeItem, {'financial_statement': fs}, [
+            {
+                'category': item.get('category'),
+                'description': item.get('description'),
+                'amount': item.get('amount'),
+                'is_core': item.get('isCore')
+            } for item in fs_data.get('incomeItems', [])
+        ], key_fields=('category', 'description'))
 
         # 6. Balance Sheet - Update or Create
         bs_data = validated_data.get('balanceSheet')
@@ -298,66 +444,55 @@ class OffsiteProfilingSerializer(serializers.Serializer):
                 'total_equity': bs_data.get('shareholdersFunds')
             }
         )
-        
-        # Clear existing details
-        Asset.objects.filter(financial_statement=bs).delete()
-        Liability.objects.filter(financial_statement=bs).delete()
-        Debtor.objects.filter(financial_statement=bs).delete()
-        Creditor.objects.filter(financial_statement=bs).delete()
-        RelatedParty.objects.filter(financial_statement=bs).delete()
-
-        for item in bs_data.get('assets', []):
-            Asset.objects.create(
-                financial_statement=bs,
-                asset_type=item.get('assetType'),
-                category=item.get('category'),
-                value=item.get('value'),
-                is_current=item.get('isCurrent'),
-                acquisition_date=item.get('acquisitionDate')
-            )
-        for item in bs_data.get('liabilities', []):
-            Liability.objects.create(
-                financial_statement=bs,
-                liability_type=item.get('liabilityType'),
-                category=item.get('category'),
-                value=item.get('value'),
-                is_current=item.get('isCurrent'),
-                due_date=item.get('dueDate')
-            )
-        for item in bs_data.get('debtors', []):
-            Debtor.objects.create(
-                financial_statement=bs,
-                name=item.get('name'),
-                amount=item.get('amount'),
-                age_days=item.get('ageDays')
-            )
-        for item in bs_data.get('creditors', []):
-            Creditor.objects.create(
-                financial_statement=bs,
-                name=item.get('name'),
-                amount=item.get('amount'),
-                due_date=item.get('dueDate')
-            )
-        for item in bs_data.get('relatedParties', []):
-            RelatedParty.objects.create(
-                financial_statement=bs,
-                name=item.get('name'),
-                relationship=item.get('relationship'),
-                balance=item.get('balance'),
-                transaction_type=item.get('type')
-            )
+        sync_children(Asset, {'financial_statement': bs}, [
+            {
+                'asset_type': item.get('assetType'),
+                'category': item.get('category'),
+                'value': item.get('value'),
+                'is_current': item.get('isCurrent'),
+                'acquisition_date': item.get('acquisitionDate')
+            } for item in bs_data.get('assets', [])
+        ], key_fields=('asset_type', 'category'))
+        sync_children(Liability, {'financial_statement': bs}, [
+            {
+                'liability_type': item.get('liabilityType'),
+                'category': item.get('category'),
+                'value': item.get('value'),
+                'is_current': item.get('isCurrent'),
+                'due_date': item.get('dueDate')
+            } for item in bs_data.get('liabilities', [])
+        ], key_fields=('liability_type', 'category'))
+        sync_children(Debtor, {'financial_statement': bs}, [
+            {
+                'name': item.get('name'),
+                'amount': item.get('amount'),
+                'age_days': item.get('ageDays')
+            } for item in bs_data.get('debtors', [])
+        ], key_fields=('name',))
+        sync_children(Creditor, {'financial_statement': bs}, [
+            {
+                'name': item.get('name'),
+                'amount': item.get('amount'),
+                'due_date': item.get('dueDate')
+            } for item in bs_data.get('creditors', [])
+        ], key_fields=('name',))
+        sync_children(RelatedParty, {'financial_statement': bs}, [
+            {
+                'name': item.get('name'),
+                'relationship': item.get('relationship'),
+                'balance': item.get('balance'),
+                'transaction_type': item.get('type')
+            } for item in bs_data.get('relatedParties', [])
+        ], key_fields=('name', 'relationship'))
 
         # 7. Client Assets - Replace for this period
-        # Assuming period match
-        ClientAssetMix.objects.filter(smi=smi, period=period_end).delete()
-        for ca_data in validated_data.get('clientAssets', []):
-            ClientAssetMix.objects.create(
-                smi=smi,
-                period=period_end,
-                asset_class=ca_data.get('assetType'),
-                allocation_percentage=ca_data.get('concentrationPercentage'),
-                market_value=ca_data.get('value')
-            )
+        sync_children(ClientAssetMix, {'smi': smi, 'period': period_end}, [
+            {
+                'asset_class': ca_data.get('assetType'),
+                'allocation_percentage': ca_data.get('concentrationPercentage'),
+                'market_value': ca_data.get('value')
+            } for ca_data in validated_data.get('clientAssets', [])
+        ], key_fields=('asset_class',))
 
         # 8. Capital Position - Update or Create
         cp_data = validated_data.get('capitalPosition')
@@ -378,4 +513,7 @@ class OffsiteProfilingSerializer(serializers.Serializer):
             smi.status = 'ACTIVE'
             smi.save()
 
+        # Refresh the materialized profile read by OffsiteProfilingViewSet.retrieve
+        rebuild_offsite_profile_snapshot(smi)
+
         return validated_data
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Single-flight leases for periodic tasks.
+
+A batch run takes the lease of its task name before it plans any chunks,
+renews it before every sub-batch of every chunk (the heartbeat; a chunk that
+cannot renew it stops, see apps.core.batch_runs) and releases it when the run
+finishes (see apps.core.tasks). A run that finds the lease held by a live
+holder is skipped: incremental tasks keep their DirtySMI markers until a
+run completes, so the skipped run's changes are picked up by the next one.
+A lease that is not renewed within settings.TASK_LOCK_TTL seconds expires,
+so a run whose worker died does not block the task for good.
+
+Two backends, chosen with settings.TASK_LOCK_BACKEND:
+
+    database  TaskLease rows, taken with a conditional UPDATE (or INSERT for
+              a task's first lease), so only one contender can win; shown
+              in the admin
+    cache     the Django cache, taken with cache.add(); needs a cache shared
+              by all workers (not LocMem) and renews with get/set, so a
+              heartbeat racing an expiry can be lost
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TaskLease
+
+CACHE_KEY = 'task-lease:{}'
+
+
+def lease_ttl():
+    return timedelta(seconds=getattr(settings, 'TASK_LOCK_TTL', 900))
+
+
+class DatabaseLeases:
+    def acquire(self, task_name, owner):
+        now = timezone.now()
+        fields = {'owner': owner, 'acquired_at': now, 'heartbeat_at': now,
+                  'expires_at': now + lease_ttl(), 'released_at': None}
+        free = Q(expires_at__lte=now) | Q(owner=owner)
+        if TaskLease.objects.filter(free, task_name=task_name).update(**fields):
+            return True
+        try:
+            with transaction.atomic():
+                TaskLease.objects.create(task_name=task_name, **fields)
+        except IntegrityError:
+            # Exists and is held by someone else
+            return False
+        return True
+
+    def renew(self, task_name, owner):
+        now = timezone.now()
+        return bool(TaskLease.objects.filter(
+            task_name=task_name, owner=owner, released_at__isnull=True, expires_at__gt=now,
+        ).update(heartbeat_at=now, expires_at=now + lease_ttl()))
+
+    def release(self, task_name, owner):
+        now = timezone.now()
+        return bool(TaskLease.objects.filter(task_name=task_name, owner=owner, released_at__isnull=True).update(
+            released_at=now, expires_at=now
+        ))
+
+    def holder(self, task_name):
+        lease = TaskLease.objects.filter(task_name=task_name, expires_at__gt=timezone.now()).first()
+        if lease is None:
+            return None
+        return {'owner': lease.owner, 'acquired_at': lease.acquired_at,
+                'heartbeat_at': lease.heartbeat_at, 'expires_at': lease.expires_at}
+
+
+class CacheLeases:
+    def _state(self, owner, acquired_at=None):
+        now = timezone.now()
+        return {'owner': owner, 'acquired_at': acquired_at or now, 'heartbeat_at': now,
+                'expires_at': now + lease_ttl()}
+
+    def acquire(self, task_name, owner):
+        key = CACHE_KEY.format(task_name)
+        timeout = lease_ttl().total_seconds()
+        if cache.add(key, self._state(owner), timeout=timeout):
+            return True
+        current = cache.get(key)
+        if current is not None and current['owner'] == owner:
+            cache.set(key, self._state(owner, current['acquired_at']), timeout=timeout)
+            return True
+        return False
+
+    def renew(self, task_name, owner):
+        key = CACHE_KEY.format(task_name)
+        current = cache.get(key)
+        if current is None or current['owner'] != owner:
+            return False
+        cache.set(key, self._state(owner, current['acquired_at']), timeout=lease_ttl().total_seconds())
+        return True
+
+    def release(self, task_name, owner):
+        key = CACHE_KEY.format(task_name)
+        current = cache.get(key)
+        if current is None or current['owner'] != owner:
+            return False
+        cache.delete(key)
+        return True
+
+    def holder(self, task_name):
+        return cache.get(CACHE_KEY.format(task_name))
+
+
+BACKENDS = {
+    'database': DatabaseLeases(),
+    'cache': CacheLeases(),
+}
+
+
+def backend():
+    return BACKENDS[getattr(settings, 'TASK_LOCK_BACKEND', 'database')]
+
+
+def acquire(task_name, owner):
+    """Take the lease of ``task_name`` for ``owner``; False while someone else holds it"""
+    return backend().acquire(task_name, owner)
+
+
+def renew(task_name, owner):
+    """Heartbeat: extend ``owner``'s lease; False if it expired or was taken over"""
+    return backend().renew(task_name, owner)
+
+
+def release(task_name, owner):
+    return backend().release(task_name, owner)
+
+
+def holder(task_name):
+    """Current holder as {'owner', 'acquired_at', 'heartbeat_at', 'expires_at'}, or None"""
+    return backend().holder(task_name)
@@ -1,99 +1,43 @@
-from celery import shared_task
-from django.core.mail import send_mail
-from django.conf import settings
-from django.utils import timezone
-from datetime import datetime, timedelta
+from celery import chord, shared_task
 import logging
+import uuid
 
-from .models import (
-    SMI, RiskAssessment, ComplianceIndex, Notification, 
-    LicensingBreach, InspectionReport, Case
-)
+from . import job_queue, mailer, task_locks
+from .change_tracking import pending_smis
+from .breaches import check_licensing_breaches_for
+from .breakdown_store import compact_breakdowns
+from .compliance_scoring import update_compliance_indices_for
+from .batch_runs import execute_chunk, plan_batch_run, refresh_progress, reset_failed_chunks
+from .models import SMI, BatchChunk, BatchRun
+from .risk_report import get_or_build_report
+from .risk_scoring import score_smis
+from .telemetry import mark_skipped, record_rows, track_run
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def calculate_risk_scores():
+@track_run
+def calculate_risk_scores(chunk_size=None, full=False):
     """
-    Calculate risk scores for all SMIs
+    Calculate risk scores for active SMIs whose inputs changed since the last
+    run (every active SMI with full=True), fanned out in chunks
     """
     try:
-        smis = SMI.objects.filter(status='ACTIVE')
-        for smi in smis:
-            # Get latest financial data
-            latest_financial = smi.financial_statements.order_by('-period').first()
-            if not latest_financial:
-                continue
-            
-            # Calculate FSI score based on financial ratios
-            fsi_score = calculate_fsi_score(latest_financial)
-            
-            # Calculate Capital Adequacy Ratio
-            car = calculate_car(latest_financial)
-            
-            # Determine risk level
-            risk_level = determine_risk_level(fsi_score, car)
-            
-            # Create or update risk assessment
-            risk_assessment, created = RiskAssessment.objects.get_or_create(
-                smi=smi,
-                assessment_date=timezone.now().date(),
-                assessment_period='QUARTERLY',
-                defaults={
-                    'fsi_score': fsi_score,
-                    'car': car,
-                    'risk_level': risk_level,
-                    'overall_risk_score': (fsi_score + (100 - car)) / 2,
-                    'status': 'COMPLETED'
-                }
-            )
-            
-            if not created:
-                risk_assessment.fsi_score = fsi_score
-                risk_assessment.car = car
-                risk_assessment.risk_level = risk_level
-                risk_assessment.overall_risk_score = (fsi_score + (100 - car)) / 2
-                risk_assessment.save()
-        
-        logger.info(f"Risk scores calculated for {smis.count()} SMIs")
-        return True
+        return start_batch_run('calculate_risk_scores', chunk_size=chunk_size, full=full)
         
     except Exception as e:
         logger.error(f"Error calculating risk scores: {str(e)}")
         return False
 
 @shared_task
-def send_pending_notifications():
+@track_run
+def send_pending_notifications(batch_size=None):
     """
-    Send pending notifications via email
+    Send pending notifications via email in batches (see mailer)
     """
     try:
-        pending_notifications = Notification.objects.filter(
-            email_sent=False,
-            created_at__gte=timezone.now() - timedelta(days=1)
-        )
-        
-        for notification in pending_notifications:
-            try:
-                # Send email
-                send_mail(
-                    subject=notification.title,
-                    message=notification.message,
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[notification.user.email],
-                    fail_silently=False,
-                )
-                
-                # Mark as sent
-                notification.email_sent = True
-                notification.email_sent_at = timezone.now()
-                notification.save()
-                
-                logger.info(f"Notification sent to {notification.user.email}")
-                
-            except Exception as e:
-                logger.error(f"Failed to send notification {notification.id}: {str(e)}")
-        
+        sent = mailer.send_pending(batch_size or mailer.BATCH_SIZE)
+        logger.info(f"Sent {sent} notification emails")
         return True
         
     except Exception as e:
@@ -101,290 +45,164 @@ def send_pending_notifications():
         return False
 
 @shared_task
-def update_compliance_indices():
+@track_run
+def update_compliance_indices(chunk_size=None, full=False):
     """
-    Update compliance indices for all SMIs
+    Update compliance indices for active SMIs whose inputs changed since the
+    last run (every active SMI with full=True), fanned out in chunks
     """
     try:
-        smis = SMI.objects.filter(status='ACTIVE')
-        current_period = timezone.now().date()
-        
-        for smi in smis:
-            # Get latest risk assessment
-            latest_risk = smi.risk_assessments.order_by('-assessment_date').first()
-            if not latest_risk:
-                continue
-            
-            # Get latest inspection reports
-            latest_inspection = smi.inspection_reports.order_by('-inspection_date').first()
-            
-            # Calculate compliance score
-            compliance_score = calculate_compliance_score(smi, latest_risk, latest_inspection)
-            
-            # Create or update compliance index
-            compliance_index, created = ComplianceIndex.objects.get_or_create(
-                smi=smi,
-                period=current_period,
-                analysis_period='QUARTERLY',
-                defaults={
-                    'overall_compliance_score': compliance_score,
-                    'risk_calibration_score': compliance_score,
-                    'final_compliance_score': compliance_score
-                }
-            )
-            
-            if not created:
-                compliance_index.overall_compliance_score = compliance_score
-                compliance_index.risk_calibration_score = compliance_score
-                compliance_index.final_compliance_score = compliance_score
-                compliance_index.save()
-        
-        logger.info(f"Compliance indices updated for {smis.count()} SMIs")
-        return True
+        return start_batch_run('update_compliance_indices', chunk_size=chunk_size, full=full)
         
     except Exception as e:
         logger.error(f"Error updating compliance indices: {str(e)}")
         return False
 
 @shared_task
-def check_licensing_breaches():
+@track_run
+def check_licensing_breaches(chunk_size=None):
     """
-    Check for potential licensing breaches
+    Check for potential licensing breaches, fanned out in chunks
     """
     try:
-        smis = SMI.objects.filter(status='ACTIVE')
-        
-        for smi in smis:
-            # Check for overdue inspections
-            overdue_inspections = smi.inspection_reports.filter(
-                status='OPEN',
-                due_date__lt=timezone.now().date()
-            )
-            
-            if overdue_inspections.exists():
-                # Create breach record
-                breach, created = LicensingBreach.objects.get_or_create(
-                    smi=smi,
-                    breach_type='MINOR',
-                    breach_date=timezone.now().date(),
-                    description='Overdue inspection report',
-                    status='OPEN'
-                )
-                
-                if created:
-                    # Create notification
-                    # user=smi.userprofile_set.first().user if smi.userprofile_set.exists() else None,  # Temporarily commented out
-                    Notification.objects.create(
-                        user=None,  # Temporarily set to None
-                        notification_type='BREACH_ALERT',
-                        title='Overdue Inspection Report',
-                        message=f'Inspection report for {smi.company_name} is overdue',
-                        priority='HIGH'
-                    )
-        
-        logger.info("Licensing breaches checked")
-        return True
+        return start_batch_run('check_licensing_breaches', chunk_size=chunk_size)
         
     except Exception as e:
         logger.error(f"Error checking licensing breaches: {str(e)}")
         return False
 
 @shared_task
-def generate_risk_report():
+@track_run
+def run_batch_chunk(chunk_id):
     """
-    Generate comprehensive risk report
+    Process one chunk of a batch run; failures are recorded, not raised
+    """
+    chunk = BatchChunk.objects.select_related('run').get(pk=chunk_id)
+    record_rows(read=len(chunk.smi_ids))
+    return execute_chunk(chunk, BATCH_JOBS[chunk.run.task_name])
+
+@shared_task
+@track_run
+def finish_batch_run(run_id):
+    """
+    Chord callback: final progress counters and status of a batch run
+    """
+    stats = refresh_progress(run_id, finished=True)
+    logger.info(
+        f"Batch run {run_id} finished: {stats['chunks_done']} chunks done, "
+        f"{stats['failures']} failed, {stats['rows_processed']} rows"
+    )
+    return stats['status']
+
+@shared_task
+@track_run
+def retry_failed_chunks(run_id):
+    """
+    Re-dispatch only the failed chunks of a batch run
+    """
+    run = BatchRun.objects.get(pk=run_id)
+    if run.lease_owner and not task_locks.acquire(run.task_name, run.lease_owner):
+        skip_overlapping_run(run.task_name)
+        return 0
+    chunk_ids = reset_failed_chunks(run)
+    if chunk_ids:
+        dispatch_chunks(run, chunk_ids)
+    return len(chunk_ids)
+
+@shared_task
+@track_run
+def generate_risk_report(lease_name=None, lease_owner=None):
+    """
+    Generate the industry risk report (XLSX) unless today's report is
+    already stored for the current data (see risk_report). Releases the
+    build lease taken by the requester, if any.
     """
     try:
-        # Get all active SMIs
-        active_smis = SMI.objects.filter(status='ACTIVE')
-        
-        # Calculate industry averages
-        industry_stats = {
-            'total_smis': active_smis.count(),
-            'high_risk_count': active_smis.filter(risk_assessments__risk_level='HIGH').distinct().count(),
-            'medium_risk_count': active_smis.filter(risk_assessments__risk_level='MEDIUM').distinct().count(),
-            'low_risk_count': active_smis.filter(risk_assessments__risk_level='LOW').distinct().count(),
-        }
-        
-        # Generate report content
-        report_content = f"""
-        PRBS Risk Report - {timezone.now().strftime('%Y-%m-%d')}
-        
-        Industry Overview:
-        - Total Active SMIs: {industry_stats['total_smis']}
-        - High Risk: {industry_stats['high_risk_count']}
-        - Medium Risk: {industry_stats['medium_risk_count']}
-        - Low Risk: {industry_stats['low_risk_count']}
-        
-        Risk Distribution:
-        - High Risk: {(industry_stats['high_risk_count']/industry_stats['total_smis']*100):.1f}%
-        - Medium Risk: {(industry_stats['medium_risk_count']/industry_stats['total_smis']*100):.1f}%
-        - Low Risk: {(industry_stats['low_risk_count']/industry_stats['total_smis']*100):.1f}%
-        """
-        
-        # Create notification for compliance officers
-        # compliance_users = UserProfile.objects.filter(role='COMPLIANCE_OFFICER')  # Temporarily commented out
-        # for user_profile in compliance_users:
-        #     Notification.objects.create(
-        #         user=user_profile.user,
-        #         notification_type='MARKET_SUBMISSION',
-        #         title='Risk Report Generated',
-        #         message=f'Monthly risk report has been generated. {industry_stats["high_risk_count"]} SMIs identified as high risk.',
-        #         priority='MEDIUM'
-        #     )
-        
-        logger.info("Risk report generated successfully")
-        return True
+        artifact = get_or_build_report()
+        logger.info(f"Risk report available: {artifact.file.name} ({artifact.smi_count} SMIs)")
+        return artifact.pk
         
     except Exception as e:
         logger.error(f"Error generating risk report: {str(e)}")
         return False
 
-# Helper functions
-def calculate_fsi_score(financial_statement):
+    finally:
+        if lease_name:
+            task_locks.release(lease_name, lease_owner)
+
+@shared_task
+@track_run
+def compact_calculation_breakdowns():
     """
-    Calculate Financial Stability Index score
+    Roll calculation breakdowns older than the retention period into daily
+    summaries (see breakdown_store)
     """
-    from .formula_models import CalculationBreakdown
-    from decimal import Decimal
-    
     try:
-        # Simple scoring based on profitability and margins
-        if financial_statement.profit_margin and financial_statement.profit_margin > 0:
-            profit_score = min(100, financial_statement.profit_margin * 100)
-        else:
-            profit_score = 0
-        
-        if financial_statement.gross_margin and financial_statement.gross_margin > 0:
-            margin_score = min(100, financial_statement.gross_margin * 100)
-        else:
-            margin_score = 0
-        
-        # Weights
-        profit_weight = 0.6
-        margin_weight = 0.4
-        
-        # Calculate contributions
-        profit_contribution = profit_score * profit_weight
-        margin_contribution = margin_score * margin_weight
-        
-        # Weighted average
-        fsi_score = profit_contribution + margin_contribution
-        fsi_score = max(0, min(100, fsi_score))
-        
-        # Save calculation breakdown
-        components = [
-            {
-                "name": "Profit Margin",
-                "value": float(financial_statement.profit_margin) if financial_statement.profit_margin else 0,
-                "weight": profit_weight,
-                "score": profit_score,
-                "contribution": profit_contribution,
-                "impact_percentage": (profit_contribution / fsi_score * 100) if fsi_score > 0 else 0,
-                "description": "Company's profit margin ratio"
-            },
-            {
-                "name": "Gross Margin",
-                "value": float(financial_statement.gross_margin) if financial_statement.gross_margin else 0,
-                "weight": margin_weight,
-                "score": margin_score,
-                "contribution": margin_contribution,
-                "impact_percentage": (margin_contribution / fsi_score * 100) if fsi_score > 0 else 0,
-                "description": "Company's gross margin ratio"
-            }
-        ]
-        
-        # Create breakdown record
-        CalculationBreakdown.objects.create(
-            calculation_type='FSI_SCORE',
-            reference_id=financial_statement.smi.id,
-            final_value=Decimal(str(fsi_score)),
-            final_percentage=Decimal(str(fsi_score)),
-            components=components,
-            calculated_by='system'
-        )
-        
-        return fsi_score
+        compacted = compact_breakdowns()
+        logger.info(f"Compacted {compacted} calculation breakdowns into daily summaries")
+        return compacted
         
     except Exception as e:
-        logger.error(f"Error calculating FSI score: {str(e)}")
-        return 50  # Default score
+        logger.error(f"Error compacting calculation breakdowns: {str(e)}")
+        return False
+
+# Batch fan-out
+def start_batch_run(task_name, smis=None, chunk_size=None, full=False):
+    """
+    Split ``smis`` into chunks and dispatch them as a chord. Returns the
+    BatchRun id, or None when a run of the task is still in progress. By
+    default incremental tasks take the active SMIs changed since their last
+    completed run, other tasks every active SMI.
+    """
+    lease_owner = uuid.uuid4().hex
+    if not task_locks.acquire(task_name, lease_owner):
+        skip_overlapping_run(task_name)
+        return None
 
-def calculate_car(financial_statement):
-    """
-    Calculate Capital Adequacy Ratio
-    """
-    from .formula_models import CalculationBreakdown
-    from decimal import Decimal
-    
     try:
-        if financial_statement.total_equity and financial_statement.total_assets:
-            car = (financial_statement.total_equity / financial_statement.total_assets) * 100
-            car = max(0, min(100, car))
-            
-            # Save calculation breakdown
-            components = [
-                {
-                    "name": "Total Equity",
-                    "value": float(financial_statement.total_equity),
-                    "weight": 1.0,
-                    "contribution": float(financial_statement.total_equity),
-                    "impact_percentage": 100.0,
-                    "description": "Company's total equity"
-                },
-                {
-                    "name": "Total Assets",
-                    "value": float(financial_statement.total_assets),
-                    "weight": 1.0,
-                    "contribution": float(financial_statement.total_assets),
-                    "impact_percentage": 0.0,
-                    "description": "Company's total assets (denominator)"
-                }
-            ]
-            
-            CalculationBreakdown.objects.create(
-                calculation_type='CAR',
-                reference_id=financial_statement.smi.id,
-                final_value=Decimal(str(car)),
-                final_percentage=Decimal(str(car)),
-                components=components,
-                calculated_by='system'
-            )
-            
-            return car
-        return 50  # Default ratio
-    except Exception as e:
-        logger.error(f"Error calculating CAR: {str(e)}")
-        return 50
+        watermark = None
+        if smis is None:
+            smis = SMI.objects.filter(status='ACTIVE')
+            scope = INCREMENTAL_SCOPES.get(task_name)
+            if scope:
+                smis, watermark = pending_smis(task_name, scope, smis, full=full)
+        run = plan_batch_run(task_name, smis, chunk_size, watermark=watermark, full_rebuild=full,
+                             lease_owner=lease_owner)
+        dispatch_chunks(run, list(run.chunks.values_list('pk', flat=True)))
+    except Exception:
+        task_locks.release(task_name, lease_owner)
+        raise
+    logger.info(f"{task_name}: dispatched {run.total_chunks} chunks of {run.chunk_size} SMIs (run {run.pk})")
+    return run.pk
 
-def determine_risk_level(fsi_score, car):
-    """
-    Determine risk level based on FSI score and CAR
-    """
-    if fsi_score >= 70 and car >= 15:
-        return 'LOW'
-    elif fsi_score >= 50 and car >= 10:
-        return 'MEDIUM'
-    else:
-        return 'HIGH'
+def skip_overlapping_run(task_name):
+    holder = task_locks.holder(task_name) or {}
+    reason = (f"Previous run still in progress (lease held by {holder.get('owner')} "
+              f"until {holder.get('expires_at')})")
+    logger.info(f"{task_name}: skipped. {reason}")
+    mark_skipped(reason)
 
-def calculate_compliance_score(smi, risk_assessment, inspection_report):
-    """
-    Calculate compliance score based on risk assessment and inspection results
-    """
-    base_score = 75  # Base compliance score
-    
-    # Adjust based on risk level
-    if risk_assessment.risk_level == 'LOW':
-        base_score += 15
-    elif risk_assessment.risk_level == 'HIGH':
-        base_score -= 20
-    
-    # Adjust based on inspection findings
-    if inspection_report and inspection_report.status == 'RESOLVED':
-        base_score += 10
-    elif inspection_report and inspection_report.status == 'OPEN':
-        base_score -= 15
-    
-    return max(0, min(100, base_score))
+def dispatch_chunks(run, chunk_ids):
+    if not chunk_ids:
+        finish_batch_run(run.pk)
+        return
+    if job_queue.using_database_queue():
+        job_queue.enqueue_chord(
+            [(run_batch_chunk.name, [chunk_id]) for chunk_id in chunk_ids], (finish_batch_run.name, [run.pk])
+        )
+        return
+    chord(run_batch_chunk.si(chunk_id) for chunk_id in chunk_ids)(finish_batch_run.si(run.pk))
+
+# Tasks that only revisit SMIs marked dirty for their scope (see change_tracking).
+# Breach checks depend on the calendar as well as on data, so they stay full.
+INCREMENTAL_SCOPES = {
+    'calculate_risk_scores': 'RISK',
+    'update_compliance_indices': 'COMPLIANCE',
+}
 
+# Per-chunk work of each fanned-out task: callable(smi queryset) -> rows processed
+BATCH_JOBS = {
+    'calculate_risk_scores': score_smis,
+    'update_compliance_indices': update_compliance_indices_for,
+    'check_licensing_breaches': check_licensing_breaches_for,
+}
@@ -0,0 +1,227 @@
+"""
+Task run telemetry.
+
+Decorate a task function with track_run (below @shared_task) to record a
+TaskRun row for every execution:
+
+    duration      wall-clock time of the call
+    queries       number and total time of the queries on the default
+                  connection, measured with an execute_wrapper
+    rows_written  sum of the row counts of INSERT/UPDATE/DELETE statements
+    rows_read     what the task reports with record_rows(read=...); SQLite
+                  gives no row count for SELECT
+    peak_rss_kb   the worker's peak resident set size so far
+    outcome       FAILED when the task raises or returns False (the tasks
+                  catch their own exceptions); the error is the exception or
+                  the last error logged by the task's module. SKIPPED when
+                  the task called mark_skipped(), with its reason
+
+Recording never affects the task: a failure to save the TaskRun is logged.
+duration_percentiles() summarises the runs for the API and the admin.
+"""
+import contextvars
+import functools
+import logging
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .models import TaskRun
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = {
+    'day': TruncDay,
+    'hour': TruncHour,
+}
+
+WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+_current_run = contextvars.ContextVar('task_run_metrics', default=None)
+_task_id = contextvars.ContextVar('task_run_id', default=None)
+
+
+class RunMetrics:
+    """Counters collected while a tracked task runs"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.rows_read = 0
+        self.rows_written = 0
+        self.last_error = ''
+        self.skipped = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_time += time.perf_counter() - start
+            if WRITE_STATEMENT.match(sql):
+                rowcount = getattr(context['cursor'], 'rowcount', -1)
+                if rowcount and rowcount > 0:
+                    self.rows_written += rowcount
+
+
+class _ErrorCapture(logging.Handler):
+    """Keeps the last ERROR message the task logged before returning False"""
+
+    def __init__(self, metrics):
+        super().__init__(logging.ERROR)
+        self.metrics = metrics
+
+    def emit(self, record):
+        self.metrics.last_error = record.getMessage()
+
+
+def record_rows(read=0, written=0):
+    """Add to the row counters of the task running in this context, if any"""
+    metrics = _current_run.get()
+    if metrics is not None:
+        metrics.rows_read += read
+        metrics.rows_written += written
+
+
+def mark_skipped(reason):
+    """Record the task running in this context as SKIPPED"""
+    metrics = _current_run.get()
+    if metrics is not None:
+        metrics.skipped = reason
+
+
+def peak_rss_kb():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+@contextmanager
+def task_id(value):
+    """Record runs in this context under ``value`` when Celery has no request id"""
+    token = _task_id.set(value)
+    try:
+        yield
+    finally:
+        _task_id.reset(token)
+
+
+def _current_task_id():
+    from celery import current_task
+    if _task_id.get():
+        return _task_id.get()
+
+    request = getattr(current_task, 'request', None)
+    return getattr(request, 'id', None) or ''
+
+
+def track_run(func):
+    """Record a TaskRun for each call of ``func``"""
+    task_logger = logging.getLogger(func.__module__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = RunMetrics()
+        capture = _ErrorCapture(metrics)
+        token = _current_run.set(metrics)
+        task_logger.addHandler(capture)
+        started_at = timezone.now()
+        start = time.perf_counter()
+        outcome, error = 'SUCCESS', ''
+        try:
+            with connection.execute_wrapper(metrics):
+                result = func(*args, **kwargs)
+            if metrics.skipped is not None:
+                outcome, error = 'SKIPPED', metrics.skipped
+            elif result is False:
+                outcome, error = 'FAILED', metrics.last_error
+            return result
+        except Exception as e:
+            outcome, error = 'FAILED', str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            task_logger.removeHandler(capture)
+            _current_run.reset(token)
+            _save_run(
+                task_name=func.__name__,
+                task_id=_current_task_id(),
+                started_at=started_at,
+                finished_at=timezone.now(),
+                duration_ms=duration * 1000,
+                rows_read=metrics.rows_read,
+                rows_written=metrics.rows_written,
+                query_count=metrics.query_count,
+                query_time_ms=metrics.query_time * 1000,
+                peak_rss_kb=peak_rss_kb(),
+                outcome=outcome,
+                error=error,
+            )
+
+    return wrapper
+
+
+def _save_run(**fields):
+    try:
+        TaskRun.objects.create(**fields)
+    except Exception as e:
+        logger.warning(f"Could not record task run of {fields['task_name']}: {str(e)}")
+
+
+def duration_percentiles(queryset=None, days=7, bucket='day'):
+    """
+    p50/p95 duration per task and time bucket ('day', 'hour' or None for the
+    whole window) over the last ``days`` days, newest bucket first. Skipped
+    runs are counted but left out of the percentiles.
+    """
+    if queryset is None:
+        queryset = TaskRun.objects.all()
+    queryset = queryset.filter(started_at__gte=timezone.now() - timedelta(days=days)).order_by()
+    if bucket:
+        queryset = queryset.annotate(period=BUCKETS[bucket]('started_at'))
+        rows = queryset.values_list('task_name', 'period', 'duration_ms', 'outcome')
+    else:
+        rows = ((name, None, duration, outcome)
+                for name, duration, outcome in queryset.values_list('task_name', 'duration_ms', 'outcome'))
+
+    groups = {}
+    for task_name, period, duration, outcome in rows:
+        group = groups.setdefault((task_name, period), {'durations': [], 'FAILED': 0, 'SKIPPED': 0})
+        if outcome == 'SKIPPED':
+            group['SKIPPED'] += 1
+            continue
+        group['durations'].append(duration)
+        group['FAILED'] += outcome == 'FAILED'
+
+    stats = []
+    for (task_name, period), group in groups.items():
+        durations = group['durations']
+        p50, p95 = np.percentile(durations, [50, 95]) if durations else (0, 0)
+        stats.append({
+            'task_name': task_name,
+            'period': period,
+            'runs': len(durations),
+            'failures': group['FAILED'],
+            'skipped': group['SKIPPED'],
+            'p50_ms': round(float(p50), 1),
+            'p95_ms': round(float(p95), 1),
+        })
+    stats.sort(key=lambda row: row['task_name'])
+    if bucket:
+        stats.sort(key=lambda row: row['period'], reverse=True)
+    return stats
@@ -1,6 +1,12 @@
+from io import StringIO
+import json
 from django.test import TestCase
 from django.contrib.auth.models import User
-from .models import SMI, BoardMember, MeetingLog, ProductOffering, ClienteleProfile, FinancialStatement, ClientAssetMix, RiskAssessment, StressTest, InspectionReport, ComplianceIndex, LicensingBreach, SupervisoryIntervention, Case, VA_VASP, Notification, SystemAuditLog
+from .models import SMI, BoardMember, MeetingLog, ProductOffering, ClienteleProfile, FinancialStatement, ClientAssetMix, LicensingBreach, SupervisoryIntervention, Notification, SystemAuditLog
+from apps.risk_assessment_module.models import RiskAssessment, StressTest
+from apps.compliance_module.models import ComplianceIndex
+from apps.case_management_module.models import Case
+from apps.va_vasp_module.models import VA_VASP
 
 class CoreModuleTestCase(TestCase):
     def setUp(self):
@@ -174,22 +180,19 @@ class CoreModuleTestCase(TestCase):
         self.assertTrue(stress_test.passed)
 
     def test_inspection_report_creation(self):
-        """Test creating an inspection report"""
-        report = InspectionReport.objects.create(
+        """Test creating an inspection (an AD_HOC_INSPECTION case)"""
+        report = Case.objects.create(
             smi=self.smi,
-            inspection_type='ONSITE',
-            inspection_date='2023-01-15',
-            inspector=self.user,
-            executive_summary='Overall compliance is satisfactory',
-            scope='Comprehensive onsite inspection',
-            methodology='Risk-based inspection approach',
-            findings='Minor gaps in documentation',
-            severity='MEDIUM',
-            risk_areas='CDD, record-keeping'
+            case_type='AD_HOC_INSPECTION',
+            title='Onsite inspection',
+            description='Minor gaps in documentation',
+            assigned_to=self.user,
+            opened_date='2023-01-15',
+            priority='MEDIUM',
         )
         self.assertEqual(report.smi, self.smi)
-        self.assertEqual(report.inspection_type, 'ONSITE')
-        self.assertEqual(report.inspector, self.user)
+        self.assertEqual(report.case_type, 'AD_HOC_INSPECTION')
+        self.assertEqual(report.assigned_to, self.user)
 
     def test_compliance_index_creation(self):
         """Test creating a compliance index"""
@@ -297,3 +300,1641 @@ class CoreModuleTestCase(TestCase):
         self.assertEqual(audit_log.user, self.user)
         self.assertEqual(audit_log.action, 'CREATE')
         self.assertEqual(audit_log.model_name, 'SMI')
+
+
+class EagerLoadingTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='officer', password='testpass123')
+        self.smis = [
+            SMI.objects.create(company_name=f'Company {i}', license_number=f'EL{i:03d}')
+            for i in range(20)
+        ]
+        for smi in self.smis:
+            BoardMember.objects.create(smi=smi, name='Jane Doe', position='Chair', appointment_date='2023-01-01')
+            LicensingBreach.objects.create(smi=smi, assigned_to=self.user)
+            Case.objects.create(smi=smi, assigned_to=self.user)
+
+    def test_lookups_follow_serializer_tree(self):
+        """Nested SMI and string-related users are select_related"""
+        from .mixins import get_eager_loading_lookups
+        from .serializers import LicensingBreachSerializer
+
+        select, prefetch = get_eager_loading_lookups(LicensingBreachSerializer)
+        self.assertEqual(set(select), {'assigned_to'})
+        self.assertEqual(prefetch, ())
+
+        select, prefetch = get_eager_loading_lookups(LicensingBreachSerializer, {'smi'})
+        self.assertEqual(set(select), {'smi', 'assigned_to'})
+
+    def test_list_query_count_is_constant(self):
+        """A list page costs the same number of queries for 1 row and 20 rows"""
+        from .management.commands.query_count_report import count_list_queries
+        from .views import BoardMemberViewSet, LicensingBreachViewSet
+        from apps.case_management_module.views import CaseViewSet
+
+        for viewset_class in (BoardMemberViewSet, LicensingBreachViewSet, CaseViewSet):
+            counts = count_list_queries(viewset_class, [1, 20])
+            self.assertEqual(counts[1], counts[20], viewset_class.__name__)
+
+
+class SMIDetailTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='Detail Co', license_number='DT001')
+        for i in range(5):
+            BoardMember.objects.create(smi=self.smi, name=f'Member {i}', position='Director',
+                                       appointment_date='2023-01-01')
+            LicensingBreach.objects.create(smi=self.smi)
+        self.url = f'/api/core/smis/{self.smi.id}/'
+
+    def test_children_do_not_embed_parent(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['board_members']), 5)
+        self.assertNotIn('smi', response.data['board_members'][0])
+        self.assertNotIn('next_links', response.data)
+
+    def test_query_count_does_not_grow_with_children(self):
+        with self.assertNumQueries(9):
+            self.client.get(self.url)
+        for i in range(20):
+            BoardMember.objects.create(smi=self.smi, name=f'Extra {i}', position='Director',
+                                       appointment_date='2023-01-01')
+        with self.assertNumQueries(9):
+            self.client.get(self.url)
+
+    def test_limited_collection_returns_next_link(self):
+        response = self.client.get(self.url, {'limit_board_members': 2})
+        self.assertEqual(len(response.data['board_members']), 2)
+        self.assertEqual(len(response.data['licensing_breaches']), 5)
+        next_link = response.data['next_links']['board_members']
+        self.assertIn('offset_board_members=2', next_link)
+
+        response = self.client.get(self.url, {'limit_board_members': 2, 'offset_board_members': 4})
+        self.assertEqual(len(response.data['board_members']), 1)
+        self.assertIsNone(response.data['next_links']['board_members'])
+
+
+class OffsiteProfileSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='Snapshot Co', license_number='SN001', status='PENDING')
+        self.url = f'/api/core/offsite-profiling/{self.smi.id}/'
+        self.payload = {
+            'companyId': str(self.smi.id),
+            'reportingPeriod': {'start': '2024-01-01', 'end': '2024-12-31'},
+            'boardMembers': [{'name': 'Jane Doe', 'position': 'Chair', 'appointmentDate': '2023-01-01'}],
+            'committees': [],
+            'products': [],
+            'clients': [],
+            'financialStatement': {'totalRevenue': '100.00', 'operatingCosts': '40.00', 'incomeItems': []},
+            'balanceSheet': {
+                'totalAssets': '500.00', 'totalLiabilities': '200.00', 'shareholdersFunds': '300.00',
+                'assets': [
+                    {'assetType': 'Cash', 'category': 'Cash', 'value': '120.00', 'isCurrent': True},
+                    {'assetType': 'Building', 'category': 'PPE', 'value': '380.00', 'isCurrent': False},
+                ],
+            },
+            'clientAssets': [],
+            'capitalPosition': {
+                'calculationDate': '2024-12-31', 'netCapital': '300.00', 'requiredCapital': '100.00',
+                'adjustedLiquidCapital': '250.00', 'isCompliant': True, 'capitalAdequacyRatio': 3.0,
+            },
+        }
+
+    def test_submission_rebuilds_snapshot(self):
+        from .models import OffsiteProfileSnapshot
+
+        response = self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        snapshot = OffsiteProfileSnapshot.objects.get(smi=self.smi)
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(snapshot.document['boardMembers'][0]['name'], 'Jane Doe')
+        self.assertEqual(snapshot.document['balanceSheet']['currentAssets'], 120.0)
+
+        self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.version, 2)
+
+    def test_retrieve_is_one_read_with_conditional_get(self):
+        self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['capitalPosition']['netCapital'], 300.0)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_retrieve_builds_missing_snapshot(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['boardMembers'], [])
+        self.assertEqual(self.client.get('/api/core/offsite-profiling/not-a-uuid/').status_code, 404)
+
+    def test_edits_outside_submissions_rebuild_snapshot(self):
+        self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+        etag = self.client.get(self.url)['ETag']
+        member = BoardMember.objects.get(smi=self.smi)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/core/board-members/{member.pk}/', {'name': 'Janet Doe'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['boardMembers'][0]['name'], 'Janet Doe')
+
+        # Deleting the balance sheet drops its lines from the document
+        statement = FinancialStatement.objects.get(smi=self.smi, statement_type='FINANCIAL_POSITION')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/core/financial-statements/{statement.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(self.url).data['balanceSheet']['currentAssets'], 0)
+
+    def test_admin_edits_rebuild_snapshot(self):
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+        etag = self.client.get(self.url)['ETag']
+        model_admin = admin.site._registry[BoardMember]
+        request = RequestFactory().post('/admin/')
+        member = BoardMember.objects.get(smi=self.smi)
+
+        member.name = 'Janet Doe'
+        with self.captureOnCommitCallbacks(execute=True):
+            model_admin.save_model(request, member, None, True)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['boardMembers'][0]['name'], 'Janet Doe')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            model_admin.delete_queryset(request, BoardMember.objects.filter(smi=self.smi))
+        self.assertEqual(self.client.get(self.url).data['boardMembers'], [])
+
+    def test_removing_rows_costs_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def resubmit(kept, total):
+            assets = [
+                {'assetType': f'Asset {i}', 'category': 'Cash', 'value': '1.00', 'isCurrent': True}
+                for i in range(total)
+            ]
+            self.payload['balanceSheet']['assets'] = assets
+            self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+            self.payload['balanceSheet']['assets'] = assets[:kept]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/core/offsite-profiling/', self.payload, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        # Half the rows removed: one DELETE whatever their number
+        self.assertEqual(resubmit(2, 4), resubmit(20, 40))
+        self.assertEqual(len(self.client.get(self.url).data['balanceSheet']['assets']), 20)
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+        from .models import OffsiteProfileSnapshot
+
+        call_command('rebuild_offsite_profiles', stdout=StringIO())
+        self.assertTrue(OffsiteProfileSnapshot.objects.filter(smi=self.smi).exists())
+
+
+class BulkSyncTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='Sync Co', license_number='SY001')
+        self.rows = [
+            {'name': f'Member {i}', 'position': 'Director', 'appointment_date': '2023-01-01'}
+            for i in range(50)
+        ]
+
+    def test_initial_sync_is_one_bulk_insert(self):
+        from .bulk_sync import sync_children
+
+        with self.assertNumQueries(2):
+            stats = sync_children(BoardMember, {'smi': self.smi}, self.rows, key_fields=('name', 'position'))
+        self.assertEqual(stats['created'], 50)
+        self.assertEqual(BoardMember.objects.filter(smi=self.smi).count(), 50)
+
+    def test_resubmission_only_writes_changes(self):
+        from .bulk_sync import sync_children
+
+        sync_children(BoardMember, {'smi': self.smi}, self.rows, key_fields=('name', 'position'))
+        original_ids = set(BoardMember.objects.values_list('id', flat=True))
+
+        rows = self.rows[1:] + [{'name': 'New Member', 'position': 'Director', 'appointment_date': '2024-01-01'}]
+        rows[0] = dict(rows[0], appointment_date='2020-06-30')
+        stats = sync_children(BoardMember, {'smi': self.smi}, rows, key_fields=('name', 'position'))
+
+        self.assertEqual(stats, {'created': 1, 'updated': 1, 'deleted': 1, 'unchanged': 48})
+        self.assertEqual(str(BoardMember.objects.get(name='Member 1').appointment_date), '2020-06-30')
+        self.assertFalse(BoardMember.objects.filter(name='Member 0').exists())
+        self.assertEqual(len(original_ids & set(BoardMember.objects.values_list('id', flat=True))), 49)
+
+    def test_unchanged_resubmission_writes_nothing(self):
+        from .bulk_sync import sync_children
+
+        sync_children(BoardMember, {'smi': self.smi}, self.rows, key_fields=('name', 'position'))
+        with self.assertNumQueries(1):
+            stats = sync_children(BoardMember, {'smi': self.smi}, self.rows, key_fields=('name', 'position'))
+        self.assertEqual(stats['unchanged'], 50)
+
+
+class DashboardAggregateTestCase(TestCase):
+    def setUp(self):
+        for i, status in enumerate(['ACTIVE', 'ACTIVE', 'SUSPENDED', 'PENDING']):
+            SMI.objects.create(company_name=f'Dash {i}', license_number=f'DA{i:03d}', status=status)
+
+    def test_buckets_evaluate_in_one_query(self):
+        from django.db.models import Q, Max
+        from .dashboards import DashboardAggregate, Distinct
+
+        buckets = DashboardAggregate(
+            total=None,
+            active=Q(status='ACTIVE'),
+            statuses=Distinct('status'),
+            last_name=Max('company_name'),
+        )
+        with self.assertNumQueries(1):
+            result = buckets.evaluate(SMI.objects.all())
+        self.assertEqual(result, {'total': 4, 'active': 2, 'statuses': 3, 'last_name': 'Dash 3'})
+
+    def test_smi_summary_endpoint(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/core/smis/summary/')
+        self.assertEqual(response.data, {'count': 4, 'active': 2, 'suspended': 1, 'total': 4})
+
+
+class FullTextSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='inspector', password='testpass123')
+        self.alpha = SMI.objects.create(company_name='Alpha Securities', license_number='FT001')
+        self.beta = SMI.objects.create(company_name='Beta Brokers', license_number='FT002')
+        MeetingLog.objects.create(
+            smi=self.alpha, meeting_date='2024-01-10', meeting_type='BOARD', attendees='Board',
+            agenda='Liquidity review', decisions='Approve capital injection', action_items='None',
+        )
+        MeetingLog.objects.create(
+            smi=self.beta, meeting_date='2024-02-10', meeting_type='RISK', attendees='Risk',
+            agenda='Cyber incident', decisions='Escalate to regulator', action_items='None',
+        )
+
+    def test_signals_keep_documents_current(self):
+        from .models import SearchDocument
+
+        document = SearchDocument.objects.get(model_label='core.smi', object_id=str(self.alpha.pk))
+        self.assertIn('Alpha Securities', document.content)
+
+        self.alpha.company_name = 'Alpha Capital'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alpha.save()
+        document.refresh_from_db()
+        self.assertIn('Alpha Capital', document.content)
+        # Meeting logs embed the SMI name and are refreshed with it
+        response = self.client.get('/api/core/meeting-logs/', {'search': 'alpha capital'})
+        self.assertEqual(len(response.data['results']), 1)
+
+        self.beta.delete()
+        self.assertFalse(SearchDocument.objects.filter(object_id=str(self.beta.pk)).exists())
+
+    def test_only_renames_reindex_dependents(self):
+        from unittest import mock
+        from .models import SearchDocument
+        from . import search
+
+        SystemAuditLog.objects.bulk_create([
+            SystemAuditLog(user=self.user, action='LOGIN', model_name='User', object_id=str(i)) for i in range(5)
+        ])
+        search.index_queryset(SystemAuditLog.objects.all())
+
+        # A password change leaves username alone: nothing is reindexed
+        self.user.set_password('changed')
+        with mock.patch.object(search, 'index_queryset') as index, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save()
+        self.assertEqual((callbacks, index.call_count), ([], 0))
+
+        self.user.username = 'chief-inspector'
+        with mock.patch.object(search, 'INDEX_BATCH_SIZE', 2), \
+                mock.patch.object(search, 'index_queryset', wraps=search.index_queryset) as index, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            self.assertEqual(index.call_count, 0)
+        self.assertEqual(index.call_count, 3)
+        self.assertEqual(
+            SearchDocument.objects.filter(model_label='core.systemauditlog', content__contains='chief-inspector').count(), 5
+        )
+
+    def test_search_matches_words_and_prefixes(self):
+        response = self.client.get('/api/core/meeting-logs/', {'search': 'capit inject'})
+        self.assertEqual([row['agenda'] for row in response.data['results']], ['Liquidity review'])
+
+        response = self.client.get('/api/core/smis/', {'search': 'brok'})
+        self.assertEqual([row['company_name'] for row in response.data['results']], ['Beta Brokers'])
+
+    def test_results_are_ranked_unless_ordering_given(self):
+        SMI.objects.create(company_name='Gamma Beta Beta Holdings', license_number='FT003')
+        response = self.client.get('/api/core/smis/', {'search': 'beta'})
+        self.assertEqual(response.data['results'][0]['company_name'], 'Gamma Beta Beta Holdings')
+
+        response = self.client.get('/api/core/smis/', {'search': 'beta', 'ordering': 'company_name'})
+        self.assertEqual(response.data['results'][0]['company_name'], 'Beta Brokers')
+
+    def test_every_match_is_returned_in_rank_order(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .search import index_queryset
+
+        SystemAuditLog.objects.bulk_create([
+            SystemAuditLog(action='UPDATE', model_name='Case', object_id=str(i), object_repr=f'Escalated case {i}')
+            for i in range(1200)
+        ])
+        best = SystemAuditLog.objects.create(
+            action='UPDATE', model_name='Case', object_id='best', object_repr='Escalated escalated escalated',
+        )
+        index_queryset(SystemAuditLog.objects.all())
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/core/audit-logs/', {'search': 'escalated', 'page_size': 100})
+        self.assertEqual(response.data['count'], 1201)
+        self.assertEqual(response.data['results'][0]['id'], best.pk)
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries).upper()
+        self.assertNotIn('CASE WHEN', sql)
+
+        last = self.client.get('/api/core/audit-logs/', {'search': 'escalated', 'page_size': 100, 'page': 13})
+        self.assertEqual(len(last.data['results']), 1)
+
+    def test_unregistered_models_fall_back_to_search_filter(self):
+        BoardMember.objects.create(smi=self.alpha, name='Jane Doe', position='Chair', appointment_date='2023-01-01')
+        response = self.client.get('/api/core/board-members/', {'search': 'ane Do'})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+        from .models import SearchDocument
+
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.filter(model_label='core.meetinglog').count(), 2)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        now = timezone.now()
+        # Pairs of rows share a timestamp so the id tie-breaker is exercised
+        SystemAuditLog.objects.bulk_create([
+            SystemAuditLog(action='CREATE', model_name='SMI', object_id=str(i), object_repr=f'Row {i}',
+                           timestamp=now - timedelta(minutes=i // 2))
+            for i in range(45)
+        ])
+        self.url = '/api/core/audit-logs/'
+
+    def walk(self, url, direction='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[direction]
+        return pages
+
+    def test_walks_every_row_once_in_key_order(self):
+        pages = self.walk(self.url)
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        ids = [pk for page in pages for pk in page]
+        expected = list(SystemAuditLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_page_size_parameter(self):
+        from .pagination import positive_int
+
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 7}).data['results']), 7)
+        # Invalid sizes fall back to the default, large ones are capped
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 0}).data['results']), 20)
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 'x'}).data['results']), 20)
+        self.assertEqual(positive_int('500', strict=True, cutoff=100), 100)
+        with self.assertRaises(ValueError):
+            positive_int('-1')
+
+    def test_previous_links_walk_back(self):
+        response = self.client.get(self.url)
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'])
+        back = self.walk(response.data['previous'], direction='previous')
+        forward = self.walk(self.url)
+        self.assertEqual(back, forward[:2][::-1])
+
+    def test_later_pages_do_not_count_or_offset(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data['next'])
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 404)
+
+    def test_search_results_keep_relevance_order(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        # Older rows are more relevant, so key order and rank order disagree
+        logs = [
+            SystemAuditLog.objects.create(action='UPDATE', model_name='Case', object_id=str(i),
+                                          object_repr=' '.join(['escalated'] * (5 - i)),
+                                          timestamp=timezone.now() - timedelta(days=10 - i))
+            for i in range(5)
+        ]
+        pages = self.walk(f'{self.url}?search=escalated&page_size=2')
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([pk for page in pages for pk in page], [log.pk for log in logs])
+
+        response = self.client.get(self.url, {'search': 'escalated', 'ordering': '-timestamp'})
+        self.assertEqual([row['id'] for row in response.data['results']], [log.pk for log in reversed(logs)])
+
+
+class StreamingExportTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='Export Co', license_number='EX001')
+        for i in range(30):
+            LicensingBreach.objects.create(smi=self.smi, description=f'Breach {i}')
+        self.url = '/api/core/licensing-breaches/'
+
+    def test_csv_export_streams_every_row_with_serializer_columns(self):
+        import csv
+        from .serializers import LicensingBreachSerializer
+
+        response = self.client.get(self.url, {'format': 'csv', 'expand': 'smi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="licensingbreach.csv"', response['Content-Disposition'])
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        readable = [name for name, field in LicensingBreachSerializer().fields.items() if not field.write_only]
+        self.assertEqual(rows[0], readable)
+        self.assertEqual(len(rows), 31)
+        # Nested serializers are written as JSON
+        smi_cell = json.loads(rows[1][readable.index('smi')])
+        self.assertEqual(smi_cell['company_name'], 'Export Co')
+
+    def test_ndjson_export_honours_filters(self):
+        response = self.client.get(self.url, {'format': 'ndjson', 'search': 'export', 'expand': 'smi'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 30)
+        self.assertEqual(json.loads(lines[0])['smi']['license_number'], 'EX001')
+
+    def test_json_list_is_unchanged(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 30)
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.smis = [
+            SMI.objects.create(company_name=f'Etag {i}', license_number=f'ET{i:03d}') for i in range(3)
+        ]
+        self.statement = FinancialStatement.objects.create(
+            smi=self.smis[0], period='2024-12-31', statement_type='FINANCIAL_POSITION'
+        )
+
+    def test_list_returns_304_without_serializing(self):
+        response = self.client.get('/api/core/smis/')
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/core/smis/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Any filter change is a different validator
+        response = self.client.get('/api/core/smis/', {'search': 'etag'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_validator_changes_on_update_and_delete(self):
+        etag = self.client.get('/api/core/smis/')['ETag']
+        self.smis[1].status = 'SUSPENDED'
+        self.smis[1].save()
+        response = self.client.get('/api/core/smis/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.smis[2].delete()
+        response = self.client.get('/api/core/smis/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # If-Modified-Since is not a list validator: the newest row's second can hide a delete
+        response = self.client.get('/api/core/smis/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_uses_row_updated_at(self):
+        url = f'/api/core/financial-statements/{self.statement.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.statement.total_assets = 1000
+        self.statement.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get('/api/core/financial-statements/999999/').status_code, 404)
+
+
+class SparseFieldsTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='Sparse Co', license_number='SP001')
+        MeetingLog.objects.create(
+            smi=self.smi, meeting_date='2024-03-01', meeting_type='BOARD', attendees='Board',
+            agenda='A long agenda', decisions='Several decisions', action_items='None'
+        )
+        self.url = '/api/core/meeting-logs/'
+
+    def test_relations_render_as_ids_unless_expanded(self):
+        row = self.client.get(self.url).data['results'][0]
+        self.assertEqual(str(row['smi']), str(self.smi.id))
+
+        row = self.client.get(self.url, {'expand': 'smi'}).data['results'][0]
+        self.assertEqual(row['smi']['company_name'], 'Sparse Co')
+
+    def test_fields_limits_output(self):
+        row = self.client.get(self.url, {'fields': 'id,meeting_date'}).data['results'][0]
+        self.assertEqual(set(row), {'id', 'meeting_date'})
+
+    def test_unrequested_text_columns_are_deferred(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url, {'fields': 'id,agenda'})
+        select = next(q['sql'] for q in ctx.captured_queries if 'FROM "core_meetinglog"' in q['sql']
+                      and 'COUNT' not in q['sql'] and 'MAX' not in q['sql'])
+        self.assertIn('"agenda"', select)
+        self.assertNotIn('"decisions"', select)
+
+    def test_case_description_deferred(self):
+        Case.objects.create(smi=self.smi, title='Deferred', description='x' * 1000)
+        response = self.client.get('/api/case-management/cases/', {'fields': 'id,title'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+
+
+class BatchRiskScoringTestCase(TestCase):
+    def setUp(self):
+        self.strong = SMI.objects.create(company_name='Strong', license_number='RS001')
+        self.weak = SMI.objects.create(company_name='Weak', license_number='RS002')
+        self.empty = SMI.objects.create(company_name='No statements', license_number='RS003')
+        # An older statement that must be ignored
+        FinancialStatement.objects.create(smi=self.strong, period='2023-12-31', profit_margin=0.01,
+                                          gross_margin=0.01, total_equity=1, total_assets=100)
+        FinancialStatement.objects.create(smi=self.strong, period='2024-12-31', profit_margin=0.9,
+                                          gross_margin=0.8, total_equity=300, total_assets=1000)
+        FinancialStatement.objects.create(smi=self.weak, period='2024-12-31', profit_margin=-0.2)
+
+    def test_scores_latest_statement_per_smi(self):
+        from .formula_models import CalculationBreakdown
+        from .risk_scoring import score_smis
+
+        self.assertEqual(score_smis(), 2)
+        strong = RiskAssessment.objects.get(smi=self.strong)
+        self.assertAlmostEqual(strong.fsi_score, 86.0)
+        self.assertAlmostEqual(strong.car, 30.0)
+        self.assertEqual(strong.risk_level, 'LOW')
+        self.assertAlmostEqual(strong.overall_risk_score, 78.0)
+        self.assertEqual(strong.status, 'COMPLETED')
+
+        weak = RiskAssessment.objects.get(smi=self.weak)
+        self.assertEqual((weak.fsi_score, weak.car, weak.risk_level), (0, 50, 'HIGH'))
+        self.assertFalse(RiskAssessment.objects.filter(smi=self.empty).exists())
+
+        breakdowns = CalculationBreakdown.objects.filter(reference_id=self.weak.id)
+        self.assertEqual(list(breakdowns.values_list('calculation_type', flat=True)), ['FSI_SCORE'])
+
+    def test_rerun_updates_in_place_with_constant_queries(self):
+        from .risk_scoring import score_smis, scoring_formulas
+
+        scoring_formulas()
+        # statement query, formula generation, savepoint, latest breakdowns, breakdown insert,
+        # latest upsert, assessment upsert, dirty markers, release
+        with self.assertNumQueries(9):
+            score_smis()
+        FinancialStatement.objects.filter(smi=self.weak).update(profit_margin=0.9, gross_margin=0.9,
+                                                                 total_equity=20, total_assets=100)
+        # ... plus checked_at of the unchanged breakdowns
+        with self.assertNumQueries(10):
+            score_smis()
+        self.assertEqual(RiskAssessment.objects.count(), 2)
+        self.assertEqual(RiskAssessment.objects.get(smi=self.weak).risk_level, 'LOW')
+
+
+class EagerCeleryTestCase(TestCase):
+    """Runs Celery tasks, groups and chords inline"""
+    def setUp(self):
+        from celery import current_app
+        self.celery_conf = current_app.conf
+        self.was_eager = self.celery_conf.task_always_eager
+        self.celery_conf.task_always_eager = True
+
+    def tearDown(self):
+        self.celery_conf.task_always_eager = self.was_eager
+
+
+class BatchFanOutTestCase(EagerCeleryTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            smi = SMI.objects.create(company_name=f'Fan-out {i}', license_number=f'FO{i:03d}')
+            FinancialStatement.objects.create(smi=smi, period='2024-12-31', profit_margin=0.5)
+
+    def test_run_records_chunk_progress(self):
+        from .models import BatchRun
+        from .tasks import calculate_risk_scores
+
+        run = BatchRun.objects.get(pk=calculate_risk_scores(chunk_size=2))
+        self.assertEqual((run.status, run.total_chunks, run.chunks_done), ('COMPLETED', 3, 3))
+        self.assertEqual(run.rows_processed, 5)
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(RiskAssessment.objects.count(), 5)
+
+    def test_retry_only_reruns_failed_chunks(self):
+        from unittest import mock
+        from .models import BatchRun
+        from . import tasks
+
+        failing = mock.Mock(side_effect=[2, RuntimeError('boom'), 1])
+        with mock.patch.dict(tasks.BATCH_JOBS, {'calculate_risk_scores': failing}):
+            run = BatchRun.objects.get(pk=tasks.calculate_risk_scores(chunk_size=2))
+            self.assertEqual((run.status, run.chunks_done, run.failures), ('FAILED', 2, 1))
+            self.assertEqual(run.chunks.get(status='FAILED').error, 'boom')
+
+            failing.side_effect = [2]
+            self.assertEqual(tasks.retry_failed_chunks(run.pk), 1)
+
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.chunks_done, run.failures, run.rows_processed), ('COMPLETED', 3, 0, 5))
+        self.assertEqual(failing.call_count, 4)
+        self.assertEqual(list(run.chunks.values_list('attempts', flat=True)), [1, 2, 1])
+
+
+class IncrementalRescoringTestCase(EagerCeleryTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            smi = SMI.objects.create(company_name=f'Dirty {i}', license_number=f'DS{i:03d}')
+            FinancialStatement.objects.create(smi=smi, period='2024-12-31', profit_margin=0.5)
+
+    def scored_smis(self, **kwargs):
+        from .models import BatchRun
+        from .tasks import calculate_risk_scores
+
+        run = BatchRun.objects.get(pk=calculate_risk_scores(**kwargs))
+        return {smi_id for chunk in run.chunks.all() for smi_id in chunk.smi_ids}
+
+    def test_only_changed_smis_are_rescored(self):
+        from django.utils import timezone
+        from .models import DirtySMI, ScoringWatermark
+
+        # No watermark yet: everything
+        self.assertEqual(len(self.scored_smis()), 5)
+        self.assertTrue(ScoringWatermark.objects.filter(task_name='calculate_risk_scores').exists())
+        # Scoring flagged the new assessments for the compliance task
+        self.assertEqual(DirtySMI.objects.filter(scope='COMPLIANCE').count(), 5)
+
+        # Nothing changed since; move the watermark past the overlap window
+        ScoringWatermark.objects.update(changed_through=timezone.now())
+        self.assertEqual(self.scored_smis(), set())
+
+        statement = FinancialStatement.objects.first()
+        statement.profit_margin = 0.1
+        statement.save()
+        self.assertEqual(self.scored_smis(), {str(statement.smi_id)})
+
+        # A full rebuild ignores the watermark
+        self.assertEqual(len(self.scored_smis(full=True)), 5)
+
+    def test_activating_a_formula_rescores_untouched_smis(self):
+        from rest_framework.test import APIClient
+        from django.utils import timezone
+        from .formula_models import CalculationFormula
+        from .models import ScoringWatermark
+
+        formula = CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='Flat', formula_expression="profit_score * 0 + 10",
+        )
+        self.assertEqual(len(self.scored_smis()), 5)
+        ScoringWatermark.objects.update(changed_through=timezone.now())
+        self.assertEqual(self.scored_smis(), set())
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(username='admin', password='x'))
+        response = client.post(f'/api/core/calculation-formulae/{formula.pk}/activate/')
+        self.assertEqual(response.status_code, 200)
+
+        # No statement changed, yet the whole cohort is rescored with the new formula
+        self.assertEqual(len(self.scored_smis()), 5)
+        self.assertEqual(set(RiskAssessment.objects.values_list('fsi_score', flat=True)), {10.0})
+
+        # Drafts and inactive copies leave the cohort alone
+        ScoringWatermark.objects.update(changed_through=timezone.now())
+        response = client.post(f'/api/core/calculation-formulae/{formula.pk}/duplicate/')
+        self.assertEqual(response.status_code, 201)
+        CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='Draft', formula_expression="profit_score", is_active=False,
+        )
+        self.assertEqual(self.scored_smis(), set())
+
+        # Deactivating the active one rescores with the default again
+        formula.is_active = False
+        formula.save()
+        self.assertEqual(len(self.scored_smis()), 5)
+
+    def test_failed_run_keeps_watermark(self):
+        from unittest import mock
+        from django.utils import timezone
+        from .models import ScoringWatermark
+        from . import tasks
+
+        self.scored_smis()
+        ScoringWatermark.objects.update(changed_through=timezone.now())
+        before = ScoringWatermark.objects.get().changed_through
+        FinancialStatement.objects.first().save()
+
+        with mock.patch.dict(tasks.BATCH_JOBS, {'calculate_risk_scores': mock.Mock(side_effect=RuntimeError)}):
+            self.assertEqual(len(self.scored_smis()), 1)
+        self.assertEqual(ScoringWatermark.objects.get().changed_through, before)
+        self.assertEqual(len(self.scored_smis()), 1)
+
+
+class NotificationMailerTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username=f'recipient{i}', email=f'user{i}@{domain}', password='x')
+            for i, domain in enumerate(['a.example', 'a.example', 'a.example', 'b.example'])
+        ]
+        for user in self.users:
+            Notification.objects.create(user=user, title=f'Hello {user.username}', message='Body')
+
+    def test_batch_is_sent_over_one_connection(self):
+        from django.core import mail
+        from unittest import mock
+        from . import mailer
+
+        opened = []
+        real_get_connection = mailer.get_connection
+
+        def get_connection(**kwargs):
+            opened.append(kwargs)
+            return real_get_connection(**kwargs)
+
+        with mock.patch.object(mailer, 'get_connection', get_connection):
+            # candidates, conditional claim UPDATE, claimed rows, bulk_update
+            with self.assertNumQueries(4):
+                self.assertEqual(mailer.send_batch(), (4, 4))
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(Notification.objects.filter(email_sent=True).count(), 4)
+        self.assertEqual(mailer.send_batch(), (0, 0))
+
+    def test_domain_rate_limit_postpones_excess(self):
+        from django.core import mail
+        from django.test import override_settings
+        from .tasks import send_pending_notifications
+
+        with override_settings(NOTIFICATION_DOMAIN_RATE_LIMITS={'a.example': 2}):
+            self.assertTrue(send_pending_notifications())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['user0@a.example', 'user1@a.example', 'user3@b.example'])
+        postponed = Notification.objects.get(email_sent=False)
+        self.assertEqual(postponed.email_attempts, 0)
+        self.assertIsNotNone(postponed.email_next_attempt_at)
+
+    def test_failures_back_off_exponentially(self):
+        from unittest import mock
+        from . import mailer
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=OSError('connection refused')):
+            self.assertEqual(mailer.send_batch(), (4, 0))
+        notification = Notification.objects.first()
+        self.assertEqual(notification.email_attempts, 1)
+        self.assertEqual(notification.email_last_error, 'connection refused')
+        # Not claimable again until the backoff has passed
+        self.assertEqual(mailer.send_batch(), (0, 0))
+        self.assertEqual(mailer.backoff_delay(1).total_seconds(), 60)
+        self.assertEqual(mailer.backoff_delay(4).total_seconds(), 480)
+
+    def test_rows_claimed_by_another_worker_are_skipped(self):
+        from django.core import mail
+        from django.utils import timezone
+        from . import mailer
+
+        first, second = Notification.objects.order_by('created_at', 'id')[:2]
+        Notification.objects.filter(pk=first.pk).update(email_claimed_by='other', email_claimed_at=timezone.now())
+        # Abandoned by a worker that died
+        Notification.objects.filter(pk=second.pk).update(
+            email_claimed_by='dead', email_claimed_at=timezone.now() - mailer.CLAIM_TIMEOUT
+        )
+
+        self.assertEqual(mailer.send_batch(), (3, 3))
+        self.assertNotIn(self.users[0].email, [m.to[0] for m in mail.outbox])
+        first.refresh_from_db()
+        self.assertEqual((first.email_sent, first.email_claimed_by), (False, 'other'))
+        self.assertFalse(Notification.objects.filter(email_sent=True).exclude(email_claimed_by='').exists())
+
+
+class ComplianceIndexUpsertTestCase(TestCase):
+    def setUp(self):
+        self.smis = [SMI.objects.create(company_name=f'CI {i}', license_number=f'CI{i:03d}') for i in range(3)]
+        RiskAssessment.objects.create(smi=self.smis[0], assessment_date='2024-01-01', risk_level='HIGH')
+        RiskAssessment.objects.create(smi=self.smis[0], assessment_date='2024-06-30', risk_level='LOW')
+        RiskAssessment.objects.create(smi=self.smis[1], assessment_date='2024-06-30', risk_level='HIGH')
+        Case.objects.create(smi=self.smis[0], case_type='AD_HOC_INSPECTION', status='OPEN', opened_date='2024-01-01')
+        Case.objects.create(smi=self.smis[0], case_type='AD_HOC_INSPECTION', status='RESOLVED', opened_date='2024-05-01')
+        Case.objects.create(smi=self.smis[1], case_type='AD_HOC_INSPECTION', status='OPEN', opened_date='2024-05-01')
+        # Not an inspection
+        Case.objects.create(smi=self.smis[1], case_type='COMPLAINT', status='RESOLVED', opened_date='2024-06-01')
+
+    def test_scores_from_latest_inputs(self):
+        from .compliance_scoring import update_compliance_indices_for
+
+        self.assertEqual(update_compliance_indices_for(), 2)
+        scores = dict(ComplianceIndex.objects.values_list('smi_id', 'final_compliance_score'))
+        self.assertEqual(scores, {self.smis[0].id: 100, self.smis[1].id: 40})
+
+    def test_rerun_upserts_with_constant_queries(self):
+        from . import formula_engine
+        from .compliance_scoring import update_compliance_indices_for
+
+        # Loaded once per process; afterwards only the formula generation is checked
+        formula_engine.active_formula('COMPLIANCE_SCORE')
+        # inputs, formula generation, upsert
+        with self.assertNumQueries(3):
+            update_compliance_indices_for()
+        for i in range(3, 13):
+            smi = SMI.objects.create(company_name=f'CI {i}', license_number=f'CI{i:03d}')
+            RiskAssessment.objects.create(smi=smi, assessment_date='2024-06-30', risk_level='MEDIUM')
+        with self.assertNumQueries(3):
+            self.assertEqual(update_compliance_indices_for(), 12)
+        self.assertEqual(ComplianceIndex.objects.count(), 12)
+
+
+class OverdueInspectionBreachTestCase(TestCase):
+    def setUp(self):
+        from apps.auth_module.models import UserProfile
+
+        self.officer = User.objects.create_user(username='smi-officer', password='x')
+        self.overdue = SMI.objects.create(company_name='Overdue Co', license_number='OD001')
+        self.unlinked = SMI.objects.create(company_name='Unlinked Co', license_number='OD002')
+        self.on_time = SMI.objects.create(company_name='On Time Co', license_number='OD003')
+        UserProfile.objects.create(user=self.officer, smi=self.overdue, role='COMPLIANCE_OFFICER')
+        for smi in (self.overdue, self.unlinked):
+            Case.objects.create(smi=smi, case_type='AD_HOC_INSPECTION', status='OPEN', due_date='2020-01-01')
+        Case.objects.create(smi=self.on_time, case_type='AD_HOC_INSPECTION', status='OPEN', due_date='2999-01-01')
+        Case.objects.create(smi=self.on_time, case_type='AD_HOC_INSPECTION', status='RESOLVED', due_date='2020-01-01')
+
+    def test_breaches_and_notifications_in_constant_queries(self):
+        from .breaches import check_licensing_breaches_for
+
+        self.assertEqual(check_licensing_breaches_for(), 2)
+        self.assertEqual(
+            set(LicensingBreach.objects.values_list('smi_id', flat=True)), {self.overdue.id, self.unlinked.id}
+        )
+        notification = Notification.objects.get()
+        self.assertEqual(notification.user, self.officer)
+        self.assertIn('Overdue Co', notification.message)
+
+        # Already recorded today: a single anti-join query and nothing else
+        with self.assertNumQueries(1):
+            self.assertEqual(check_licensing_breaches_for(), 0)
+        self.assertEqual(LicensingBreach.objects.count(), 2)
+
+    def test_new_breaches_are_searchable(self):
+        from .breaches import check_licensing_breaches_for
+        from .search import LikeSearchBackend
+
+        check_licensing_breaches_for()
+        self.assertEqual(LikeSearchBackend().ranked(LicensingBreach.objects.all(), ['overdue co']).count(), 1)
+
+
+class RiskReportArtifactTestCase(EagerCeleryTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.recovered = SMI.objects.create(company_name='Recovered', license_number='RR001')
+        self.risky = SMI.objects.create(company_name='Risky', license_number='RR002')
+        RiskAssessment.objects.create(smi=self.recovered, assessment_date='2024-01-01', risk_level='HIGH')
+        RiskAssessment.objects.create(smi=self.recovered, assessment_date='2024-06-30', risk_level='LOW')
+        RiskAssessment.objects.create(smi=self.risky, assessment_date='2024-06-30', risk_level='HIGH')
+
+    def test_report_counts_latest_assessment_only(self):
+        import zipfile
+        from .risk_report import get_or_build_report
+
+        artifact = get_or_build_report()
+        self.assertEqual(artifact.summary['risk_levels']['HIGH'], 1)
+        self.assertEqual(artifact.summary['risk_levels']['LOW'], 1)
+        with artifact.file.open('rb') as fh, zipfile.ZipFile(fh) as workbook:
+            sheets = [name for name in workbook.namelist() if name.startswith('xl/worksheets/sheet')]
+            self.assertEqual(len(sheets), 3)
+
+    def test_unchanged_data_reuses_artifact(self):
+        from django.utils import timezone
+        from .models import RiskReportArtifact
+        from .risk_report import get_or_build_report
+
+        first = get_or_build_report()
+        self.assertEqual(get_or_build_report().pk, first.pk)
+
+        RiskAssessment.objects.filter(smi=self.risky).update(risk_level='LOW', updated_at=timezone.now())
+        second = get_or_build_report()
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(second.summary['risk_levels']['LOW'], 2)
+        self.assertEqual(RiskReportArtifact.objects.count(), 2)
+
+    def test_current_endpoint_serves_cached_file(self):
+        from .models import RiskReportArtifact
+
+        response = self.client.get('/api/core/risk-reports/current/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(RiskReportArtifact.objects.count(), 1)
+
+        response = self.client.get('/api/core/risk-reports/current/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+        self.assertEqual(RiskReportArtifact.objects.count(), 1)
+
+    def test_current_endpoint_dispatches_one_build_per_data_version(self):
+        from unittest import mock
+        from django.utils import timezone
+        from . import task_locks
+        from .tasks import generate_risk_report
+
+        with mock.patch('apps.core.views.job_queue.dispatch') as dispatch:
+            for _ in range(3):
+                self.assertEqual(self.client.get('/api/core/risk-reports/current/').status_code, 202)
+            self.assertEqual(dispatch.call_count, 1)
+
+            # New data: a new build is due even while the old one is pending
+            RiskAssessment.objects.filter(smi=self.risky).update(risk_level='LOW', updated_at=timezone.now())
+            self.client.get('/api/core/risk-reports/current/')
+            self.assertEqual(dispatch.call_count, 2)
+
+        # The finished build releases its lease and is served from then on
+        generate_risk_report(**dispatch.call_args.kwargs)
+        self.assertIsNone(task_locks.holder(dispatch.call_args.kwargs['lease_name']))
+        self.assertEqual(self.client.get('/api/core/risk-reports/current/').status_code, 200)
+
+
+class TaskRunTelemetryTestCase(EagerCeleryTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            smi = SMI.objects.create(company_name=f'Telemetry {i}', license_number=f'TT{i:03d}')
+            FinancialStatement.objects.create(
+                smi=smi, period='2024-06-30', statement_type='QUARTERLY',
+                total_assets=1000, total_equity=200, profit_margin=0.5, gross_margin=0.5,
+            )
+
+    def test_successful_run_is_recorded(self):
+        from .models import TaskRun
+        from .tasks import calculate_risk_scores
+
+        calculate_risk_scores.delay(chunk_size=2)
+        runs = {run.task_name: run for run in TaskRun.objects.all()}
+        self.assertEqual(set(runs), {'calculate_risk_scores', 'run_batch_chunk', 'finish_batch_run'})
+        self.assertEqual(TaskRun.objects.filter(task_name='run_batch_chunk').count(), 2)
+
+        run = runs['calculate_risk_scores']
+        self.assertEqual(run.outcome, 'SUCCESS')
+        self.assertTrue(run.task_id)
+        self.assertGreater(run.query_count, 0)
+        self.assertGreater(run.rows_written, 0)
+        self.assertGreater(run.peak_rss_kb, 0)
+        self.assertGreaterEqual(run.finished_at, run.started_at)
+        chunk_reads = TaskRun.objects.filter(task_name='run_batch_chunk').values_list('rows_read', flat=True)
+        self.assertEqual(sorted(chunk_reads), [1, 2])
+
+    def test_failure_returning_false_is_recorded(self):
+        from unittest import mock
+        from .models import TaskRun
+        from .tasks import calculate_risk_scores
+
+        with mock.patch('apps.core.tasks.start_batch_run', side_effect=RuntimeError('broker down')):
+            self.assertFalse(calculate_risk_scores.delay().get())
+        run = TaskRun.objects.get()
+        self.assertEqual(run.outcome, 'FAILED')
+        self.assertIn('broker down', run.error)
+
+    def test_stats_endpoint_reports_percentiles(self):
+        from .models import TaskRun
+
+        for duration in range(1, 101):
+            TaskRun.objects.create(task_name='send_pending_notifications', duration_ms=duration, outcome='SUCCESS')
+        response = self.client.get('/api/core/task-runs/stats/?bucket=all')
+        self.assertEqual(response.status_code, 200)
+        [row] = response.json()['results']
+        self.assertEqual(row['runs'], 100)
+        self.assertAlmostEqual(row['p50_ms'], 50.5)
+        self.assertAlmostEqual(row['p95_ms'], 95.0, places=0)
+
+        response = self.client.get('/api/core/task-runs/?task_name=send_pending_notifications')
+        self.assertEqual(response.json()['count'], 100)
+        self.assertEqual(self.client.get('/api/core/task-runs/stats/?bucket=week').status_code, 400)
+
+
+class DatabaseJobQueueTestCase(TestCase):
+    def test_worker_runs_queued_task(self):
+        from . import job_queue
+        from .models import QueuedJob, TaskRun
+
+        job = job_queue.enqueue('apps.core.tasks.send_pending_notifications')
+        self.assertEqual(job_queue.work(burst=True, poll_interval=0), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        self.assertIs(job.result, True)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(TaskRun.objects.get().task_id, f'job-{job.pk}')
+        self.assertFalse(QueuedJob.objects.exclude(status='DONE').exists())
+
+    def test_claimed_job_is_not_claimed_again(self):
+        from . import job_queue
+
+        first = job_queue.enqueue('math.sqrt', [4])
+        second = job_queue.enqueue('math.sqrt', [9])
+        self.assertEqual([job.pk for job in job_queue.claim('worker-a')], [first.pk])
+        self.assertEqual([job.pk for job in job_queue.claim('worker-b')], [second.pk])
+        self.assertEqual(job_queue.claim('worker-c'), [])
+
+    def test_failed_job_is_retried_then_failed(self):
+        from django.utils import timezone
+        from . import job_queue
+        from .models import QueuedJob
+
+        job = job_queue.enqueue('math.sqrt', ['not a number'], max_attempts=2)
+        [claimed] = job_queue.claim('worker')
+        self.assertEqual(job_queue.run_job(claimed), 'QUEUED')
+        job.refresh_from_db()
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(job_queue.claim('worker'), [])
+
+        QueuedJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        [claimed] = job_queue.claim('worker')
+        self.assertEqual(job_queue.run_job(claimed), 'FAILED')
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('must be real number', job.error)
+
+    def test_taken_back_job_does_not_finish_twice(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import job_queue
+        from .models import QueuedJob
+
+        callback = job_queue.enqueue_chord([('math.sqrt', [4]), ('math.sqrt', [9])], ('math.sqrt', [16]))
+        [slow] = job_queue.claim('worker-a')
+        # Still alive: the heartbeat keeps requeue_stale() away
+        QueuedJob.objects.filter(pk=slow.pk).update(locked_at=timezone.now() - timedelta(hours=2))
+        self.assertTrue(job_queue.heartbeat(slow))
+        self.assertEqual(job_queue.requeue_stale(), 0)
+
+        # Silent past the timeout: taken back and run by another worker
+        QueuedJob.objects.filter(pk=slow.pk).update(locked_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(job_queue.requeue_stale(), 1)
+        self.assertFalse(job_queue.heartbeat(slow))
+        [again] = [job for job in job_queue.claim('worker-b', limit=2) if job.pk == slow.pk]
+
+        # The first worker's late outcome is discarded and releases no chord part
+        self.assertEqual(job_queue.run_job(slow), 'RUNNING')
+        callback.refresh_from_db()
+        self.assertEqual((callback.status, callback.pending_parts), ('WAITING', 2))
+        self.assertEqual(job_queue.run_job(again), 'DONE')
+        callback.refresh_from_db()
+        self.assertEqual((callback.status, callback.pending_parts), ('WAITING', 1))
+
+    def test_chunked_run_completes_through_queue(self):
+        from django.test import override_settings
+        from . import job_queue
+        from .models import BatchRun
+        from .tasks import calculate_risk_scores
+
+        for i in range(3):
+            smi = SMI.objects.create(company_name=f'Queued {i}', license_number=f'JQ{i:03d}')
+            FinancialStatement.objects.create(
+                smi=smi, period='2024-06-30', statement_type='QUARTERLY',
+                total_assets=1000, total_equity=200, profit_margin=0.5, gross_margin=0.5,
+            )
+        with override_settings(TASK_QUEUE_BACKEND='database'):
+            job_queue.dispatch(calculate_risk_scores, chunk_size=2)
+            job_queue.work(burst=True, poll_interval=0)
+
+        run = BatchRun.objects.get()
+        self.assertEqual(run.status, 'COMPLETED')
+        self.assertEqual(run.chunks_done, 2)
+        self.assertEqual(RiskAssessment.objects.count(), 3)
+
+    def test_scheduler_enqueues_due_beat_entries_once(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import job_queue
+        from .models import QueuedJob, ScheduleEntry
+
+        enqueued, _ = job_queue.schedule_due()
+        self.assertEqual(enqueued, [])
+        ScheduleEntry.objects.filter(name='send-notifications').update(
+            last_run_at=timezone.now() - timedelta(minutes=10)
+        )
+        enqueued, _ = job_queue.schedule_due()
+        self.assertEqual(enqueued, ['send-notifications'])
+        self.assertEqual(job_queue.schedule_due()[0], [])
+        self.assertEqual(
+            list(QueuedJob.objects.values_list('task_name', flat=True)),
+            ['apps.core.tasks.send_pending_notifications'],
+        )
+
+
+class SingleFlightLeaseTestCase(TestCase):
+    def setUp(self):
+        for i in range(3):
+            smi = SMI.objects.create(company_name=f'Lease {i}', license_number=f'SF{i:03d}')
+            FinancialStatement.objects.create(
+                smi=smi, period='2024-06-30', statement_type='QUARTERLY',
+                total_assets=1000, total_equity=200, profit_margin=0.5, gross_margin=0.5,
+            )
+
+    def test_overlapping_run_is_skipped_until_lease_released(self):
+        from django.test import override_settings
+        from . import job_queue
+        from .models import BatchRun, TaskLease, TaskRun
+        from .tasks import calculate_risk_scores
+
+        with override_settings(TASK_QUEUE_BACKEND='database'):
+            first = calculate_risk_scores(chunk_size=2)
+            self.assertIsNotNone(first)
+            # Chunks still queued: the next hourly run must not start another copy
+            self.assertIsNone(calculate_risk_scores(chunk_size=2))
+            skipped = TaskRun.objects.get(outcome='SKIPPED')
+            self.assertIn(BatchRun.objects.get(pk=first).lease_owner, skipped.error)
+            self.assertTrue(TaskLease.objects.get(task_name='calculate_risk_scores').is_active)
+
+            job_queue.work(burst=True, poll_interval=0)
+            self.assertFalse(TaskLease.objects.get(task_name='calculate_risk_scores').is_active)
+            self.assertIsNotNone(calculate_risk_scores(full=True))
+        self.assertEqual(BatchRun.objects.count(), 2)
+
+    def test_heartbeat_extends_and_expiry_frees_lease(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import task_locks
+        from .models import TaskLease
+
+        self.assertTrue(task_locks.acquire('nightly', 'a'))
+        self.assertFalse(task_locks.acquire('nightly', 'b'))
+        TaskLease.objects.update(expires_at=timezone.now() + timedelta(seconds=5))
+        self.assertTrue(task_locks.renew('nightly', 'a'))
+        self.assertGreater(TaskLease.objects.get().expires_at, timezone.now() + timedelta(seconds=60))
+
+        # Holder died: once the lease expires another worker takes over
+        TaskLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(task_locks.acquire('nightly', 'b'))
+        self.assertFalse(task_locks.renew('nightly', 'a'))
+        self.assertFalse(task_locks.release('nightly', 'a'))
+        self.assertEqual(task_locks.holder('nightly')['owner'], 'b')
+
+    def test_chunk_without_lease_is_not_run(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.test import override_settings
+        from django.utils import timezone
+        from .batch_runs import execute_chunk, plan_batch_run
+        from .models import TaskLease
+        from . import task_locks
+
+        self.assertTrue(task_locks.acquire('calculate_risk_scores', 'a'))
+        run = plan_batch_run('calculate_risk_scores', SMI.objects.all(), chunk_size=3, lease_owner='a')
+        chunk = run.chunks.select_related('run').get()
+
+        # Renewed between sub-batches of a long chunk
+        job = mock.Mock(return_value=1)
+        with override_settings(BATCH_LEASE_BATCH_SIZE=1), \
+                mock.patch.object(task_locks, 'renew', wraps=task_locks.renew) as renew:
+            self.assertEqual(execute_chunk(chunk, job), 'DONE')
+        self.assertEqual((job.call_count, renew.call_count, chunk.rows_processed), (3, 3, 3))
+
+        # Sat in the queue past the TTL and the next run took over
+        TaskLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(task_locks.acquire('calculate_risk_scores', 'b'))
+        job.reset_mock()
+        self.assertEqual(execute_chunk(chunk, job), 'FAILED')
+        job.assert_not_called()
+        self.assertIn('no longer holds its lease', chunk.error)
+
+    def test_cache_backend(self):
+        from django.core.cache import cache
+        from django.test import override_settings
+        from . import task_locks
+
+        with override_settings(TASK_LOCK_BACKEND='cache'):
+            self.addCleanup(cache.clear)
+            self.assertTrue(task_locks.acquire('nightly', 'a'))
+            self.assertFalse(task_locks.acquire('nightly', 'b'))
+            self.assertTrue(task_locks.renew('nightly', 'a'))
+            self.assertFalse(task_locks.release('nightly', 'b'))
+            self.assertTrue(task_locks.release('nightly', 'a'))
+            self.assertIsNone(task_locks.holder('nightly'))
+            self.assertTrue(task_locks.acquire('nightly', 'b'))
+
+
+class FormulaEngineTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='Formula Co', license_number='FE001')
+        FinancialStatement.objects.create(
+            smi=self.smi, period='2024-06-30', statement_type='QUARTERLY',
+            total_assets=1000, total_equity=200, profit_margin=0.5, gross_margin=0.25,
+        )
+
+    def test_rejects_anything_outside_the_whitelist(self):
+        from .formula_engine import FormulaError, compile_expression
+
+        for expression in ["__import__('os')", "().__class__", "[x for x in y]", "open('f')",
+                           "profit_score.real", "weights", "weights['missing']", "car"]:
+            with self.assertRaises(FormulaError, msg=expression):
+                compile_expression(expression, allowed_variables=('profit_score',))
+
+    def test_strings_only_as_comparison_operands(self):
+        import numpy as np
+        from .formula_engine import FormulaError, compile_expression
+
+        variables = ('risk_level', 'profit_score')
+        for expression in ["'a' * (((True+True)**(True+True+True+True+True))**(True+True))",
+                           "'a' + 'b'", "-'a'", "risk_level * 3", "where(profit_score > 0, risk_level, 'LOW')",
+                           "profit_score ** 1000"]:
+            with self.assertRaises(FormulaError, msg=expression):
+                compile_expression(expression, allowed_variables=variables)
+
+        compiled = compile_expression("(risk_level == 'LOW') * 10 + (True + True) ** profit_score",
+                                      allowed_variables=variables)
+        values = compiled.evaluate_cohort(2, risk_level=np.array(['LOW', 'HIGH'], dtype=object),
+                                          profit_score=np.array([1.0, 1e6]))
+        # Exponents are clipped at run time as well
+        self.assertEqual(values.tolist(), [12.0, 2.0 ** 100])
+
+    def test_vectorized_conditionals(self):
+        import numpy as np
+        from .formula_engine import compile_expression
+
+        compiled = compile_expression(
+            "x / y if x > 0 and y != 0 else weights['fallback']", weights={'fallback': -1},
+        )
+        values = compiled.evaluate_cohort(3, x=np.array([1.0, 0.0, 2.0]), y=np.array([2.0, 1.0, 0.0]))
+        self.assertEqual(values.tolist(), [0.5, -1.0, -1.0])
+
+    def test_compiled_once_per_version(self):
+        from . import formula_engine
+        from .formula_models import CalculationFormula
+
+        formula = CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='FSI', formula_expression="profit_score",
+        )
+        first = formula_engine.compile_formula(formula)
+        self.assertIs(formula_engine.compile_formula(formula), first)
+        formula.formula_expression, formula.version = "margin_score", 2
+        self.assertIsNot(formula_engine.compile_formula(formula), first)
+
+    def test_active_formula_drives_risk_scoring(self):
+        from .formula_models import CalculationBreakdown, CalculationFormula
+        from .risk_scoring import score_smis
+
+        score_smis()
+        # Default formula: 0.6 * 50 + 0.4 * 25
+        self.assertAlmostEqual(RiskAssessment.objects.get().fsi_score, 40.0)
+
+        formula = CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='Profit only',
+            formula_expression="weights['profit_margin'] * profit_score",
+            weights={'profit_margin': 1.0}, thresholds={'LOW': 40, 'MEDIUM': 20},
+        )
+        score_smis()
+        assessment = RiskAssessment.objects.get()
+        self.assertAlmostEqual(assessment.fsi_score, 50.0)
+        self.assertEqual(assessment.risk_level, 'LOW')
+        self.assertTrue(CalculationBreakdown.objects.filter(formula=formula, calculation_type='FSI_SCORE').exists())
+
+    def test_serializer_rejects_invalid_expression(self):
+        from .formula_serializers import CalculationFormulaSerializer
+
+        serializer = CalculationFormulaSerializer(data={
+            'formula_type': 'CAR', 'name': 'CAR', 'formula_expression': "total_equity / unknown",
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('formula_expression', serializer.errors)
+
+
+class FormulaEvaluationTestCase(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='analyst', password='x'))
+        self.smis = []
+        for i, profit_margin in enumerate([0.9, 0.6, 0.3, 0.1]):
+            smi = SMI.objects.create(company_name=f'Cohort {i}', license_number=f'FV{i:03d}')
+            FinancialStatement.objects.create(
+                smi=smi, period='2024-06-30', statement_type='QUARTERLY',
+                total_assets=1000, total_equity=100, profit_margin=profit_margin, gross_margin=0,
+            )
+            self.smis.append(smi)
+
+    def evaluate(self, payload):
+        return self.client.post('/api/core/calculation-formulae/evaluate/', payload, format='json')
+
+    def test_draft_formula_over_cohort(self):
+        from .formula_models import CalculationBreakdown
+
+        response = self.evaluate({
+            'formula_type': 'FSI_SCORE', 'formula_expression': "profit_score",
+            'thresholds': {'LOW': 80, 'MEDIUM': 50},
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['distribution']['count'], 4)
+        self.assertEqual(data['distribution']['min'], 10.0)
+        self.assertEqual(data['distribution']['max'], 90.0)
+        self.assertEqual(data['distribution']['median'], 45.0)
+        self.assertEqual(data['level_counts'], {'LOW': 1, 'MEDIUM': 1, 'HIGH': 2})
+        values = {row['smi_id']: (row['value'], row['level']) for row in data['values']}
+        self.assertEqual(values[str(self.smis[1].pk)], (60.0, 'MEDIUM'))
+        # Nothing is written
+        self.assertFalse(RiskAssessment.objects.exists())
+        self.assertFalse(CalculationBreakdown.objects.exists())
+
+    def test_saved_formula_with_edits_and_smi_filter(self):
+        from .formula_models import CalculationFormula
+
+        formula = CalculationFormula.objects.create(
+            formula_type='CAR', name='CAR', formula_expression="total_equity / total_assets * 100",
+        )
+        response = self.evaluate({'formula': str(formula.pk), 'smi_ids': [str(self.smis[0].pk)]})
+        self.assertEqual(response.json()['values'], [{'smi_id': str(self.smis[0].pk), 'value': 10.0, 'level': 'MEDIUM'}])
+
+        response = self.evaluate({'formula': str(formula.pk), 'formula_expression': "total_equity / total_assets * 200"})
+        self.assertEqual(response.json()['level_counts'], {'LOW': 4, 'MEDIUM': 0, 'HIGH': 0})
+
+    def test_rejects_invalid_draft(self):
+        response = self.evaluate({'formula_type': 'FSI_SCORE', 'formula_expression': "profit_score +"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('formula_expression', response.json())
+
+        response = self.evaluate({'formula_type': 'CREDIT_RISK', 'formula_expression': "1"})
+        self.assertEqual(response.status_code, 400)
+
+
+class WhatIfGridTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='supervisor', password='x'))
+        self.smis = []
+        for i, (profit_margin, equity) in enumerate([(0.9, 200), (0.75, 160), (0.2, 50)]):
+            smi = SMI.objects.create(company_name=f'What-if {i}', license_number=f'WI{i:03d}')
+            FinancialStatement.objects.create(
+                smi=smi, period='2024-06-30', statement_type='QUARTERLY',
+                total_assets=1000, total_equity=equity, profit_margin=profit_margin, gross_margin=0.9,
+            )
+            self.smis.append(smi)
+
+    def what_if(self, payload):
+        return self.client.post('/api/core/calculation-formulae/what_if/', payload, format='json')
+
+    def test_grid_matches_scoring_of_shocked_inputs(self):
+        from .risk_scoring import score_inputs
+        import numpy as np
+
+        response = self.what_if({'grid': {'profit_margin': [-0.2, 0], 'total_equity': [-0.5]}})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['cached'])
+        self.assertEqual([s['shocks'] for s in data['scenarios']], [
+            {'profit_margin': -0.2, 'total_equity': -0.5}, {'profit_margin': 0.0, 'total_equity': -0.5},
+        ])
+        scores = score_inputs(
+            np.array([0.72]), np.array([0.9]), np.array([100.0]), np.array([1000.0]),
+        )
+        cell = data['scenarios'][0]['per_smi'][str(self.smis[0].pk)]
+        self.assertAlmostEqual(cell['fsi'], scores['fsi'][0])
+        self.assertAlmostEqual(cell['car'], 10.0)
+        self.assertEqual(cell['risk_level'], scores['risk_level'][0])
+        # Halving equity moves the two LOW SMIs down a level
+        self.assertEqual(data['baseline']['risk_levels'], {'LOW': 2, 'MEDIUM': 0, 'HIGH': 1})
+        self.assertEqual(data['scenarios'][1]['worsened'], 2)
+        self.assertLess(data['scenarios'][1]['car']['mean_change'], 0)
+
+    def test_chunking_does_not_change_results(self):
+        from .risk_scoring import latest_statements, scoring_formulas
+        from .what_if import evaluate_grid
+
+        rows = latest_statements(SMI.objects.all())
+        grid = {'profit_margin': [-0.5, -0.25, 0, 0.25], 'total_assets': [0, 0.5, 1]}
+        whole = evaluate_grid(rows, grid, scoring_formulas())
+        chunked = evaluate_grid(rows, grid, scoring_formulas(), chunk_cells=4)
+        self.assertEqual(len(whole['scenarios']), 12)
+        self.assertEqual(whole, chunked)
+
+    def test_cached_until_formula_or_inputs_change(self):
+        from .formula_models import CalculationFormula
+
+        payload = {'grid': {'profit_margin': [-0.2]}}
+        first = self.what_if(payload).json()
+        self.assertTrue(self.what_if(payload).json()['cached'])
+
+        CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='Profit only', formula_expression="profit_score",
+        )
+        changed = self.what_if(payload).json()
+        self.assertFalse(changed['cached'])
+        self.assertNotEqual(changed['baseline']['fsi'], first['baseline']['fsi'])
+        self.assertTrue(self.what_if(payload).json()['cached'])
+
+        FinancialStatement.objects.filter(smi=self.smis[2]).get().save()
+        self.assertFalse(self.what_if(payload).json()['cached'])
+
+    def test_formula_edit_without_version_bump_is_not_served_from_cache(self):
+        from .formula_models import CalculationFormula
+
+        payload = {'grid': {'total_equity': [-0.1]}}
+        formula = CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='Profit only', formula_expression="profit_score",
+        )
+        first = self.what_if(payload).json()
+        self.assertTrue(self.what_if(payload).json()['cached'])
+
+        formula.formula_expression = "margin_score"
+        formula.save()
+        self.assertEqual(formula.version, 1)
+        changed = self.what_if(payload).json()
+        self.assertFalse(changed['cached'])
+        self.assertNotEqual(changed['baseline']['fsi'], first['baseline']['fsi'])
+
+    def test_rejects_unknown_inputs_and_oversized_grids(self):
+        self.assertEqual(self.what_if({'grid': {'revenue': [0.1]}}).status_code, 400)
+        self.assertEqual(self.what_if({'grid': {'profit_margin': [-2]}}).status_code, 400)
+        big = {name: [0.0] * 11 for name in ('profit_margin', 'gross_margin', 'total_equity', 'total_assets')}
+        self.assertEqual(self.what_if({'grid': big}).status_code, 400)
+
+
+class BreakdownRetentionTestCase(TestCase):
+    def setUp(self):
+        self.smi = SMI.objects.create(company_name='History Co', license_number='BR001')
+        self.statement = FinancialStatement.objects.create(
+            smi=self.smi, period='2024-06-30', statement_type='QUARTERLY',
+            total_assets=1000, total_equity=200, profit_margin=0.5, gross_margin=0.25,
+        )
+
+    def test_unchanged_breakdowns_are_not_inserted_again(self):
+        from .formula_models import CalculationBreakdown, LatestCalculationBreakdown
+        from .risk_scoring import score_smis
+
+        score_smis()
+        first_checked = LatestCalculationBreakdown.objects.get(calculation_type='FSI_SCORE').checked_at
+        score_smis()
+        self.assertEqual(CalculationBreakdown.objects.count(), 2)
+        self.assertGreater(LatestCalculationBreakdown.objects.get(calculation_type='FSI_SCORE').checked_at, first_checked)
+
+        FinancialStatement.objects.filter(pk=self.statement.pk).update(profit_margin=0.8)
+        score_smis()
+        # Only FSI changed
+        self.assertEqual(CalculationBreakdown.objects.filter(calculation_type='FSI_SCORE').count(), 2)
+        self.assertEqual(CalculationBreakdown.objects.filter(calculation_type='CAR').count(), 1)
+        latest = LatestCalculationBreakdown.objects.get(calculation_type='FSI_SCORE').breakdown
+        self.assertEqual(float(latest.final_value), 0.6 * 80 + 0.4 * 25)
+
+    def test_by_reference_reads_the_latest_pointer(self):
+        from rest_framework.test import APIClient
+        from .breakdown_store import latest_breakdown
+        from .risk_scoring import score_smis
+
+        score_smis()
+        FinancialStatement.objects.filter(pk=self.statement.pk).update(profit_margin=0.8)
+        score_smis()
+        with self.assertNumQueries(1):
+            breakdown = latest_breakdown(self.smi.pk, 'FSI_SCORE')
+        self.assertEqual(float(breakdown.final_value), 58.0)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='reader', password='x'))
+        response = client.get('/api/core/calculation-breakdowns/by_reference/',
+                              {'reference_id': str(self.smi.pk), 'type': 'FSI_SCORE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], str(breakdown.pk))
+
+    def test_compaction_rolls_old_history_into_daily_summaries(self):
+        from datetime import datetime, time, timedelta
+        from decimal import Decimal
+        from django.utils import timezone
+        from .breakdown_store import compact_breakdowns, record_breakdowns
+        from .formula_models import CalculationBreakdown, CalculationBreakdownDailySummary
+
+        old = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=120), time(12)))
+
+        def record(value, at):
+            record_breakdowns([CalculationBreakdown(
+                calculation_type='FSI_SCORE', reference_id=self.smi.pk, final_value=Decimal(value), calculated_at=at,
+            )], checked_at=at)
+
+        for hour, value in enumerate(['40', '60', '50']):
+            record(value, old + timedelta(minutes=hour))
+        self.assertEqual(compact_breakdowns(), 2)
+        summary = CalculationBreakdownDailySummary.objects.get()
+        self.assertEqual((summary.samples, summary.min_value, summary.max_value), (2, Decimal('40'), Decimal('60')))
+        self.assertEqual(summary.average_value, Decimal('50'))
+        # The latest breakdown stays, whatever its age
+        self.assertEqual(CalculationBreakdown.objects.get().final_value, Decimal('50'))
+
+        # Once superseded it is added to its day's summary
+        record('70', timezone.now())
+        self.assertEqual(compact_breakdowns(), 1)
+        summary.refresh_from_db()
+        self.assertEqual((summary.samples, summary.total_value), (3, Decimal('150')))
+        self.assertEqual(CalculationBreakdown.objects.get().final_value, Decimal('70'))
+
+
+class FormulaCacheInvalidationTestCase(TestCase):
+    """Each FormulaCache stands for the cache of one gunicorn or Celery process"""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .formula_models import CalculationFormula
+
+        self.admin = User.objects.create_superuser(username='formula-admin', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.formula = CalculationFormula.objects.create(
+            formula_type='FSI_SCORE', name='FSI', formula_expression="profit_score",
+        )
+
+    def test_processes_agree_on_the_active_version_after_duplicate_and_activate(self):
+        from .formula_engine import FormulaCache
+
+        web, worker = FormulaCache(), FormulaCache()
+        for cache in (web, worker):
+            self.assertEqual(cache.active_formulas(['FSI_SCORE'])['FSI_SCORE'][0], self.formula)
+        # While nothing changes a use costs one query
+        with self.assertNumQueries(1):
+            worker.active_formulas(['FSI_SCORE'])
+
+        response = self.client.post(f'/api/core/calculation-formulae/{self.formula.pk}/duplicate/')
+        self.assertEqual(response.status_code, 201)
+        copy_id = response.json()['formula']['id']
+        response = self.client.post(f'/api/core/calculation-formulae/{copy_id}/activate/')
+        self.assertEqual(response.status_code, 200)
+
+        for cache in (web, worker):
+            formula, _ = cache.active_formulas(['FSI_SCORE'])['FSI_SCORE']
+            self.assertEqual((str(formula.pk), formula.version), (copy_id, 2))
+
+    def test_edit_without_version_change_is_recompiled(self):
+        import numpy as np
+        from .formula_engine import FormulaCache
+
+        worker = FormulaCache()
+        compiled = worker.active_formulas(['FSI_SCORE'])['FSI_SCORE'][1]
+        self.assertEqual(compiled(profit_score=np.array([50.0])).tolist(), [50.0])
+
+        # As saved by the admin, which keeps the version
+        self.formula.formula_expression = "profit_score / 2"
+        self.formula.save()
+        compiled = worker.active_formulas(['FSI_SCORE'])['FSI_SCORE'][1]
+        self.assertEqual(compiled(profit_score=np.array([50.0])).tolist(), [25.0])
+
+    def test_rolled_back_change_never_reuses_a_stamp(self):
+        from django.db import transaction
+        from . import generations
+        from .formula_engine import GENERATION
+
+        before = generations.current(GENERATION)
+        with transaction.atomic():
+            self.formula.save()
+            rolled_back = generations.current(GENERATION)
+            transaction.set_rollback(True)
+        self.assertEqual(generations.current(GENERATION), before)
+        self.formula.save()
+        self.assertNotIn(generations.current(GENERATION), (before, rolled_back))
@@ -4,7 +4,8 @@ from .views import (
     SMIViewSet, BoardMemberViewSet, MeetingLogViewSet, ProductOfferingViewSet,
     ClienteleProfileViewSet, FinancialStatementViewSet, ClientAssetMixViewSet,
     LicensingBreachViewSet, SupervisoryInterventionViewSet,
-    NotificationViewSet, SystemAuditLogViewSet, OffsiteProfilingViewSet
+    NotificationViewSet, SystemAuditLogViewSet, OffsiteProfilingViewSet, RiskReportArtifactViewSet,
+    TaskRunViewSet
 )
 from .formula_views import CalculationFormulaViewSet, CalculationBreakdownViewSet
 
@@ -23,6 +24,8 @@ router.register(r'supervisory-interventions', SupervisoryInterventionViewSet)
 router.register(r'notifications', NotificationViewSet)
 router.register(r'audit-logs', SystemAuditLogViewSet)
 router.register(r'offsite-profiling', OffsiteProfilingViewSet, basename='offsite-profiling')
+router.register(r'risk-reports', RiskReportArtifactViewSet)
+router.register(r'task-runs', TaskRunViewSet)
 
 # Formula management endpoints
 router.register(r'calculation-formulae', CalculationFormulaViewSet, basename='calculation-formula')
@@ -1,23 +1,30 @@
-from rest_framework import viewsets, permissions, status, filters
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Max
+from django.utils.http import parse_etags
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Max, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth import authenticate
+from django.http import FileResponse
 import logging
+import uuid
 
 from .models import (
     SMI, BoardMember, MeetingLog, ProductOffering, ClienteleProfile,
     FinancialStatement, ClientAssetMix, LicensingBreach, SupervisoryIntervention,
-    Notification, SystemAuditLog
+    Notification, SystemAuditLog, OffsiteProfileSnapshot, RiskReportArtifact, TaskRun
 )
+from .offsite_profile import rebuild_offsite_profile_snapshot
 from .serializers import (
     SMISerializer, BoardMemberSerializer, MeetingLogSerializer, ProductOfferingSerializer,
     ClienteleProfileSerializer, FinancialStatementSerializer, ClientAssetMixSerializer,
     LicensingBreachSerializer, SupervisoryInterventionSerializer,
     NotificationSerializer, SystemAuditLogSerializer, SMIDetailSerializer,
-    SMIDashboardSerializer, OffsiteProfilingSerializer
+    SMIDashboardSerializer, OffsiteProfilingSerializer, RiskReportArtifactSerializer,
+    TaskRunSerializer
 )
 from apps.auth_module.permissions import (
     IsAdminUser, IsPrincipalOfficer, IsAccountant, IsComplianceOfficer,
@@ -26,19 +33,38 @@ from apps.auth_module.permissions import (
 
 logger = logging.getLogger(__name__)
 
-from .mixins import AuditLogMixin
+from .mixins import (
+    AuditLogMixin, ConditionalGetMixin, EagerLoadingMixin, OffsiteProfileMixin, StreamingExportMixin, eager_load
+)
+from .dashboards import DashboardAggregate
+from .search import FullTextSearchFilter, RankedOrderingFilter
+from .pagination import KeysetPagination, positive_int
+from . import job_queue, risk_report, task_locks, telemetry
+from .tasks import generate_risk_report
 
-class SMIViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class SMIViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, AuditLogMixin, viewsets.ModelViewSet):
     """
     ViewSet for SMI (Supervised Market Intermediary) management
     """
     queryset = SMI.objects.all()
     serializer_class = SMISerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter]
     search_fields = ['company_name', 'license_number', 'email', 'phone']
     ordering_fields = ['company_name', 'registration_date', 'created_at']
     ordering = ['company_name']
+    max_collection_limit = 1000
+    # Detail embeds child collections that don't touch SMI.updated_at
+    conditional_retrieve = False
+    summary_buckets = DashboardAggregate(
+        count=None,
+        active=Q(status='ACTIVE'),
+        suspended=Q(status='SUSPENDED'),
+    )
+    financial_buckets = DashboardAggregate(
+        total_assets=Max('total_assets'),
+        total_revenue=Max('total_revenue'),
+    )
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -50,6 +76,53 @@ class SMIViewSet(AuditLogMixin, viewsets.ModelViewSet):
     def get_permissions(self):
         return [permissions.AllowAny()]
 
+    def optimize_queryset(self, queryset):
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(*self.get_collection_prefetches())
+        return super().optimize_queryset(queryset)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['collection_limits'] = self.get_collection_limits()
+        return context
+
+    def get_collection_limits(self):
+        """Parse ?limit_<collection>= and ?offset_<collection>= for the detail view"""
+        limits = {}
+        params = self.request.query_params
+        for name in SMIDetailSerializer.collections:
+            try:
+                limit = positive_int(params[f'limit_{name}'], strict=True,
+                                      cutoff=self.max_collection_limit)
+            except (KeyError, ValueError):
+                continue
+            try:
+                offset = positive_int(params.get(f'offset_{name}', 0))
+            except ValueError:
+                offset = 0
+            limits[name] = (limit, offset)
+        return limits
+
+    def get_collection_prefetches(self):
+        """One prefetch query per detail collection, sliced when a limit is requested"""
+        limits = self.get_collection_limits()
+        fields = SMIDetailSerializer().fields
+        prefetches = []
+        for name in SMIDetailSerializer.collections:
+            child = fields[name].child
+            ordering = ('-created_at', 'pk')
+            queryset = eager_load(child.Meta.model.objects.order_by(*ordering), type(child))
+            if name in limits:
+                limit, offset = limits[name]
+                # Slice per parent with a window; one extra row tells the
+                # serializer whether there is a next page
+                queryset = queryset.annotate(
+                    collection_row=Window(RowNumber(), partition_by=F('smi_id'), order_by=ordering)
+                ).filter(collection_row__gt=offset, collection_row__lte=offset + limit + 1)
+            prefetches.append(Prefetch(name, queryset=queryset))
+        return prefetches
+
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get SMI dashboard data with summary information"""
@@ -77,91 +150,87 @@ class SMIViewSet(AuditLogMixin, viewsets.ModelViewSet):
         data = {
             'smi': SMISerializer(smi).data,
             'financial_statements': FinancialStatementSerializer(financial_statements, many=True).data,
-            'total_assets': financial_statements.aggregate(Max('total_assets'))['total_assets__max'],
-            'total_revenue': financial_statements.aggregate(Max('total_revenue'))['total_revenue__max'],
+            **self.financial_buckets.evaluate(financial_statements),
         }
         return Response(data)
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get summary statistics for all SMIs"""
-        total_smis = SMI.objects.count()
-        active_smis = SMI.objects.filter(status='ACTIVE').count()
-        suspended_smis = SMI.objects.filter(status='SUSPENDED').count()
-        
-        data = {
-            'count': total_smis,
-            'active': active_smis,
-            'suspended': suspended_smis,
-            'total': total_smis
-        }
+        data = self.summary_buckets.evaluate(SMI.objects.all())
+        data['total'] = data['count']
         return Response(data)
 
-class BoardMemberViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class BoardMemberViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, OffsiteProfileMixin, AuditLogMixin,
+                          viewsets.ModelViewSet):
     queryset = BoardMember.objects.all()
     serializer_class = BoardMemberSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'position', 'smi__company_name']
 
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class MeetingLogViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class MeetingLogViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, AuditLogMixin, viewsets.ModelViewSet):
     queryset = MeetingLog.objects.all()
     serializer_class = MeetingLogSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['smi__company_name', 'agenda', 'decisions']
 
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class ProductOfferingViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class ProductOfferingViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, OffsiteProfileMixin, AuditLogMixin,
+                              viewsets.ModelViewSet):
     queryset = ProductOffering.objects.all()
     serializer_class = ProductOfferingSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['product_name', 'smi__company_name']
 
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class ClienteleProfileViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class ClienteleProfileViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, OffsiteProfileMixin, AuditLogMixin,
+                               viewsets.ModelViewSet):
     queryset = ClienteleProfile.objects.all()
     serializer_class = ClienteleProfileSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['smi__company_name']
 
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class FinancialStatementViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class FinancialStatementViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, OffsiteProfileMixin, AuditLogMixin,
+                                 viewsets.ModelViewSet):
     queryset = FinancialStatement.objects.all()
     serializer_class = FinancialStatementSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['smi__company_name']
 
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class ClientAssetMixViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class ClientAssetMixViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, OffsiteProfileMixin, AuditLogMixin,
+                             viewsets.ModelViewSet):
     queryset = ClientAssetMix.objects.all()
     serializer_class = ClientAssetMixSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['smi__company_name']
 
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class LicensingBreachViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class LicensingBreachViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, AuditLogMixin, viewsets.ModelViewSet):
     queryset = LicensingBreach.objects.all()
     serializer_class = LicensingBreachSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter]
     search_fields = ['smi__company_name', 'assigned_to__username', 'description']
     ordering_fields = ['breach_date', 'created_at']
     ordering = ['-breach_date']
@@ -169,11 +238,11 @@ class LicensingBreachViewSet(AuditLogMixin, viewsets.ModelViewSet):
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class SupervisoryInterventionViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class SupervisoryInterventionViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, AuditLogMixin, viewsets.ModelViewSet):
     queryset = SupervisoryIntervention.objects.all()
     serializer_class = SupervisoryInterventionSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter]
     search_fields = ['smi__company_name', 'reason', 'description']
     ordering_fields = ['intervention_date', 'created_at']
     ordering = ['-intervention_date']
@@ -181,21 +250,24 @@ class SupervisoryInterventionViewSet(AuditLogMixin, viewsets.ModelViewSet):
     def get_permissions(self):
         return [permissions.AllowAny()]
 
-class NotificationViewSet(AuditLogMixin, viewsets.ModelViewSet):
+class NotificationViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, AuditLogMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter]
     search_fields = ['title', 'message']
     ordering_fields = ['created_at', 'priority']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Notification.objects.none()
+        queryset = super().get_queryset()
         if self.request.user.is_anonymous:
-            return Notification.objects.all()
-        return Notification.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -210,17 +282,86 @@ class NotificationViewSet(AuditLogMixin, viewsets.ModelViewSet):
         self.get_queryset().update(read=True, read_at=timezone.now())
         return Response({'status': 'all marked as read'})
 
-class SystemAuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class SystemAuditLogViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ReadOnlyModelViewSet):
     """
     ReadOnly viewset for audit logs - we don't audit the audit logs themselves
     """
     queryset = SystemAuditLog.objects.all()
     serializer_class = SystemAuditLogSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter]
     search_fields = ['action', 'model_name', 'object_repr', 'user__username']
     ordering_fields = ['timestamp']
     ordering = ['-timestamp']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
+
+class RiskReportArtifactViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Generated industry risk reports. current serves today's report from
+    storage, or queues its generation when the data has changed since
+    (once per report date and data version, see risk_report.build_lease).
+    """
+    queryset = RiskReportArtifact.objects.all()
+    serializer_class = RiskReportArtifactSerializer
+    permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+
+    @staticmethod
+    def file_response(artifact):
+        return FileResponse(
+            artifact.file.open('rb'), as_attachment=True, filename=artifact.file.name.rsplit('/', 1)[-1],
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        return self.file_response(self.get_object())
+
+    @action(detail=False, methods=['get'])
+    def current(self, request):
+        report_date = timezone.now().date()
+        version = risk_report.data_version()
+        artifact = risk_report.current_artifact(report_date, version)
+        if artifact is not None:
+            return self.file_response(artifact)
+
+        lease, owner = risk_report.build_lease(report_date, version), uuid.uuid4().hex
+        if task_locks.acquire(lease, owner):
+            job_queue.dispatch(generate_risk_report, lease_name=lease, lease_owner=owner)
+        return Response({'status': 'generating'}, status=status.HTTP_202_ACCEPTED)
+
+class TaskRunViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Telemetry of Celery task executions, filterable by ?task_name= and
+    ?outcome=. stats returns p50/p95 duration per task over time.
+    """
+    queryset = TaskRun.objects.all()
+    serializer_class = TaskRunSerializer
+    permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for param in ('task_name', 'outcome'):
+            value = self.request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """?days= (default 7) and ?bucket=day|hour|all (default day)"""
+        try:
+            days = positive_int(request.query_params.get('days', 7), strict=True)
+        except ValueError:
+            return Response({'error': 'days must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in telemetry.BUCKETS and bucket != 'all':
+            return Response({'error': 'bucket must be day, hour or all'}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = telemetry.duration_percentiles(
+            self.get_queryset(), days=days, bucket=None if bucket == 'all' else bucket
+        )
+        return Response({'days': days, 'bucket': bucket, 'results': stats})
 
 class OffsiteProfilingViewSet(viewsets.ViewSet):
     """
@@ -299,206 +440,26 @@ class OffsiteProfilingViewSet(viewsets.ViewSet):
 
     def retrieve(self, request, pk=None):
         """
-        Retrieve aggregated profile data for an SMI (pk=smi_id)
+        Retrieve aggregated profile data for an SMI (pk=smi_id).
+
+        Served from the materialized snapshot; the ETag carries the snapshot
+        version so clients can revalidate with If-None-Match.
         """
-        smi_id = pk
         try:
-            smi = SMI.objects.get(id=smi_id)
-        except SMI.DoesNotExist:
-            return Response({'error': 'SMI not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        # 1. Board Members
-        board_members = BoardMember.objects.filter(smi=smi).values(
-            'name', 'position', 'appointment_date'
-        )
-        # Rename keys to match frontend expectation
-        bm_data = [
-            {
-                'name': bm['name'],
-                'position': bm['position'],
-                'appointmentDate': bm['appointment_date']
-            } for bm in board_members
-        ]
-
-        # 2. Committees (assuming Committee model exists and is linked)
-        # The serializer uses Committee model, need to import it if not already imported in views
-        from .models import Committee
-        committees = Committee.objects.filter(smi=smi)
-        comm_data = [
-            {
-                'name': c.name,
-                'purpose': c.purpose,
-                'chairperson': c.chairperson,
-                'members': c.members,
-                'meetingsHeld': c.meetings_held,
-                'meetingFrequency': c.meeting_frequency
-            } for c in committees
-        ]
-
-        # 3. Products
-        products = ProductOffering.objects.filter(smi=smi)
-        prod_data = [
-            {
-                'productName': p.product_name,
-                'productType': p.product_category,
-                'concentrationPercentage': p.income_contribution 
-            } for p in products
-        ]
-
-        # 4. Clients
-        clients = ClienteleProfile.objects.filter(smi=smi)
-        client_data = [
-            {
-                'clientType': c.client_type,
-                'concentrationPercentage': c.income_contribution
-            } for c in clients
-        ]
-
-        # 5. Financial Statements (Income & Position)
-        # Get latest ones or list? Frontend form implies single period editing usually.
-        # Let's try to find the most recent ones.
-        
-        # Income Statement
-        income_stmt = FinancialStatement.objects.filter(
-            smi=smi, statement_type='COMPREHENSIVE_INCOME'
-        ).order_by('-period').first()
-
-        fs_data = {
-            'periodStart': '', # Not stored in model directly? Model has 'period' (end date).
-            'periodEnd': income_stmt.period if income_stmt else '',
-            'totalRevenue': income_stmt.total_revenue if income_stmt else 0,
-            'operatingCosts': income_stmt.total_expenses if income_stmt else 0,
-            'profitBeforeTax': income_stmt.profit_before_tax if income_stmt else 0,
-            'grossMargin': income_stmt.gross_margin if income_stmt else 0,
-            'profitMargin': income_stmt.profit_margin if income_stmt else 0,
-            'incomeItems': []
-        }
-        if income_stmt:
-            from .models import IncomeItem
-            income_items = IncomeItem.objects.filter(financial_statement=income_stmt)
-            fs_data['incomeItems'] = [
-                {
-                    'category': i.category,
-                    'description': i.description,
-                    'amount': i.amount,
-                    'isCore': i.is_core
-                } for i in income_items
-            ]
-
-        # Balance Sheet
-        pos_stmt = FinancialStatement.objects.filter(
-            smi=smi, statement_type='FINANCIAL_POSITION'
-        ).order_by('-period').first()
-
-        bs_data = {
-            'periodEnd': pos_stmt.period if pos_stmt else '',
-            'totalAssets': pos_stmt.total_assets if pos_stmt else 0,
-            'totalLiabilities': pos_stmt.total_liabilities if pos_stmt else 0,
-            'shareholdersFunds': pos_stmt.total_equity if pos_stmt else 0,
-            'currentAssets': 0, # Calculated fields need logic or storage?
-            'currentLiabilities': 0,
-            'assets': [],
-            'liabilities': [],
-            'debtors': [],
-            'creditors': [],
-            'relatedParties': []
-        }
-
-        if pos_stmt:
-            from .models import Asset, Liability, Debtor, Creditor, RelatedParty
-            
-            assets = Asset.objects.filter(financial_statement=pos_stmt)
-            bs_data['assets'] = [
-                {
-                    'assetType': a.asset_type,
-                    'category': a.category,
-                    'value': a.value,
-                    'isCurrent': a.is_current,
-                    'acquisitionDate': a.acquisition_date
-                } for a in assets
-            ]
-            # Calculate current assets
-            bs_data['currentAssets'] = sum(a.value for a in assets if a.is_current)
-
-            liabilities = Liability.objects.filter(financial_statement=pos_stmt)
-            bs_data['liabilities'] = [
-                {
-                    'liabilityType': a.liability_type,
-                    'category': a.category,
-                    'value': a.value,
-                    'isCurrent': a.is_current,
-                    'dueDate': a.due_date
-                } for a in liabilities
-            ]
-            # Calculate current liabilities
-            bs_data['currentLiabilities'] = sum(a.value for a in liabilities if a.is_current)
-
-            debtors = Debtor.objects.filter(financial_statement=pos_stmt)
-            bs_data['debtors'] = [
-                {
-                    'name': d.name,
-                    'amount': d.amount,
-                    'ageDays': d.age_days
-                } for d in debtors
-            ]
-
-            creditors = Creditor.objects.filter(financial_statement=pos_stmt)
-            bs_data['creditors'] = [
-                {
-                    'name': c.name,
-                    'amount': c.amount,
-                    'dueDate': c.due_date
-                } for c in creditors
-            ]
-
-            related = RelatedParty.objects.filter(financial_statement=pos_stmt)
-            bs_data['relatedParties'] = [
-                {
-                    'name': r.name,
-                    'relationship': r.relationship,
-                    'balance': r.balance,
-                    'type': r.transaction_type
-                } for r in related
-            ]
-
-        # 6. Client Assets (ClientAssetMix)
-        client_assets = ClientAssetMix.objects.filter(smi=smi).order_by('-period')
-        # Maybe filter by latest period? Assuming all belong to same submission for now
-        ca_data = [
-            {
-                'assetType': ca.asset_class,
-                'concentrationPercentage': ca.allocation_percentage,
-                'value': ca.market_value
-            } for ca in client_assets
-        ]
-
-        # 7. Capital Position
-        from .models import CapitalPosition
-        cap_pos = CapitalPosition.objects.filter(smi=smi).order_by('-calculation_date').first()
-        cp_data = {
-            'calculationDate': cap_pos.calculation_date if cap_pos else '',
-            'netCapital': cap_pos.net_capital if cap_pos else 0,
-            'requiredCapital': cap_pos.required_capital if cap_pos else 0,
-            'adjustedLiquidCapital': cap_pos.adjusted_liquid_capital if cap_pos else 0,
-            'isCompliant': cap_pos.is_compliant if cap_pos else False,
-            'capitalAdequacyRatio': cap_pos.capital_adequacy_ratio if cap_pos else 0
-        }
-
-        response_data = {
-            'companyId': str(smi.id),
-            'reportingPeriod': {
-                'start': fs_data['periodStart'] or '', # Fallback
-                'end': fs_data['periodEnd'] or bs_data['periodEnd'] or ''
-            },
-            'boardMembers': bm_data,
-            'committees': comm_data,
-            'products': prod_data,
-            'clients': client_data,
-            'financialStatement': fs_data,
-            'balanceSheet': bs_data,
-            'clientAssets': ca_data,
-            'capitalPosition': cp_data,
-            'supportingDocuments': [] # File handling is complex, skip for now
-        }
-
-        return Response(response_data)
+            snapshot = OffsiteProfileSnapshot.objects.filter(smi_id=pk).first()
+        except (ValueError, DjangoValidationError):
+            snapshot = None
+        if snapshot is None:
+            # SMIs submitted before snapshots existed are built on first read
+            try:
+                smi = SMI.objects.get(id=pk)
+            except (SMI.DoesNotExist, ValueError, DjangoValidationError):
+                return Response({'error': 'SMI not found'}, status=status.HTTP_404_NOT_FOUND)
+            snapshot = rebuild_offsite_profile_snapshot(smi)
+
+        if snapshot.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(snapshot.document)
+        response['ETag'] = snapshot.etag
+        return response
@@ -0,0 +1,181 @@
+"""
+What-if grids for the risk formulas.
+
+run_what_if() answers "how would FSI and CAR move if profit margins fell 20%
+or equity dropped by 30%?" for a cohort. The grid maps scoring inputs to
+lists of relative shocks; every combination is a scenario:
+
+    {'profit_margin': [-0.2, -0.1], 'total_equity': [-0.3, 0]}
+        -> 4 scenarios, each multiplying the inputs by (1 + shock)
+
+The latest statement of each SMI is loaded once. Each input is broadcast to a
+(scenarios, SMIs) array and the active FSI_SCORE, CAR and COMPOSITE_RISK
+formulas score every cell with risk_scoring.score_inputs(). Scenarios are
+scored in chunks of at most CHUNK_CELLS cells, so memory stays bounded
+however large the grid is. Each scenario is summarised (means and their
+change from the unshocked baseline, SMIs per risk level, SMIs whose level
+worsened or improved); per-SMI results are included for grids of up to
+DETAIL_CELLS cells.
+
+Results are cached under a key made of the request, the active formulas
+(id, version and updated_at), the formula generation stamp (see
+apps.core.generations) and a watermark of the cohort's scoring inputs, so
+editing a formula, even without bumping its version, or a statement never
+serves a stale grid.
+"""
+import hashlib
+import itertools
+import json
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from . import formula_engine, generations, risk_scoring
+from .models import DirtySMI, FinancialStatement
+
+SHOCKABLE_INPUTS = ('profit_margin', 'gross_margin', 'total_equity', 'total_assets')
+MAX_SCENARIOS = 10000
+CHUNK_CELLS = 250000  # scenario x SMI cells scored at once
+DETAIL_CELLS = 10000
+CACHE_KEY = 'what-if:{}'
+CACHE_TIMEOUT = 3600
+
+RISK_LEVELS = ('LOW', 'MEDIUM', 'HIGH')
+SCORES = ('fsi', 'car', 'overall')
+
+
+def scenarios(grid):
+    """Every combination of the grid's shocks, as {input: shock} dicts"""
+    inputs = sorted(grid)
+    return [dict(zip(inputs, shocks)) for shocks in itertools.product(*(grid[name] for name in inputs))]
+
+
+def data_watermark(smis):
+    """Hash identifying the current state of the cohort's scoring inputs"""
+    cohort = smis.aggregate(count=Count('pk'), last=Max('updated_at'))
+    statements = FinancialStatement.objects.filter(smi__in=smis).aggregate(count=Count('pk'), last=Max('updated_at'))
+    changed = DirtySMI.objects.filter(smi__in=smis, scope='RISK').aggregate(last=Max('changed_at'))
+    key = repr((cohort['count'], cohort['last'], statements['count'], statements['last'], changed['last']))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def formula_versions(formulas):
+    """{formula_type: [id, version, updated_at]} of the formulas in use, None for a default"""
+    return {
+        formula_type: [str(formula.pk), formula.version, formula.updated_at.isoformat()] if formula is not None else None
+        for formula_type, (formula, _) in sorted(formulas.items())
+    }
+
+
+def cache_key(grid, cohort, versions, watermark, stamp=''):
+    payload = json.dumps([grid, cohort, versions, watermark, stamp], sort_keys=True, default=str)
+    return CACHE_KEY.format(hashlib.sha256(payload.encode('utf-8')).hexdigest())
+
+
+def _level_rank(risk_level):
+    return np.select([risk_level == level for level in RISK_LEVELS], range(len(RISK_LEVELS)), len(RISK_LEVELS))
+
+
+def _round(values):
+    return np.round(values, 4).tolist()
+
+
+def _summaries(scores, baseline, count):
+    """Per-scenario summaries of a scored (scenarios, SMIs) block"""
+    summary = {}
+    for name in SCORES:
+        if count:
+            means = scores[name].mean(axis=1)
+            changes = (scores[name] - baseline[name]).mean(axis=1)
+        else:
+            means = changes = np.full(scores[name].shape[0], np.nan)
+        summary[name] = (_round(means), _round(changes))
+    levels = {level: (scores['risk_level'] == level).sum(axis=1).tolist() for level in RISK_LEVELS}
+    rank, base_rank = _level_rank(scores['risk_level']), _level_rank(baseline['risk_level'])
+    worsened = (rank > base_rank).sum(axis=1).tolist()
+    improved = (rank < base_rank).sum(axis=1).tolist()
+
+    rows = []
+    for i in range(scores['fsi'].shape[0]):
+        row = {
+            name: {
+                'mean': None if np.isnan(summary[name][0][i]) else summary[name][0][i],
+                'mean_change': None if np.isnan(summary[name][1][i]) else summary[name][1][i],
+            }
+            for name in SCORES
+        }
+        row['risk_levels'] = {level: levels[level][i] for level in RISK_LEVELS}
+        row['worsened'] = worsened[i]
+        row['improved'] = improved[i]
+        rows.append(row)
+    return rows
+
+
+def _cell_rows(scores, i):
+    """[{fsi, car, overall, risk_level}] per SMI of scenario row ``i``"""
+    values = [_round(scores[name][i]) for name in SCORES]
+    return [
+        {'fsi': fsi, 'car': car, 'overall': overall, 'risk_level': str(level)}
+        for fsi, car, overall, level in zip(*values, scores['risk_level'][i].tolist())
+    ]
+
+
+def evaluate_grid(rows, grid, formulas, chunk_cells=CHUNK_CELLS, detail_cells=DETAIL_CELLS):
+    """Score the scenarios of ``grid`` over the rows returned by latest_statements()"""
+    # In the order of risk_scoring.input_arrays()
+    inputs = {
+        name: values[np.newaxis, :] for name, values in zip(SHOCKABLE_INPUTS, risk_scoring.input_arrays(rows))
+    }
+    count = len(rows)
+
+    def score(block):
+        shocked = {
+            name: inputs[name] * (1 + np.array([[scenario.get(name, 0.0)] for scenario in block]))
+            for name in SHOCKABLE_INPUTS
+        }
+        return risk_scoring.score_inputs(*(shocked[name] for name in SHOCKABLE_INPUTS), formulas=formulas)
+
+    baseline = score([{}])
+    grid_scenarios = scenarios(grid)
+    detail = len(grid_scenarios) * count <= detail_cells
+    smi_ids = [str(row[0]) for row in rows]
+    result = {
+        'smis': count,
+        'baseline': _summaries(baseline, baseline, count)[0],
+        'scenarios': [],
+    }
+    if detail:
+        result['baseline']['per_smi'] = dict(zip(smi_ids, _cell_rows(baseline, 0)))
+
+    chunk = max(1, chunk_cells // max(count, 1))
+    for start in range(0, len(grid_scenarios), chunk):
+        block = grid_scenarios[start:start + chunk]
+        scores = score(block)
+        for i, (scenario, summary) in enumerate(zip(block, _summaries(scores, baseline, count))):
+            summary['shocks'] = scenario
+            if detail:
+                summary['per_smi'] = dict(zip(smi_ids, _cell_rows(scores, i)))
+            result['scenarios'].append(summary)
+    return result
+
+
+def run_what_if(grid, smis, cohort=None):
+    """
+    What-if grid over ``smis``, from the cache when neither the formulas nor
+    the inputs changed. ``cohort`` describes the SMI filter for the cache key.
+    """
+    # Read before the formulas, so a change racing this request moves the key
+    stamp = generations.current(formula_engine.GENERATION)
+    formulas = risk_scoring.scoring_formulas()
+    versions = formula_versions(formulas)
+    watermark = data_watermark(smis)
+    key = cache_key(grid, cohort, versions, watermark, stamp)
+    result = cache.get(key)
+    if result is not None:
+        return {**result, 'cached': True}
+
+    result = evaluate_grid(risk_scoring.latest_statements(smis), grid, formulas)
+    result.update(formulas=versions, watermark=watermark)
+    cache.set(key, result, timeout=CACHE_TIMEOUT)
+    return {**result, 'cached': False}
@@ -3,7 +3,7 @@ from .models import (
     LicensingPortalIntegration, PortalSMIData, InstitutionalProfile,
     Shareholder, Director, LicenseHistory
 )
-from apps.core.serializers import SMISerializer
+from apps.core.serializers import DynamicFieldsMixin, SMISerializer
 
 class LicensingPortalIntegrationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,7 +11,7 @@ class LicensingPortalIntegrationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class PortalSMIDataSerializer(serializers.ModelSerializer):
+class PortalSMIDataSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -20,7 +20,7 @@ class PortalSMIDataSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'last_updated_from_portal', 'created_at', 'updated_at']
 
-class InstitutionalProfileSerializer(serializers.ModelSerializer):
+class InstitutionalProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -29,7 +29,7 @@ class InstitutionalProfileSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class ShareholderSerializer(serializers.ModelSerializer):
+class ShareholderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -38,7 +38,7 @@ class ShareholderSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class DirectorSerializer(serializers.ModelSerializer):
+class DirectorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -47,7 +47,7 @@ class DirectorSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class LicenseHistorySerializer(serializers.ModelSerializer):
+class LicenseHistorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
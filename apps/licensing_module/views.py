@@ -19,11 +19,12 @@ from .serializers import (
     PortalDataUpdateSerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
 from apps.auth_module.models import UserProfile
 
 logger = logging.getLogger(__name__)
 
-class LicensingPortalIntegrationViewSet(viewsets.ModelViewSet):
+class LicensingPortalIntegrationViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for licensing portal integration management"""
     queryset = LicensingPortalIntegration.objects.all()
     serializer_class = LicensingPortalIntegrationSerializer
@@ -88,7 +89,7 @@ class LicensingPortalIntegrationViewSet(viewsets.ModelViewSet):
             logger.error(f"Sync error: {e}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class PortalSMIDataViewSet(viewsets.ModelViewSet):
+class PortalSMIDataViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for portal SMI data management"""
     queryset = PortalSMIData.objects.all()
     serializer_class = PortalSMIDataSerializer
@@ -136,7 +137,7 @@ class PortalSMIDataViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class InstitutionalProfileViewSet(viewsets.ModelViewSet):
+class InstitutionalProfileViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for institutional profile management"""
     queryset = InstitutionalProfile.objects.all()
     serializer_class = InstitutionalProfileSerializer
@@ -165,7 +166,7 @@ class InstitutionalProfileViewSet(viewsets.ModelViewSet):
         # TESTING MODE: bypass role checks and update institutional profile
         serializer.save()
 
-class ShareholderViewSet(viewsets.ModelViewSet):
+class ShareholderViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for shareholder management"""
     queryset = Shareholder.objects.all()
     serializer_class = ShareholderSerializer
@@ -194,7 +195,7 @@ class ShareholderViewSet(viewsets.ModelViewSet):
         # TESTING MODE: bypass role checks and update shareholder
         serializer.save()
 
-class DirectorViewSet(viewsets.ModelViewSet):
+class DirectorViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for director management"""
     queryset = Director.objects.all()
     serializer_class = DirectorSerializer
@@ -228,7 +229,7 @@ class DirectorViewSet(viewsets.ModelViewSet):
         # TESTING MODE: bypass role checks and update director
         serializer.save()
 
-class LicenseHistoryViewSet(viewsets.ModelViewSet):
+class LicenseHistoryViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for license history management"""
     queryset = LicenseHistory.objects.all()
     serializer_class = LicenseHistorySerializer
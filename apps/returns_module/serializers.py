@@ -1,9 +1,9 @@
 from rest_framework import serializers
 from .models import PrudentialReturn, IncomeStatement, BalanceSheet
-from apps.core.serializers import SMISerializer
+from apps.core.serializers import DynamicFieldsMixin, SMISerializer
 from apps.core.models import SMI
 
-class PrudentialReturnSerializer(serializers.ModelSerializer):
+class PrudentialReturnSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.PrimaryKeyRelatedField(
         queryset=SMI.objects.all(), source='smi', write_only=True
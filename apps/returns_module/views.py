@@ -12,13 +12,22 @@ from .serializers import (
     PrudentialReturnSummarySerializer, ReturnsDashboardSerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
+from apps.core.dashboards import DashboardAggregate
 from apps.auth_module.models import UserProfile
 
-class PrudentialReturnViewSet(viewsets.ModelViewSet):
+class PrudentialReturnViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for prudential return management"""
     queryset = PrudentialReturn.objects.all()
     serializer_class = PrudentialReturnSerializer
     permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+    dashboard_buckets = DashboardAggregate(
+        total_returns=None,
+        submitted_returns=Q(status='SUBMITTED'),
+        pending_returns=Q(status='PENDING'),
+        approved_returns=Q(status='APPROVED'),
+        rejected_returns=Q(status='REJECTED'),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -72,24 +81,12 @@ class PrudentialReturnViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get returns dashboard data"""
-        # Calculate statistics
-        total_returns = self.get_queryset().count()
-        submitted_returns = self.get_queryset().filter(status='SUBMITTED').count()
-        pending_returns = self.get_queryset().filter(status='PENDING').count()
-        approved_returns = self.get_queryset().filter(status='APPROVED').count()
-        rejected_returns = self.get_queryset().filter(status='REJECTED').count()
+        queryset = self.get_queryset()
+        dashboard_data = self.dashboard_buckets.evaluate(queryset)
         
         # Get recent returns
-        recent_returns = self.get_queryset().order_by('-submission_date')[:10]
-        
-        dashboard_data = {
-            'total_returns': total_returns,
-            'submitted_returns': submitted_returns,
-            'pending_returns': pending_returns,
-            'approved_returns': approved_returns,
-            'rejected_returns': rejected_returns,
-            'recent_returns': PrudentialReturnSerializer(recent_returns, many=True).data
-        }
+        recent_returns = queryset.order_by('-submission_date')[:10]
+        dashboard_data['recent_returns'] = PrudentialReturnSerializer(recent_returns, many=True).data
         
         return Response(dashboard_data)
     
@@ -142,7 +139,7 @@ class PrudentialReturnViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'Return rejected successfully'})
 
-class IncomeStatementViewSet(viewsets.ModelViewSet):
+class IncomeStatementViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for income statement management"""
     queryset = IncomeStatement.objects.all()
     serializer_class = IncomeStatementSerializer
@@ -158,7 +155,7 @@ class IncomeStatementViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class BalanceSheetViewSet(viewsets.ModelViewSet):
+class BalanceSheetViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for balance sheet management"""
     queryset = BalanceSheet.objects.all()
     serializer_class = BalanceSheetSerializer
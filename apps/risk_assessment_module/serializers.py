@@ -1,8 +1,8 @@
 from rest_framework import serializers
 from .models import RiskAssessment, StressTest, RiskIndicator, RiskTrend
-from apps.core.serializers import SMISerializer
+from apps.core.serializers import DynamicFieldsMixin, SMISerializer
 
-class RiskAssessmentSerializer(serializers.ModelSerializer):
+class RiskAssessmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -11,7 +11,7 @@ class RiskAssessmentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'overall_risk_score', 'risk_level', 'created_at', 'updated_at']
 
-class StressTestSerializer(serializers.ModelSerializer):
+class StressTestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True, required=False)
     
@@ -20,7 +20,7 @@ class StressTestSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at']
 
-class RiskIndicatorSerializer(serializers.ModelSerializer):
+class RiskIndicatorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -29,7 +29,7 @@ class RiskIndicatorSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-class RiskTrendSerializer(serializers.ModelSerializer):
+class RiskTrendSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     smi = SMISerializer(read_only=True)
     smi_id = serializers.UUIDField(write_only=True)
     
@@ -13,13 +13,21 @@ from .serializers import (
     RiskIndicatorAlertSerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
+from apps.core.dashboards import DashboardAggregate
 from apps.auth_module.models import UserProfile
 
-class RiskAssessmentViewSet(viewsets.ModelViewSet):
+class RiskAssessmentViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for risk assessment management"""
     queryset = RiskAssessment.objects.all()
     serializer_class = RiskAssessmentSerializer
     permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+    dashboard_buckets = DashboardAggregate(
+        total_assessments=None,
+        high_risk_count=Q(risk_level__in=['HIGH', 'CRITICAL']),
+        pending_assessments=Q(status='PENDING'),
+        average_fsi_score=Avg('fsi_score'),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -70,24 +78,13 @@ class RiskAssessmentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard_summary(self, request):
         """Get risk assessment dashboard summary"""
-        # Get recent assessments
-        recent_assessments = self.get_queryset().order_by('-assessment_date')[:10]
-        
-        # Calculate statistics
-        total_assessments = self.get_queryset().count()
-        high_risk_count = self.get_queryset().filter(risk_level__in=['HIGH', 'CRITICAL']).count()
-        pending_assessments = self.get_queryset().filter(status='PENDING').count()
+        queryset = self.get_queryset()
+        summary_data = self.dashboard_buckets.evaluate(queryset)
+        summary_data['average_fsi_score'] = round(summary_data['average_fsi_score'] or 0, 2)
         
-        # Get average FSI score
-        avg_fsi_score = self.get_queryset().aggregate(Avg('fsi_score'))['fsi_score__avg'] or 0
-        
-        summary_data = {
-            'total_assessments': total_assessments,
-            'high_risk_count': high_risk_count,
-            'pending_assessments': pending_assessments,
-            'average_fsi_score': round(avg_fsi_score, 2),
-            'recent_assessments': RiskAssessmentSerializer(recent_assessments, many=True).data
-        }
+        # Get recent assessments
+        recent_assessments = queryset.order_by('-assessment_date')[:10]
+        summary_data['recent_assessments'] = RiskAssessmentSerializer(recent_assessments, many=True).data
         
         return Response(summary_data)
 
@@ -171,11 +168,17 @@ class RiskAssessmentViewSet(viewsets.ModelViewSet):
             'risk_level': risk_assessment.risk_level
         })
 
-class StressTestViewSet(viewsets.ModelViewSet):
+class StressTestViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for stress testing management"""
     queryset = StressTest.objects.all()
     serializer_class = StressTestSerializer
     permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+    dashboard_buckets = DashboardAggregate(
+        total_tests=None,
+        passed_tests=Q(passed=True),
+        failed_tests=Q(passed=False),
+        last_test_date=Max('test_date'),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -232,29 +235,16 @@ class StressTestViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard_summary(self, request):
         """Get stress testing dashboard summary"""
-        # Get recent tests
-        recent_tests = self.get_queryset().order_by('-test_date')[:10]
-        
-        # Calculate statistics
-        total_tests = self.get_queryset().count()
-        passed_tests = self.get_queryset().filter(passed=True).count()
-        failed_tests = self.get_queryset().filter(passed=False).count()
+        queryset = self.get_queryset()
+        summary_data = self.dashboard_buckets.evaluate(queryset)
         
-        # Get latest test date
-        latest_test = self.get_queryset().order_by('-test_date').first()
-        last_test_date = latest_test.test_date if latest_test else None
-        
-        summary_data = {
-            'total_tests': total_tests,
-            'passed_tests': passed_tests,
-            'failed_tests': failed_tests,
-            'last_test_date': last_test_date,
-            'recent_tests': StressTestSerializer(recent_tests, many=True).data
-        }
+        # Get recent tests
+        recent_tests = queryset.order_by('-test_date')[:10]
+        summary_data['recent_tests'] = StressTestSerializer(recent_tests, many=True).data
         
         return Response(summary_data)
 
-class RiskIndicatorViewSet(viewsets.ModelViewSet):
+class RiskIndicatorViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for risk indicator management"""
     queryset = RiskIndicator.objects.all()
     serializer_class = RiskIndicatorSerializer
@@ -336,7 +326,7 @@ class RiskIndicatorViewSet(viewsets.ModelViewSet):
         
         return Response(alerts)
 
-class RiskTrendViewSet(viewsets.ModelViewSet):
+class RiskTrendViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for risk trend management"""
     queryset = RiskTrend.objects.all()
     serializer_class = RiskTrendSerializer
@@ -4,6 +4,7 @@ from rest_framework import status, permissions
 from django.utils.dateparse import parse_date
 from django.db.models import Max
 from apps.core.models import SMI
+from apps.core.mixins import eager_load
 from apps.auth_module.models import UserProfile
 from .models import SMISubmission
 from .serializers import SMISubmissionSerializer, RiskAssessmentSerializer
@@ -61,8 +62,8 @@ class SMISubmissionView(APIView):
             return Response({"detail": "Company not found or not permitted"}, status=status.HTTP_403_FORBIDDEN)
 
         latest = (
-            SMISubmission.objects
-            .filter(smi=smi)
+            eager_load(SMISubmission.objects.filter(smi=smi), SMISubmissionSerializer)
+            .select_related('smi')
             .order_by('-reporting_period__end')
             .first()
         )
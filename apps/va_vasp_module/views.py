@@ -12,13 +12,22 @@ from .serializers import (
     VA_VASPSummarySerializer, VA_VASPDashboardSerializer
 )
 from apps.core.models import SMI
+from apps.core.mixins import ConditionalGetMixin, EagerLoadingMixin, StreamingExportMixin
+from apps.core.dashboards import DashboardAggregate
 from apps.auth_module.models import UserProfile
 
-class VA_VASPViewSet(viewsets.ModelViewSet):
+class VA_VASPViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for VA/VASP analysis management"""
     queryset = VA_VASP.objects.all()
     serializer_class = VA_VASPSerializer
     permission_classes = [permissions.AllowAny]  # TEMP: Auth disabled for testing
+    dashboard_buckets = DashboardAggregate(
+        total_va_issuers=Q(is_va_issuer=True),
+        total_vasps=Q(is_vasp=True),
+        high_risk_entities=Q(overall_va_risk_score__gte=70),
+        # Entities with low compliance scores
+        compliance_alerts=Q(regulatory_compliance__lt=60),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -64,24 +73,12 @@ class VA_VASPViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get VA/VASP dashboard data"""
-        # Calculate statistics
-        total_va_issuers = self.get_queryset().filter(is_va_issuer=True).count()
-        total_vasps = self.get_queryset().filter(is_vasp=True).count()
-        high_risk_entities = self.get_queryset().filter(overall_va_risk_score__gte=70).count()
-        
-        # Get compliance alerts (entities with low compliance scores)
-        compliance_alerts = self.get_queryset().filter(regulatory_compliance__lt=60).count()
+        queryset = self.get_queryset()
+        dashboard_data = self.dashboard_buckets.evaluate(queryset)
         
         # Get recent analyses
-        recent_analyses = self.get_queryset().order_by('-analysis_date')[:10]
-        
-        dashboard_data = {
-            'total_va_issuers': total_va_issuers,
-            'total_vasps': total_vasps,
-            'high_risk_entities': high_risk_entities,
-            'compliance_alerts': compliance_alerts,
-            'recent_analyses': VA_VASPSerializer(recent_analyses, many=True).data
-        }
+        recent_analyses = queryset.order_by('-analysis_date')[:10]
+        dashboard_data['recent_analyses'] = VA_VASPSerializer(recent_analyses, many=True).data
         
         return Response(dashboard_data)
     
@@ -99,7 +96,7 @@ class VA_VASPViewSet(viewsets.ModelViewSet):
             'overall_va_risk_score': va_vasp.overall_va_risk_score
         })
 
-class VirtualAssetViewSet(viewsets.ModelViewSet):
+class VirtualAssetViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for virtual asset management"""
     queryset = VirtualAsset.objects.all()
     serializer_class = VirtualAssetSerializer
@@ -125,7 +122,7 @@ class VirtualAssetViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class VASPServiceViewSet(viewsets.ModelViewSet):
+class VASPServiceViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for VASP service management"""
     queryset = VASPService.objects.all()
     serializer_class = VASPServiceSerializer
@@ -152,7 +149,7 @@ class VASPServiceViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class VARiskAssessmentViewSet(viewsets.ModelViewSet):
+class VARiskAssessmentViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for VA risk assessment management"""
     queryset = VARiskAssessment.objects.all()
     serializer_class = VARiskAssessmentSerializer
@@ -178,7 +175,7 @@ class VARiskAssessmentViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class VASPComplianceViewSet(viewsets.ModelViewSet):
+class VASPComplianceViewSet(EagerLoadingMixin, ConditionalGetMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """ViewSet for VASP compliance management"""
     queryset = VASPCompliance.objects.all()
     serializer_class = VASPComplianceSerializer
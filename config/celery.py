@@ -17,23 +17,5 @@ app.autodiscover_tasks()
 def debug_task(self):
     print(f'Request: {self.request!r}')
 
-# Configure Celery Beat schedule for periodic tasks
-app.conf.beat_schedule = {
-    'calculate-risk-scores': {
-        'task': 'apps.core.tasks.calculate_risk_scores',
-        'schedule': 3600.0,  # Every hour
-    },
-    'send-notifications': {
-        'task': 'apps.core.tasks.send_pending_notifications',
-        'schedule': 300.0,  # Every 5 minutes
-    },
-    'update-compliance-indices': {
-        'task': 'apps.core.tasks.update_compliance_indices',
-        'schedule': 86400.0,  # Daily
-    },
-    'check-licensing-breaches': {
-        'task': 'apps.core.tasks.check_licensing_breaches',
-        'schedule': 3600.0,  # Every hour
-    },
-}
-
+# The beat schedule for periodic tasks is settings.CELERY_BEAT_SCHEDULE, shared
+# with the database-backed queue's scheduler (see apps.core.job_queue)
@@ -93,6 +93,8 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         # Replace BASE_DIR / 'db.sqlite3' with the permanent path
         'NAME': '/mnt/data/prod_db.sqlite3', 
+        # Queue workers write concurrently; wait for the write lock instead of failing
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -190,6 +192,51 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Periodic tasks, run by celery beat or by the queue_scheduler command
+CELERY_BEAT_SCHEDULE = {
+    'calculate-risk-scores': {
+        'task': 'apps.core.tasks.calculate_risk_scores',
+        'schedule': 3600.0,  # Every hour
+    },
+    'send-notifications': {
+        'task': 'apps.core.tasks.send_pending_notifications',
+        'schedule': 300.0,  # Every 5 minutes
+    },
+    'update-compliance-indices': {
+        'task': 'apps.core.tasks.update_compliance_indices',
+        'schedule': 86400.0,  # Daily
+    },
+    'check-licensing-breaches': {
+        'task': 'apps.core.tasks.check_licensing_breaches',
+        'schedule': 3600.0,  # Every hour
+    },
+    'compact-calculation-breakdowns': {
+        'task': 'apps.core.tasks.compact_calculation_breakdowns',
+        'schedule': 86400.0,  # Daily
+    },
+}
+
+# 'database' runs tasks through the QueuedJob table and the queue_worker /
+# queue_scheduler commands instead of the broker (see apps.core.job_queue)
+TASK_QUEUE_BACKEND = os.environ.get('TASK_QUEUE_BACKEND', 'celery')
+TASK_QUEUE_MAX_ATTEMPTS = 3
+TASK_QUEUE_JOB_TIMEOUT = 3600  # seconds before a RUNNING job of a dead worker is requeued
+TASK_QUEUE_HEARTBEAT = 60  # seconds between refreshes of a running job's lock
+
+# SMIs per chunk when periodic tasks fan out (see apps.core.batch_runs)
+BATCH_CHUNK_SIZE = 500
+# SMIs a chunk processes between two renewals of its run's lease
+BATCH_LEASE_BATCH_SIZE = 100
+
+# Single-flight leases of the batch tasks (see apps.core.task_locks): 'database'
+# or 'cache' (needs a cache shared by all workers)
+TASK_LOCK_BACKEND = 'database'
+TASK_LOCK_TTL = 900  # seconds a lease survives without a heartbeat
+
+# Days of CalculationBreakdown history kept before it is rolled into daily
+# summaries (see apps.core.breakdown_store)
+BREAKDOWN_RETENTION_DAYS = 90
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'localhost'
@@ -198,6 +245,11 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'your-email@example.com'
 EMAIL_HOST_PASSWORD = 'your-password'
 
+# Notification mailer (see apps.core.mailer): emails per recipient domain per minute
+NOTIFICATION_DEFAULT_DOMAIN_RATE = 60
+NOTIFICATION_DOMAIN_RATE_LIMITS = {}
+NOTIFICATION_MAX_EMAIL_ATTEMPTS = 5
+
 # File Upload Settings
 MAX_UPLOAD_SIZE = 10485760  # 10MB
 FILE_UPLOAD_PERMISSIONS = 0o644